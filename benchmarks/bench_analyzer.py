@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Analyzer Benchmarks
+-------------------
+PatentAnalyzer throughput over synthetic corpora.
+"""
+
+from benchmarks.corpus import get_corpus
+from benchmarks.harness import benchmark
+
+
+def _analyzer(tokenizer=None):
+    from utils.patent_api.analyzer import PatentAnalyzer
+    return PatentAnalyzer(tokenizer=tokenizer)
+
+
+@benchmark('analyzer.analyze_patent', repeat=3, warmup=0)
+def bench_analyze_patent(size):
+    analyzer = _analyzer()
+    corpus = get_corpus(size)
+
+    def run():
+        for patent in corpus:
+            analyzer.analyze_patent(patent)
+
+    return run, len(corpus)
+
+
+@benchmark('analyzer.extract_keyphrases', repeat=3, warmup=0)
+def bench_extract_keyphrases(size):
+    analyzer = _analyzer()
+    texts = [f"{p['title']}\n\n{p['abstract']}\n\n{p['full_text']}" for p in get_corpus(size)]
+
+    def run():
+        for text in texts:
+            analyzer.extract_keyphrases(text)
+
+    return run, len(texts)
+
+
+def _bench_tokenize(tokenizer, size):
+    analyzer = _analyzer(tokenizer)
+    texts = [f"{p['title']}\n\n{p['abstract']}\n\n{p['full_text']}" for p in get_corpus(size)]
+    # Items are tokens, so the harness reports tokens/sec
+    tokens = sum(len(analyzer.tokenize(text)) for text in texts)
+
+    def run():
+        for text in texts:
+            analyzer.tokenize(text)
+
+    return run, tokens
+
+
+@benchmark('analyzer.tokenize_nltk', repeat=3, warmup=0)
+def bench_tokenize_nltk(size):
+    return _bench_tokenize('nltk', size)
+
+
+@benchmark('analyzer.tokenize_regex', repeat=3, warmup=1)
+def bench_tokenize_regex(size):
+    return _bench_tokenize('regex', size)
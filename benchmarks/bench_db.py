@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Database Benchmarks
+-------------------
+db_manager reads and writes against databases holding 100/1k/10k patents.
+"""
+
+import itertools
+import random
+
+from benchmarks.corpus import build_database, get_corpus, make_patent
+from benchmarks.harness import benchmark
+
+_new_ids = itertools.count(1)
+
+
+@benchmark('db.get_patents')
+def bench_get_patents(size):
+    from database.db_manager import get_patents
+
+    build_database(get_corpus(size))
+    pages = max(1, size // 10)
+    rng = random.Random(1)
+    requests = [rng.randint(1, pages) for _ in range(50)]
+
+    def run():
+        for page in requests:
+            get_patents(page=page, per_page=10)
+
+    return run, len(requests)
+
+
+@benchmark('db.get_patent_by_id')
+def bench_get_patent_by_id(size):
+    from database.db_manager import get_patent_by_id
+
+    corpus = get_corpus(size)
+    build_database(corpus)
+    rng = random.Random(2)
+    ids = [rng.choice(corpus)['patent_id'] for _ in range(200)]
+
+    def run():
+        for patent_id in ids:
+            get_patent_by_id(patent_id)
+
+    return run, len(ids)
+
+
+@benchmark('db.save_patent')
+def bench_save_patent(size):
+    from database.db_manager import save_patent
+
+    build_database(get_corpus(size))
+    rng = random.Random(3)
+    template = [make_patent(i, rng) for i in range(100)]
+
+    def run():
+        # Fresh IDs on every run so the insert path is measured each time
+        for patent in template:
+            save_patent(
+                patent_id=f"USBENCH{next(_new_ids)}",
+                title=patent['title'],
+                abstract=patent['abstract'],
+                filing_date=patent['filing_date'],
+                issue_date=patent['issue_date'],
+                inventors=patent['inventors'],
+                assignee=patent['assignee'],
+                category=patent['category'],
+                full_text=patent['full_text'],
+            )
+
+    return run, len(template)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Fetcher Parsing Benchmarks
+--------------------------
+HTML parsing of saved Google Patents pages, without any network access.
+"""
+
+import os
+import glob
+
+from benchmarks.harness import benchmark
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture_pages():
+    """Return (patent_id, html) for every saved Google Patents page"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, 'google_patent_*.html'))):
+        patent_id = os.path.basename(path)[len('google_patent_'):-len('.html')]
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((patent_id, f.read()))
+    return pages
+
+
+@benchmark('fetcher.parse_google_patents_page', sizes=(100,))
+def bench_parse_google_patents_page(size):
+    from bs4 import BeautifulSoup
+    from utils.patent_api.fetcher import PatentFetcher
+
+    fetcher = PatentFetcher(cache_enabled=False)
+    pages = load_fixture_pages()
+    work = [pages[i % len(pages)] for i in range(size)]
+
+    def run():
+        for patent_id, html in work:
+            soup = BeautifulSoup(html, 'html.parser')
+            fetcher._extract_patent_data(soup, patent_id)
+
+    return run, len(work)
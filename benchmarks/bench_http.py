@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+HTTP Route Benchmarks
+---------------------
+End-to-end latency of server.py routes against a local server backed by a
+synthetic database.
+"""
+
+import os
+import random
+import logging
+import threading
+import contextlib
+import urllib.request
+
+from benchmarks.corpus import build_database, get_corpus
+from benchmarks.harness import benchmark
+
+_servers = {}
+
+
+def _start_server(size):
+    """Start server.py's handler on an ephemeral port for a corpus size"""
+    if size in _servers:
+        base_url, corpus, db_path = _servers[size]
+        # Other benchmarks may have pointed DATABASE_PATH elsewhere since
+        os.environ['DATABASE_PATH'] = db_path
+        return base_url, corpus
+
+    corpus = get_corpus(size)
+    db_path = build_database(corpus)
+
+    import server
+    from http.server import HTTPServer
+
+    logging.getLogger('seo_patent_tool').setLevel(logging.WARNING)
+
+    class QuietHandler(server.SEOPatentHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = HTTPServer(('127.0.0.1', 0), QuietHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    _servers[size] = (base_url, corpus, db_path)
+    return base_url, corpus
+
+
+def _route_benchmark(size, make_paths):
+    base_url, corpus = _start_server(size)
+    paths = make_paths(corpus, random.Random(size))
+    devnull = open(os.devnull, 'w')
+
+    def run():
+        # server.py prints every file it serves; keep that out of the output
+        with contextlib.redirect_stdout(devnull):
+            for path in paths:
+                with urllib.request.urlopen(base_url + path) as response:
+                    response.read()
+
+    return run, len(paths)
+
+
+@benchmark('http.api_patents')
+def bench_api_patents(size):
+    def make_paths(corpus, rng):
+        pages = max(1, len(corpus) // 10)
+        return [f"/api/patents?page={rng.randint(1, pages)}&per_page=10" for _ in range(50)]
+    return _route_benchmark(size, make_paths)
+
+
+@benchmark('http.api_patent')
+def bench_api_patent(size):
+    def make_paths(corpus, rng):
+        return [f"/api/patent?id={rng.choice(corpus)['patent_id']}" for _ in range(50)]
+    return _route_benchmark(size, make_paths)
+
+
+@benchmark('http.patent_page')
+def bench_patent_page(size):
+    def make_paths(corpus, rng):
+        return [f"/patents/{rng.choice(corpus)['patent_id']}" for _ in range(50)]
+    return _route_benchmark(size, make_paths)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Synthetic Patent Corpus
+-----------------------
+Deterministic generator of patent-like documents for benchmarks. The same
+size and seed always produce the same corpus, so timings are comparable
+across versions.
+"""
+
+import random
+
+SEO_TERMS = [
+    "search engine", "algorithm", "ranking", "relevance", "indexing", "crawling",
+    "link", "keyword", "query", "content", "optimization", "semantic",
+    "natural language", "machine learning", "user experience", "relevance score",
+    "search result", "web page", "document", "information retrieval", "metadata",
+    "classification", "personalization", "recommendation", "user behavior",
+    "click through", "bounce rate",
+]
+
+PATENT_WORDS = [
+    "method", "system", "apparatus", "processor", "memory", "instructions",
+    "determining", "plurality", "associated", "based", "receiving", "generating",
+    "identifying", "score", "signal", "data", "network", "server", "client",
+    "resource", "embodiment", "configured", "module", "value", "threshold",
+    "selecting", "providing", "storing", "computing", "device", "interface",
+    "candidate", "feature", "model", "weight", "entity", "graph", "node",
+]
+
+ASSIGNEES = [
+    "Google LLC", "Microsoft Technology Licensing, LLC", "Amazon Technologies, Inc.",
+    "Facebook, Inc.", "Apple Inc.",
+]
+
+CATEGORIES = [
+    "Core Ranking Algorithm Patents/PageRank and Link Analysis",
+    "Core Ranking Algorithm Patents/Machine Learning for Ranking",
+    "Site Architecture Optimization/Crawling and Indexing",
+    "Entity Recognition & Semantic Search/Natural Language Processing",
+    "User Experience & Intent Matching/User Behavior Analysis",
+]
+
+
+def _sentence(rng, min_words=8, max_words=24):
+    """Build one sentence mixing generic patent language and SEO terms"""
+    words = []
+    for _ in range(rng.randint(min_words, max_words)):
+        if rng.random() < 0.15:
+            words.append(rng.choice(SEO_TERMS))
+        else:
+            words.append(rng.choice(PATENT_WORDS))
+    return words[0].capitalize() + ' ' + ' '.join(words[1:]) + '.'
+
+
+def _paragraph(rng, sentences):
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+
+def make_patent(index, rng, min_chars=2000, max_chars=30000):
+    """Generate one synthetic patent record.
+
+    Args:
+        index (int): Position in the corpus, used for the patent ID
+        rng (random.Random): Seeded random source
+        min_chars (int): Minimum full text length
+        max_chars (int): Maximum full text length
+
+    Returns:
+        dict: Patent fields matching the patents table
+    """
+    target = rng.randint(min_chars, max_chars)
+    paragraphs = []
+    length = 0
+    while length < target:
+        paragraph = _paragraph(rng, rng.randint(3, 8))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+
+    claims = '\n\n'.join(
+        f"{n}. {_sentence(rng, 20, 40)}" for n in range(1, rng.randint(3, 25))
+    )
+    year = 2000 + index % 24
+
+    return {
+        'patent_id': f"US{9000000 + index}B{1 + index % 2}",
+        'title': ' '.join(rng.choice(PATENT_WORDS + SEO_TERMS) for _ in range(6)).capitalize(),
+        'abstract': _paragraph(rng, 3),
+        'filing_date': f"{year}-{1 + index % 12:02d}-{1 + index % 28:02d}",
+        'issue_date': f"{year + 2}-{1 + index % 12:02d}-{1 + index % 28:02d}",
+        'inventors': ', '.join(f"Inventor {rng.randint(1, 500)}" for _ in range(rng.randint(1, 4))),
+        'assignee': rng.choice(ASSIGNEES),
+        'category': rng.choice(CATEGORIES),
+        'full_text': f"DESCRIPTION:\n{chr(10).join(paragraphs)}\n\nCLAIMS:\n{claims}",
+    }
+
+
+def generate_corpus(size, seed=42, **kwargs):
+    """Generate a deterministic corpus of synthetic patents.
+
+    Args:
+        size (int): Number of patents
+        seed (int): Random seed
+
+    Returns:
+        list: A list of patent dicts
+    """
+    rng = random.Random(seed)
+    return [make_patent(i, rng, **kwargs) for i in range(size)]
+
+
+_CORPUS_CACHE = {}
+
+
+def get_corpus(size, seed=42):
+    """Return a cached corpus so several benchmarks can share it"""
+    key = (size, seed)
+    if key not in _CORPUS_CACHE:
+        _CORPUS_CACHE[key] = generate_corpus(size, seed)
+    return _CORPUS_CACHE[key]
+
+
+def build_database(corpus, directory=None):
+    """Create a temporary SQLite database holding the corpus.
+
+    Points DATABASE_PATH at the new file so db_manager and the server use it.
+
+    Args:
+        corpus (list): Patent dicts from generate_corpus
+        directory (str): Where to create the database (defaults to a temp dir)
+
+    Returns:
+        str: Path of the database file
+    """
+    import os
+    import tempfile
+    from database.db_manager import init_db, get_db
+
+    directory = directory or tempfile.mkdtemp(prefix='seo-bench-')
+    db_path = os.path.join(directory, f"bench_{len(corpus)}.db")
+    os.environ['DATABASE_PATH'] = db_path
+
+    init_db()
+    conn = get_db()
+    conn.executemany(
+        '''INSERT OR REPLACE INTO patents
+           (patent_id, title, abstract, filing_date, issue_date, inventors, assignee, category, full_text)
+           VALUES (:patent_id, :title, :abstract, :filing_date, :issue_date, :inventors, :assignee, :category, :full_text)''',
+        corpus
+    )
+    conn.commit()
+    conn.close()
+    return db_path
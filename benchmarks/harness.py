@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness
+-----------------
+Minimal asv-style harness: benchmarks register themselves with the
+``benchmark`` decorator, are run once per corpus size, and their timings are
+recorded as JSON so results from different versions can be compared.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+
+from config import VERSION
+
+BENCHMARKS = []
+
+DEFAULT_SIZES = (100, 1000, 10000)
+
+
+def benchmark(name, sizes=DEFAULT_SIZES, repeat=5, warmup=1):
+    """Register a benchmark.
+
+    The decorated function is called as ``fn(size)`` and must return a
+    zero-argument callable to time (setup happens outside the timing), plus
+    the number of items that callable processes, as ``(run, items)``.
+
+    Args:
+        name (str): Benchmark name, e.g. 'analyzer.analyze_patent'
+        sizes (tuple): Corpus sizes to run with
+        repeat (int): Timed repetitions per size
+        warmup (int): Untimed repetitions per size
+    """
+    def decorator(fn):
+        BENCHMARKS.append({
+            'name': name,
+            'setup': fn,
+            'sizes': tuple(sizes),
+            'repeat': repeat,
+            'warmup': warmup,
+        })
+        return fn
+    return decorator
+
+
+def _git_revision():
+    """Return the current git revision, or 'unknown'"""
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=root, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmark(bench, size, repeat=None):
+    """Run one benchmark at one corpus size.
+
+    Args:
+        bench (dict): A registered benchmark
+        size (int): Corpus size
+        repeat (int): Override for the number of timed repetitions
+
+    Returns:
+        dict: Timing statistics in seconds
+    """
+    run, items = bench['setup'](size)
+    repeat = repeat or bench['repeat']
+
+    for _ in range(bench['warmup']):
+        run()
+
+    timings = []
+    for _ in range(repeat):
+        # Keep collector pauses out of individual samples
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    median = statistics.median(timings)
+    return {
+        'name': bench['name'],
+        'size': size,
+        'items': items,
+        'repeat': repeat,
+        'min': min(timings),
+        'median': median,
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'items_per_sec': items / median if median > 0 else None,
+    }
+
+
+def run_all(name_filter=None, sizes=None, repeat=None):
+    """Run every registered benchmark matching the filter.
+
+    Args:
+        name_filter (str): Only run benchmarks whose name contains this
+        sizes (iterable): Only run these corpus sizes
+        repeat (int): Override for the number of timed repetitions
+
+    Returns:
+        dict: The full result document
+    """
+    results = []
+    for bench in BENCHMARKS:
+        if name_filter and name_filter not in bench['name']:
+            continue
+        for size in bench['sizes']:
+            if sizes and size not in sizes:
+                continue
+            print(f"Running {bench['name']} [n={size}]...", flush=True)
+            try:
+                result = run_benchmark(bench, size, repeat)
+            except Exception as e:
+                print(f"  failed: {e}")
+                results.append({'name': bench['name'], 'size': size, 'error': str(e)})
+                continue
+            print(f"  median {result['median'] * 1000:.2f} ms, "
+                  f"{result['items_per_sec'] or 0:,.1f} items/s")
+            results.append(result)
+
+    return {
+        'version': VERSION,
+        'revision': _git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def save_results(document, results_dir):
+    """Write a result document to results_dir as JSON.
+
+    Returns:
+        str: Path of the written file
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    filename = f"{document['version']}-{document['revision']}-{document['timestamp'].replace(':', '')}.json"
+    path = os.path.join(results_dir, filename)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def compare_results(baseline_path, current_path, threshold=0.10):
+    """Compare two result files and report regressions.
+
+    Args:
+        baseline_path (str): Older result file
+        current_path (str): Newer result file
+        threshold (float): Relative slowdown reported as a regression
+
+    Returns:
+        list: (name, size, ratio) tuples for regressions
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    before = {(r['name'], r['size']): r for r in baseline['results'] if 'median' in r}
+    regressions = []
+
+    print(f"{'benchmark':<45} {'size':>6} {'before':>10} {'after':>10} {'ratio':>7}")
+    for result in current['results']:
+        key = (result['name'], result['size'])
+        if 'median' not in result or key not in before:
+            continue
+        ratio = result['median'] / before[key]['median']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append((result['name'], result['size'], ratio))
+        elif ratio < 1 - threshold:
+            flag = '  improved'
+        print(f"{result['name']:<45} {result['size']:>6} "
+              f"{before[key]['median'] * 1000:>8.2f}ms {result['median'] * 1000:>8.2f}ms "
+              f"{ratio:>6.2f}x{flag}")
+
+    return regressions
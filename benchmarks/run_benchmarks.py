@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Run the benchmark suite and record results as JSON.
+
+Usage:
+    python benchmarks/run_benchmarks.py run [--filter analyzer] [--sizes 100,1000]
+    python benchmarks/run_benchmarks.py compare OLD.json NEW.json
+"""
+
+import os
+import sys
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+# Add parent directory to path for imports
+sys.path.append(ROOT_DIR)
+
+from benchmarks import harness
+
+
+def load_benchmarks():
+    """Import the benchmark modules so they register themselves"""
+    import benchmarks.bench_analyzer  # noqa: F401
+    import benchmarks.bench_db  # noqa: F401
+    import benchmarks.bench_fetcher  # noqa: F401
+    import benchmarks.bench_http  # noqa: F401
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SEO Patent Analysis Tool benchmarks')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='Run benchmarks and save results')
+    run_parser.add_argument('--filter', help='Only run benchmarks whose name contains this')
+    run_parser.add_argument('--sizes', help='Comma-separated corpus sizes (default: 100,1000,10000)')
+    run_parser.add_argument('--repeat', type=int, help='Override the number of timed repetitions')
+    run_parser.add_argument('--output-dir', default=RESULTS_DIR, help='Where to write the JSON results')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Relative slowdown reported as a regression (default: 0.10)')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        regressions = harness.compare_results(args.baseline, args.current, args.threshold)
+        print(f"\n{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
+
+    if args.command != 'run':
+        parser.print_help()
+        sys.exit(1)
+
+    # init_db reads database/schema.sql relative to the working directory
+    os.chdir(ROOT_DIR)
+    load_benchmarks()
+
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else None
+    document = harness.run_all(args.filter, sizes, args.repeat)
+    path = harness.save_results(document, args.output_dir)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
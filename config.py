@@ -18,6 +18,17 @@ ALLOWED_EXTENSIONS = {
 }
 MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))  # Default: 100MB
 
+# Streaming CSV ingestion (memory is bounded by the batch size, not the file size)
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 5000))  # rows per executemany
+INGEST_COMMIT_ROWS = int(os.environ.get('INGEST_COMMIT_ROWS', 100000))  # rows per transaction
+INGEST_MAX_FIELD_SIZE = int(os.environ.get('INGEST_MAX_FIELD_SIZE', 1024 * 1024))  # bytes per CSV field
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', os.cpu_count() or 2))  # parser processes for crawl exports
+INGEST_CHUNK_BYTES = int(os.environ.get('INGEST_CHUNK_BYTES', 8 * 1024 * 1024))  # parallel parse chunk size
+
+# Upload deletion (rows removed per short transaction, pause between batches)
+UPLOAD_DELETE_BATCH_SIZE = int(os.environ.get('UPLOAD_DELETE_BATCH_SIZE', 5000))
+UPLOAD_DELETE_PAUSE = float(os.environ.get('UPLOAD_DELETE_PAUSE', 0.01))  # seconds
+
 # Google API
 GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY', '')
 GOOGLE_CUSTOM_SEARCH_ENGINE_ID = os.environ.get('GOOGLE_CUSTOM_SEARCH_ENGINE_ID', '')
@@ -38,6 +49,95 @@ PORT = int(os.environ.get('PORT', 8000))
 HOST = os.environ.get('HOST', '0.0.0.0')
 STATIC_DIR = os.environ.get('STATIC_DIR', 'static')
 INCLUDES_DIR = os.environ.get('INCLUDES_DIR', 'includes')
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))  # > 1 forks worker processes sharing the port
+WEB_WORKER_RESTART_DELAY = float(os.environ.get('WEB_WORKER_RESTART_DELAY', 1.0))  # seconds, doubled per early crash
+WEB_WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get('WEB_WORKER_SHUTDOWN_TIMEOUT', 30))
+
+# Admission control: in-flight limits per route class (per process, 0 = unlimited)
+ADMISSION_STATIC_LIMIT = int(os.environ.get('ADMISSION_STATIC_LIMIT', 32))
+ADMISSION_API_LIMIT = int(os.environ.get('ADMISSION_API_LIMIT', 16))
+ADMISSION_HEAVY_LIMIT = int(os.environ.get('ADMISSION_HEAVY_LIMIT', 4))  # search, similarity, relevance, exports
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 0.1))  # seconds to wait for a slot before 503
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 2))  # Retry-After seconds on 503
+ADMISSION_CLIENT_RATE = float(os.environ.get('ADMISSION_CLIENT_RATE', 10))  # API requests per second per client, 0 = off
+ADMISSION_CLIENT_BURST = float(os.environ.get('ADMISSION_CLIENT_BURST', 30))
+ADMISSION_HEAVY_COST = float(os.environ.get('ADMISSION_HEAVY_COST', 5))  # rate tokens per heavy request
+ADMISSION_TRUST_PROXY = os.environ.get('ADMISSION_TRUST_PROXY', '').lower() in ('1', 'true', 'yes')  # use X-Forwarded-For
+
+# Background jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 30))  # seconds, doubled per attempt
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 300))
+
+# Single-flight: concurrent identical fetches, searches and analyses share one computation
+SINGLEFLIGHT_SHARED = os.environ.get('SINGLEFLIGHT_SHARED', '').lower() in ('1', 'true', 'yes')  # across processes even without pre-fork/job workers
+SINGLEFLIGHT_TIMEOUT = float(os.environ.get('SINGLEFLIGHT_TIMEOUT', 120))  # seconds to wait for another process
+SINGLEFLIGHT_POLL_INTERVAL = float(os.environ.get('SINGLEFLIGHT_POLL_INTERVAL', 0.05))
+
+# Request profiling (see utils/profiling.py): X-Profile header or sampled requests
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # fraction of requests profiled
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')  # sample (collapsed stacks) or cprofile
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))  # seconds between stack samples
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))  # profiles kept
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')  # required in X-Profile-Token; unset = loopback clients only
+
+# Similar-patent search (MinHash + LSH)
+SIMILARITY_NUM_PERM = int(os.environ.get('SIMILARITY_NUM_PERM', 128))
+SIMILARITY_BANDS = int(os.environ.get('SIMILARITY_BANDS', 32))
+SIMILARITY_SHINGLE_SIZE = int(os.environ.get('SIMILARITY_SHINGLE_SIZE', 3))
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get('SIMILARITY_REFRESH_SECONDS', 5))
+
+# Citation graph crawl and PageRank influence scores
+CITATION_CRAWL_WORKERS = int(os.environ.get('CITATION_CRAWL_WORKERS', 4))
+CITATION_RECRAWL_DAYS = int(os.environ.get('CITATION_RECRAWL_DAYS', 30))
+PAGERANK_DAMPING = float(os.environ.get('PAGERANK_DAMPING', 0.85))
+
+# Search query expansion (precomputed WordNet synonyms)
+SYNONYM_EXPANSION_LIMIT = int(os.environ.get('SYNONYM_EXPANSION_LIMIT', 10))
+SYNONYMS_PER_WORD = int(os.environ.get('SYNONYMS_PER_WORD', 20))
+
+# Patent relevance matching of project pages and queries
+RELEVANCE_TOP_K = int(os.environ.get('RELEVANCE_TOP_K', 10))
+RELEVANCE_MIN_SCORE = float(os.environ.get('RELEVANCE_MIN_SCORE', 0.05))
+RELEVANCE_BLOCK_SIZE = int(os.environ.get('RELEVANCE_BLOCK_SIZE', 2000))
+
+# Patent list import (scripts/import_patents.py)
+IMPORT_FETCH_WORKERS = int(os.environ.get('IMPORT_FETCH_WORKERS', 4))
+IMPORT_RATE_LIMIT = float(os.environ.get('IMPORT_RATE_LIMIT', 2.0))  # requests per second across workers
+IMPORT_FETCH_RETRIES = int(os.environ.get('IMPORT_FETCH_RETRIES', 3))
+IMPORT_FETCH_TIMEOUT = float(os.environ.get('IMPORT_FETCH_TIMEOUT', 30))  # seconds
+IMPORT_SAVE_BATCH = int(os.environ.get('IMPORT_SAVE_BATCH', 25))  # patents per transaction
+
+# Metadata backfill (scripts/backfill_metadata.py; fetches use the import rate limit)
+BACKFILL_BATCH_SIZE = int(os.environ.get('BACKFILL_BATCH_SIZE', 50))  # patents per transaction
+BACKFILL_MAX_ATTEMPTS = int(os.environ.get('BACKFILL_MAX_ATTEMPTS', 5))
+BACKFILL_RETRY_HOURS = float(os.environ.get('BACKFILL_RETRY_HOURS', 6))  # doubled per failed attempt
+
+# Patent analysis tokenizer: 'nltk' (punkt + Treebank word_tokenize) or 'regex' (compiled pattern, much faster)
+ANALYZER_TOKENIZER = os.environ.get('ANALYZER_TOKENIZER', 'nltk')
+
+# Full texts longer than ANALYZER_CHUNK_CHARS are analyzed in chunks (see analyze_stream) with bounded memory.
+# ANALYZER_CHUNK_OVERLAP characters are repeated from the previous chunk, so SEO terms and entities spanning
+# a chunk boundary are still found; past ANALYZER_MAX_TERMS distinct keywords/phrases only the most frequent half is kept
+ANALYZER_CHUNK_CHARS = int(os.environ.get('ANALYZER_CHUNK_CHARS', 200000))
+ANALYZER_CHUNK_OVERLAP = int(os.environ.get('ANALYZER_CHUNK_OVERLAP', 256))
+ANALYZER_MAX_TERMS = int(os.environ.get('ANALYZER_MAX_TERMS', 200000))
+
+# Optional JSON file with "seo_keywords" and/or "seo_categories" overriding the analyzer's
+# built-in SEO weights (see utils/patent_api/rescoring.py; apply to the corpus with scripts/rescore_patents.py)
+SEO_WEIGHTS_FILE = os.environ.get('SEO_WEIGHTS_FILE', '')
+
+# Data export (scripts/export_data.py and /api/export; Parquet needs pyarrow)
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))  # rows per fetchmany
+EXPORT_ROW_GROUP_ROWS = int(os.environ.get('EXPORT_ROW_GROUP_ROWS', 100000))  # rows per Parquet row group
+EXPORT_PARQUET_COMPRESSION = os.environ.get('EXPORT_PARQUET_COMPRESSION', 'zstd')
+
+# Metrics (optional periodic dump of /metrics to a local file, e.g. for the node_exporter textfile collector)
+METRICS_FILE = os.environ.get('METRICS_FILE', '')
+METRICS_DUMP_INTERVAL = float(os.environ.get('METRICS_DUMP_INTERVAL', 15))
 
 # Create necessary directories
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -1,11 +1,58 @@
 # database/db_manager.py
 import os
+import time
 import sqlite3
 import datetime
 import json
+import importlib
+import threading
+
+from database.records import (
+    AnalysisRecord, ANALYSIS_SCALAR_COLUMNS, analysis_scalars, encode_payload,
+    PatentRecord, PatentBatchLoader
+)
+from config import UPLOAD_DELETE_BATCH_SIZE, UPLOAD_DELETE_PAUSE
+
+# Callbacks run after a patent is saved, e.g. to keep derived indexes current
+PATENT_SAVE_HOOKS = []
+
+# Modules whose on_patent_saved keeps a derived index current, in the order
+# the hooks run (the SEO term counts are computed from the stored tokens)
+PATENT_SAVE_HOOK_MODULES = (
+    'utils.patent_api.patent_ids',
+    'utils.patent_api.similarity',
+    'utils.patent_api.token_store',
+    'utils.patent_api.rescoring',
+)
+
+_hooks_registered = False
+_hooks_lock = threading.Lock()
+
+# upload_type -> (table, key) pairs holding the upload's rows; key selects a
+# batch of rows (WITHOUT ROWID tables use their primary key)
+UPLOAD_DATA_TABLES = {
+    'ahrefs_backlinks': (('ahrefs_backlinks', 'rowid'),),
+    'ahrefs_internal_links': (('ahrefs_internal_links', 'rowid'),),
+    'screaming_frog': (('screaming_frog_data', 'rowid'),),
+    'search_console': (
+        ('search_console_data', 'rowid'),
+        ('gsc_rollups', '(project_id, dimension, period, period_start, value, upload_id)'),
+    ),
+}
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# Database paths this process has applied the schema to
+_schema_applied = set()
+_schema_lock = threading.Lock()
 
 def get_db():
-    """Connect to the database"""
+    """Connect to the database.
+
+    The first connection to a database in each process applies schema.sql
+    (see apply_schema), so every table exists whichever entry point (server,
+    job worker, script) runs first.
+    """
     # Get database path from environment or use default
     db_path = os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'seo_tool.db'))
     
@@ -14,24 +61,68 @@ def get_db():
     
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    if db_path not in _schema_applied:
+        with _schema_lock:
+            if db_path not in _schema_applied:
+                apply_schema(conn)
+                _schema_applied.add(db_path)
     return conn
 
+def apply_schema(conn):
+    """Create missing tables and indexes from schema.sql.
+
+    schema.sql is the only definition of the tables. Columns added after a
+    table was first created are added to existing tables before it runs,
+    since its indexes may cover them.
+    """
+    ensure_column(conn, 'uploads', 'deleted_at', 'TIMESTAMP')
+    for column in ANALYSIS_SCALAR_COLUMNS:
+        ensure_column(conn, 'analyses', column, 'INTEGER')
+    ensure_column(conn, 'analyses', 'payload', 'BLOB')
+    ensure_column(conn, 'patent_minhash', 'version', 'INTEGER NOT NULL DEFAULT 0')
+    
+    with open(SCHEMA_PATH, 'r') as f:
+        conn.executescript(f.read())
+    ensure_unique_patent_ids(conn)
+    conn.commit()
+
+def ensure_unique_patent_ids(conn):
+    """Give a patents table created without UNIQUE (patent_id) a unique index.
+
+    save_patents and the import pipeline upsert with ON CONFLICT (patent_id),
+    which needs one. Duplicate rows are merged into the oldest first, with
+    the analyses and project links that refer to them by row id.
+    """
+    for index in conn.execute('PRAGMA index_list(patents)').fetchall():
+        columns = [row[2] for row in conn.execute(f'PRAGMA index_info({index[1]})')]
+        if index[2] and columns == ['patent_id']:
+            return
+
+    duplicates = 'SELECT id FROM patents WHERE id NOT IN (SELECT MIN(id) FROM patents GROUP BY patent_id)'
+    for table in ('patent_analyses', 'project_patents'):
+        conn.execute(f'''UPDATE {table} SET patent_id = (
+                           SELECT MIN(kept.id) FROM patents kept
+                           JOIN patents duplicate ON duplicate.patent_id = kept.patent_id
+                           WHERE duplicate.id = {table}.patent_id)
+                         WHERE patent_id IN ({duplicates})''')
+    conn.execute(f'DELETE FROM patents WHERE id IN ({duplicates})')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_patents_patent_id ON patents (patent_id)')
+
 def init_db():
     """Initialize the database with schema"""
     conn = get_db()
-    cursor = conn.cursor()
-    
-    # Read schema file
-    with open('database/schema.sql', 'r') as f:
-        schema = f.read()
-    
-    # Execute schema
-    cursor.executescript(schema)
-    conn.commit()
+    apply_schema(conn)
     conn.close()
     
     print("Database initialized successfully")
 
+def ensure_column(conn, table, column, definition):
+    """Add a column to an existing table if it is missing (tables that don't
+    exist yet are left to schema.sql)"""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if columns and column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
 def create_project(name, description, url):
     """Create a new project"""
     conn = get_db()
@@ -111,12 +202,13 @@ def get_uploads_by_project(project_id, upload_type=None):
     
     if upload_type:
         cursor.execute(
-            'SELECT * FROM uploads WHERE project_id = ? AND upload_type = ? ORDER BY uploaded_at DESC',
+            '''SELECT * FROM uploads WHERE project_id = ? AND upload_type = ? AND deleted_at IS NULL
+               ORDER BY uploaded_at DESC''',
             (project_id, upload_type)
         )
     else:
         cursor.execute(
-            'SELECT * FROM uploads WHERE project_id = ? ORDER BY uploaded_at DESC',
+            'SELECT * FROM uploads WHERE project_id = ? AND deleted_at IS NULL ORDER BY uploaded_at DESC',
             (project_id,)
         )
     
@@ -125,8 +217,18 @@ def get_uploads_by_project(project_id, upload_type=None):
     
     return uploads
 
-def delete_upload(upload_id):
-    """Delete an upload and its associated data"""
+def delete_upload(upload_id, soft=False, batch_size=None, progress_callback=None):
+    """Delete an upload and its associated data.
+    
+    Rows are removed in batches of batch_size, each in its own short
+    transaction, so other writers are never blocked for long. With soft=True
+    the upload is only marked deleted (hidden from get_uploads_by_project)
+    and a background job removes the data.
+    
+    Returns:
+        False if the upload doesn't exist, the cleanup job ID for a soft
+        delete, otherwise True
+    """
     conn = get_db()
     cursor = conn.cursor()
     
@@ -138,17 +240,46 @@ def delete_upload(upload_id):
         conn.close()
         return False
     
-    # Delete associated data based on upload_type
-    if upload['upload_type'] == 'ahrefs_backlinks':
-        cursor.execute('DELETE FROM ahrefs_backlinks WHERE upload_id = ?', (upload_id,))
-    elif upload['upload_type'] == 'ahrefs_internal_links':
-        cursor.execute('DELETE FROM ahrefs_internal_links WHERE upload_id = ?', (upload_id,))
-    elif upload['upload_type'] == 'screaming_frog':
-        cursor.execute('DELETE FROM screaming_frog_data WHERE upload_id = ?', (upload_id,))
-    elif upload['upload_type'] == 'search_console':
-        cursor.execute('DELETE FROM search_console_data WHERE upload_id = ?', (upload_id,))
+    if soft:
+        cursor.execute(
+            'UPDATE uploads SET deleted_at = ? WHERE id = ?',
+            (datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), upload_id)
+        )
+        conn.commit()
+        conn.close()
+        
+        from utils.job_queue import enqueue_job
+        return enqueue_job('delete_upload', {'upload_id': upload_id})
+    
+    batch_size = batch_size or UPLOAD_DELETE_BATCH_SIZE
+    tables = UPLOAD_DATA_TABLES.get(upload['upload_type'], ())
+    
+    # Indexed counts, used only to report progress
+    total = sum(
+        cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE upload_id = ?', (upload_id,)).fetchone()[0]
+        for table, _ in tables
+    )
+    deleted = 0
+    
+    for table, key in tables:
+        while True:
+            cursor.execute(
+                f'''DELETE FROM {table} WHERE {key} IN
+                    (SELECT {key.strip('()')} FROM {table} WHERE upload_id = ? LIMIT ?)''',
+                (upload_id, batch_size)
+            )
+            removed = cursor.rowcount
+            conn.commit()
+            if removed <= 0:
+                break
+            deleted += removed
+            if progress_callback:
+                progress_callback(deleted / total if total else 1.0, f"Deleted {deleted} of {total} rows")
+            # Give other writers a chance to take the lock between batches
+            time.sleep(UPLOAD_DELETE_PAUSE)
     
     # Delete the upload record
+    cursor.execute('DELETE FROM upload_progress WHERE upload_id = ?', (upload_id,))
     cursor.execute('DELETE FROM uploads WHERE id = ?', (upload_id,))
     
     conn.commit()
@@ -156,8 +287,44 @@ def delete_upload(upload_id):
     
     return True
 
+def register_patent_save_hook(hook):
+    """Register a callback run as hook(patent_dict) after each saved patent"""
+    if hook not in PATENT_SAVE_HOOKS:
+        PATENT_SAVE_HOOKS.append(hook)
+
+def register_hooks():
+    """Register the save hooks of PATENT_SAVE_HOOK_MODULES, once per process.
+
+    notify_patent_saved calls this, so every save path (server, job
+    workers, import and backfill scripts) keeps the same indexes current.
+    The modules are imported here rather than at the top of this module
+    because they import it themselves.
+    """
+    global _hooks_registered
+    with _hooks_lock:
+        if _hooks_registered:
+            return
+        for name in PATENT_SAVE_HOOK_MODULES:
+            register_patent_save_hook(importlib.import_module(name).on_patent_saved)
+        _hooks_registered = True
+
+def notify_patent_saved(patent):
+    """Run the patent save hooks; a failing hook never fails the save"""
+    register_hooks()
+    for hook in PATENT_SAVE_HOOKS:
+        try:
+            hook(patent)
+        except Exception as e:
+            print(f"Error in patent save hook {getattr(hook, '__name__', hook)}: {e}")
+
+def _resolve_patent_id(patent_id):
+    """The ID a patent is stored under, whatever form patent_id is in"""
+    from utils.patent_api.patent_ids import resolve_patent_id
+    return resolve_patent_id(patent_id) or patent_id
+
 def save_patent(patent_id, title, abstract, filing_date, issue_date, inventors, assignee, category, full_text=None):
-    """Save a patent to the database"""
+    """Save a patent to the database, returning its row id"""
+    patent_id = _resolve_patent_id(patent_id)
     conn = get_db()
     cursor = conn.cursor()
     
@@ -174,6 +341,7 @@ def save_patent(patent_id, title, abstract, filing_date, issue_date, inventors,
                WHERE patent_id = ?''',
             (title, abstract, filing_date, issue_date, inventors, assignee, category, full_text, patent_id)
         )
+        patent_db_id = existing['id']
     else:
         # Insert new patent
         cursor.execute(
@@ -182,12 +350,75 @@ def save_patent(patent_id, title, abstract, filing_date, issue_date, inventors,
                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
             (patent_id, title, abstract, filing_date, issue_date, inventors, assignee, category, full_text)
         )
+        patent_db_id = cursor.lastrowid
     
     conn.commit()
     conn.close()
+    
+    notify_patent_saved({
+        'patent_id': patent_id, 'title': title, 'abstract': abstract,
+        'filing_date': filing_date, 'issue_date': issue_date, 'inventors': inventors,
+        'assignee': assignee, 'category': category, 'full_text': full_text
+    })
+    
+    return patent_db_id
+
+PATENT_FIELDS = ('patent_id', 'title', 'abstract', 'filing_date', 'issue_date',
+                 'inventors', 'assignee', 'category', 'full_text')
+
+def save_patents(patents, conn=None):
+    """Insert or update many patents (dicts with PATENT_FIELDS) in one transaction
+    
+    With conn the caller's transaction is used and the caller commits; save
+    hooks then run only for patents saved without conn.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
+    
+    # Another form of a stored patent's ID updates that patent
+    patents = [dict(patent, patent_id=_resolve_patent_id(patent['patent_id'])) for patent in patents]
+    conn.executemany(
+        f'''INSERT INTO patents ({', '.join(PATENT_FIELDS)})
+           VALUES ({', '.join('?' for _ in PATENT_FIELDS)})
+           ON CONFLICT (patent_id) DO UPDATE SET
+           {', '.join(f'{field} = excluded.{field}' for field in PATENT_FIELDS[1:])}''',
+        [tuple(patent.get(field) for field in PATENT_FIELDS) for patent in patents]
+    )
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+        for patent in patents:
+            notify_patent_saved({field: patent.get(field) for field in PATENT_FIELDS})
 
-def get_patents(category=None, page=1, per_page=10):
-    """Get patents with pagination, optionally filtered by category"""
+def _fetch_patent_column(ids, field):
+    """Read one deferred column for many patents (PatentBatchLoader fetch)"""
+    if field not in PatentRecord.LAZY_FIELDS:
+        raise ValueError(f"Unknown deferred patent column '{field}'")
+    conn = get_db()
+    values = {}
+    # Stay under SQLite's bound parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor = conn.execute(
+            f"SELECT id, {field} FROM patents WHERE id IN ({', '.join('?' for _ in chunk)})",
+            chunk
+        )
+        values.update(cursor.fetchall())
+    conn.close()
+    return values
+
+def _patent_columns(load):
+    """SELECT list for PatentRecords, with the given deferred columns read up front"""
+    return ', '.join(PatentRecord.COLUMNS + tuple(f for f in PatentRecord.LAZY_FIELDS if f in load))
+
+def get_patents(category=None, page=1, per_page=10, load=()):
+    """Get patents with pagination, optionally filtered by category
+    
+    Patents are PatentRecords; abstract and full_text are read on first
+    access unless listed in load.
+    """
     conn = get_db()
     cursor = conn.cursor()
     
@@ -203,18 +434,20 @@ def get_patents(category=None, page=1, per_page=10):
     offset = (page - 1) * per_page
     
     # Get the paginated results
+    columns = _patent_columns(load)
     if category:
         cursor.execute(
-            'SELECT * FROM patents WHERE category LIKE ? ORDER BY issue_date DESC LIMIT ? OFFSET ?', 
+            f'SELECT {columns} FROM patents WHERE category LIKE ? ORDER BY issue_date DESC LIMIT ? OFFSET ?', 
             (f'%{category}%', per_page, offset)
         )
     else:
         cursor.execute(
-            'SELECT * FROM patents ORDER BY issue_date DESC LIMIT ? OFFSET ?', 
+            f'SELECT {columns} FROM patents ORDER BY issue_date DESC LIMIT ? OFFSET ?', 
             (per_page, offset)
         )
     
-    patents = cursor.fetchall()
+    loader = PatentBatchLoader(_fetch_patent_column)
+    patents = [PatentRecord(row, loader) for row in cursor.fetchall()]
     conn.close()
     
     return {
@@ -225,37 +458,72 @@ def get_patents(category=None, page=1, per_page=10):
         'total_pages': (total_count + per_page - 1) // per_page  # Ceiling division
     }
 
-def get_patent_by_id(patent_id):
-    """Get a patent by its ID"""
+def get_patent_by_id(patent_id, load=()):
+    """Get a patent by its ID in any form (a PatentRecord, see get_patents)"""
+    patent_id = _resolve_patent_id(patent_id)
     conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM patents WHERE patent_id = ?', (patent_id,))
-    patent = cursor.fetchone()
+    cursor.execute(f'SELECT {_patent_columns(load)} FROM patents WHERE patent_id = ?', (patent_id,))
+    row = cursor.fetchone()
     
     conn.close()
     
-    return patent
+    return PatentRecord(row, PatentBatchLoader(_fetch_patent_column)) if row else None
+
+def iter_patent_text(patent_id, field='full_text', chunk_chars=100000):
+    """Yield a patent's abstract or full text in pieces of chunk_chars characters
+    
+    Each piece is read with its own substr() query, so a multi-MB text is
+    never held in memory at once (see PatentAnalyzer.analyze_stream).
+    """
+    if field not in PatentRecord.LAZY_FIELDS:
+        raise ValueError(f"Unknown deferred patent column '{field}'")
+    conn = get_db()
+    try:
+        start = 1
+        while True:
+            row = conn.execute(
+                f'SELECT substr({field}, ?, ?) FROM patents WHERE patent_id = ?',
+                (start, chunk_chars, patent_id)
+            ).fetchone()
+            if row is None or not row[0]:
+                break
+            yield row[0]
+            if len(row[0]) < chunk_chars:
+                break
+            start += chunk_chars
+    finally:
+        conn.close()
 
 def save_analysis(project_id, patent_id, upload_id, analysis_data, recommendations):
-    """Save a patent analysis for a project"""
+    """Save a patent analysis for a project
+    
+    Scores are stored in scalar columns; the analysis and recommendations
+    are stored together as a compressed payload (see database/records.py).
+    """
     conn = get_db()
     cursor = conn.cursor()
     
     created_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    # Convert dictionaries to JSON if necessary
-    if isinstance(analysis_data, dict):
-        analysis_data = json.dumps(analysis_data)
+    # Accept JSON strings as well as dictionaries
+    if isinstance(analysis_data, str):
+        analysis_data = json.loads(analysis_data)
     
-    if isinstance(recommendations, dict):
-        recommendations = json.dumps(recommendations)
+    if isinstance(recommendations, str):
+        recommendations = json.loads(recommendations)
     
+    scalars = analysis_scalars(analysis_data)
+    payload = encode_payload({'analysis_data': analysis_data, 'recommendations': recommendations})
+    
+    # analysis_data/recommendations TEXT columns are only filled by legacy rows
     cursor.execute(
-        '''INSERT INTO analyses 
-           (project_id, patent_id, upload_id, analysis_data, recommendations, created_at)
-           VALUES (?, ?, ?, ?, ?, ?)''',
-        (project_id, patent_id, upload_id, analysis_data, recommendations, created_at)
+        f'''INSERT INTO analyses 
+           (project_id, patent_id, upload_id, analysis_data, recommendations, created_at,
+            {', '.join(scalars)}, payload)
+           VALUES (?, ?, ?, '', '', ?, {', '.join('?' for _ in scalars)}, ?)''',
+        (project_id, patent_id, upload_id, created_at, *scalars.values(), payload)
     )
     
     analysis_id = cursor.lastrowid
@@ -264,36 +532,118 @@ def save_analysis(project_id, patent_id, upload_id, analysis_data, recommendatio
     
     return analysis_id
 
-def get_analyses_by_project(project_id, patent_id=None):
-    """Get all analyses for a project, optionally filtered by patent"""
+def get_analysis_payload(analysis_id):
+    """Get an analysis' encoded payload, or its legacy JSON columns as a dict"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'SELECT payload, analysis_data, recommendations FROM analyses WHERE id = ?',
+        (analysis_id,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        return None
+    if row['payload'] is not None:
+        return row['payload']
+    return {'analysis_data': row['analysis_data'], 'recommendations': row['recommendations']}
+
+def get_analyses_by_project(project_id, patent_id=None, include_payload=False):
+    """Get all analyses for a project, optionally filtered by patent
+    
+    Returns AnalysisRecords holding the scalar columns. Unless
+    include_payload is set, the payload is read and decoded only when
+    analysis_data or recommendations is accessed.
+    """
     conn = get_db()
     cursor = conn.cursor()
     
+    columns = ['a.id', 'a.project_id', 'a.patent_id', 'a.upload_id', 'a.created_at']
+    columns += [f'a.{column}' for column in ANALYSIS_SCALAR_COLUMNS]
+    columns += ['p.title as patent_title', 'u.upload_type', 'u.filename']
+    if include_payload:
+        columns += ['a.payload', 'a.analysis_data', 'a.recommendations']
+    
+    where = 'a.project_id = ?'
+    params = [project_id]
     if patent_id:
+        where += ' AND a.patent_id = ?'
+        params.append(patent_id)
+    
+    cursor.execute(
+        f'''SELECT {', '.join(columns)}
+           FROM analyses a
+           JOIN patents p ON a.patent_id = p.patent_id
+           JOIN uploads u ON a.upload_id = u.id
+           WHERE {where}
+           ORDER BY a.created_at DESC''',
+        params
+    )
+    
+    analyses = []
+    for row in cursor.fetchall():
+        fields = dict(row)
+        if include_payload:
+            payload = fields.pop('payload')
+            legacy = {key: fields.pop(key) for key in AnalysisRecord.PAYLOAD_FIELDS}
+            analyses.append(AnalysisRecord(fields, payload if payload is not None else legacy))
+        else:
+            analyses.append(AnalysisRecord(
+                fields, loader=lambda analysis_id=fields['id']: get_analysis_payload(analysis_id)
+            ))
+    conn.close()
+    
+    return analyses
+
+def compact_analyses(batch_size=500, progress_callback=None):
+    """Convert legacy JSON analyses to scalar columns plus a payload
+    
+    Returns the number of analyses converted.
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    total = cursor.execute('SELECT COUNT(*) FROM analyses WHERE payload IS NULL').fetchone()[0]
+    converted = 0
+    last_id = 0
+    while True:
         cursor.execute(
-            '''SELECT a.*, p.title as patent_title, u.upload_type, u.filename
-               FROM analyses a
-               JOIN patents p ON a.patent_id = p.patent_id
-               JOIN uploads u ON a.upload_id = u.id
-               WHERE a.project_id = ? AND a.patent_id = ?
-               ORDER BY a.created_at DESC''',
-            (project_id, patent_id)
+            '''SELECT id, analysis_data, recommendations FROM analyses
+               WHERE payload IS NULL AND id > ? ORDER BY id LIMIT ?''',
+            (last_id, batch_size)
         )
-    else:
-        cursor.execute(
-            '''SELECT a.*, p.title as patent_title, u.upload_type, u.filename
-               FROM analyses a
-               JOIN patents p ON a.patent_id = p.patent_id
-               JOIN uploads u ON a.upload_id = u.id
-               WHERE a.project_id = ?
-               ORDER BY a.created_at DESC''',
-            (project_id,)
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        
+        updates = []
+        for row in rows:
+            try:
+                analysis_data = json.loads(row['analysis_data']) if row['analysis_data'] else None
+                recommendations = json.loads(row['recommendations']) if row['recommendations'] else None
+            except ValueError as e:
+                print(f"Error compacting analysis {row['id']}: {e}")
+                continue
+            scalars = analysis_scalars(analysis_data)
+            payload = encode_payload({'analysis_data': analysis_data, 'recommendations': recommendations})
+            updates.append((*scalars.values(), payload, row['id']))
+        
+        cursor.executemany(
+            f'''UPDATE analyses SET {', '.join(f'{column} = ?' for column in ANALYSIS_SCALAR_COLUMNS)},
+               payload = ?, analysis_data = '', recommendations = ''
+               WHERE id = ?''',
+            updates
         )
+        conn.commit()
+        converted += len(updates)
+        if progress_callback:
+            progress_callback(converted / total, f"Compacted {converted} of {total} analyses")
     
-    analyses = cursor.fetchall()
     conn.close()
-    
-    return analyses
+    return converted
 
 def ensure_patents_exist():
     """Make sure the demo patents exist in the database"""
@@ -0,0 +1,255 @@
+# database/records.py
+"""
+Compact record types returned by db_manager.
+
+Analyses keep their scores in scalar columns and the bulky analysis and
+recommendation structures in a compressed binary payload. AnalysisRecord
+exposes the scalars directly and decodes the payload only when one of the
+payload fields is accessed.
+
+PatentRecord likewise holds a patent's short columns and reads its abstract
+and full text only when they are used.
+"""
+
+import json
+import zlib
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:
+    msgpack = None
+    zstandard = None
+
+# First byte of every payload identifies how the rest is encoded
+CODEC_ZLIB_JSON = 1
+CODEC_ZSTD_MSGPACK = 2
+
+# Category keys of PatentAnalyzer.calculate_seo_relevance stored as columns
+ANALYSIS_CATEGORY_COLUMNS = {
+    'search_algorithms': 'search_algorithms_score',
+    'content_analysis': 'content_analysis_score',
+    'user_behavior': 'user_behavior_score',
+    'technical_seo': 'technical_seo_score',
+    'ml_ai': 'ml_ai_score',
+}
+
+ANALYSIS_SCALAR_COLUMNS = (
+    'overall_relevance', 'innovation_score', *ANALYSIS_CATEGORY_COLUMNS.values()
+)
+
+
+def encode_payload(value):
+    """Serialize and compress a JSON-compatible value"""
+    if msgpack is not None:
+        body = zstandard.ZstdCompressor(level=3).compress(msgpack.packb(value, use_bin_type=True))
+        return bytes([CODEC_ZSTD_MSGPACK]) + body
+    body = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 6)
+    return bytes([CODEC_ZLIB_JSON]) + body
+
+
+def decode_payload(payload):
+    """Decode a payload written by encode_payload"""
+    codec, body = payload[0], payload[1:]
+    if codec == CODEC_ZLIB_JSON:
+        return json.loads(zlib.decompress(body))
+    if codec == CODEC_ZSTD_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError('msgpack and zstandard are required to read this analysis')
+        return msgpack.unpackb(zstandard.ZstdDecompressor().decompress(body), raw=False)
+    raise ValueError(f"Unknown payload codec {codec}")
+
+
+def analysis_scalars(analysis_data):
+    """Extract the scalar score columns from an analysis dict"""
+    seo_relevance = analysis_data.get('seo_relevance', {}) if isinstance(analysis_data, dict) else {}
+    categories = seo_relevance.get('relevance_by_category', {})
+    scalars = {
+        'overall_relevance': seo_relevance.get('overall_relevance_score'),
+        'innovation_score': analysis_data.get('innovation_score') if isinstance(analysis_data, dict) else None,
+    }
+    for category, column in ANALYSIS_CATEGORY_COLUMNS.items():
+        scalars[column] = categories.get(category)
+    return scalars
+
+
+class AnalysisRecord:
+    """An analyses row whose payload fields are decoded on first access.
+
+    Supports attribute access, ``record['field']`` and ``record.get()`` so it
+    can stand in for the sqlite3.Row previously returned.
+    """
+
+    __slots__ = ('_fields', '_payload', '_decoded', '_loader')
+
+    PAYLOAD_FIELDS = ('analysis_data', 'recommendations')
+
+    def __init__(self, fields, payload=None, loader=None):
+        """
+        Args:
+            fields (dict): Scalar columns
+            payload (bytes): Encoded payload, if it was selected
+            loader (callable): Called with no arguments to fetch the payload
+                (bytes, or a dict of legacy JSON fields) when it wasn't
+        """
+        self._fields = fields
+        self._payload = payload
+        self._decoded = None
+        self._loader = loader
+
+    def _decode(self):
+        if self._decoded is None:
+            payload = self._payload
+            if payload is None and self._loader is not None:
+                payload = self._loader()
+            if isinstance(payload, (bytes, memoryview)):
+                self._decoded = decode_payload(bytes(payload))
+            else:
+                # Rows written before compaction hold JSON text columns
+                legacy = payload or {}
+                self._decoded = {
+                    field: json.loads(legacy[field]) if legacy.get(field) else None
+                    for field in self.PAYLOAD_FIELDS
+                }
+            self._payload = None
+        return self._decoded
+
+    def __getattr__(self, name):
+        if name in AnalysisRecord.PAYLOAD_FIELDS:
+            return self._decode().get(name)
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        if key in self.PAYLOAD_FIELDS:
+            return self._decode().get(key)
+        return self._fields[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._fields) + list(self.PAYLOAD_FIELDS)
+
+    def to_dict(self, include_payload=False):
+        """Convert to a JSON serializable dict, decoding the payload only if asked"""
+        data = dict(self._fields)
+        if include_payload:
+            data.update(self._decode())
+        return data
+
+    def __repr__(self):
+        return f"AnalysisRecord(id={self._fields.get('id')!r}, patent_id={self._fields.get('patent_id')!r})"
+
+
+# Marks a lazy patent column that hasn't been read yet (None is a valid value)
+_UNLOADED = object()
+
+
+class PatentBatchLoader:
+    """Loads a deferred column for every PatentRecord of one query at once.
+
+    The first access to e.g. ``abstract`` on any record of a page reads that
+    column for the whole page in one query, instead of one query per record.
+    """
+
+    __slots__ = ('_fetch', '_records')
+
+    def __init__(self, fetch):
+        """
+        Args:
+            fetch (callable): Called as fetch(ids, field) and returns a dict
+                of patents.id -> value
+        """
+        self._fetch = fetch
+        self._records = []
+
+    def add(self, record):
+        self._records.append(record)
+
+    def load(self, field):
+        pending = [record for record in self._records if getattr(record, '_' + field) is _UNLOADED]
+        values = self._fetch([record.id for record in pending], field)
+        for record in pending:
+            setattr(record, '_' + field, values.get(record.id))
+
+
+class PatentRecord:
+    """A patents row holding its short columns, with large text deferred.
+
+    ``abstract`` and ``full_text`` are read from the database on first access
+    (see PatentBatchLoader) unless they were selected with the row. Supports
+    attribute access, ``record['field']`` and ``record.get()`` so it can stand
+    in for the sqlite3.Row previously returned.
+    """
+
+    COLUMNS = ('id', 'patent_id', 'title', 'filing_date', 'issue_date', 'inventors', 'assignee', 'category')
+    LAZY_FIELDS = ('abstract', 'full_text')
+
+    __slots__ = COLUMNS + ('_abstract', '_full_text', '_loader')
+
+    def __init__(self, row, loader=None):
+        """
+        Args:
+            row: Mapping with at least COLUMNS, and optionally LAZY_FIELDS
+            loader (PatentBatchLoader): Loads LAZY_FIELDS missing from row
+        """
+        keys = row.keys()
+        for column in self.COLUMNS:
+            setattr(self, column, row[column])
+        self._abstract = row['abstract'] if 'abstract' in keys else _UNLOADED
+        self._full_text = row['full_text'] if 'full_text' in keys else _UNLOADED
+        self._loader = loader
+        if loader is not None:
+            loader.add(self)
+
+    def _lazy(self, field):
+        value = getattr(self, '_' + field)
+        if value is _UNLOADED:
+            if self._loader is None:
+                return None
+            self._loader.load(field)
+            value = getattr(self, '_' + field)
+        return value
+
+    @property
+    def abstract(self):
+        return self._lazy('abstract')
+
+    @property
+    def full_text(self):
+        return self._lazy('full_text')
+
+    def __getitem__(self, key):
+        if key in self.COLUMNS or key in self.LAZY_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self.COLUMNS) + list(self.LAZY_FIELDS)
+
+    def to_dict(self, lazy_fields=()):
+        """Convert to a JSON serializable dict.
+
+        Deferred columns are included if they were already loaded or are
+        listed in lazy_fields (which loads them).
+        """
+        data = {column: getattr(self, column) for column in self.COLUMNS}
+        for field in self.LAZY_FIELDS:
+            if field in lazy_fields or getattr(self, '_' + field) is not _UNLOADED:
+                data[field] = self._lazy(field)
+        return data
+
+    def __repr__(self):
+        return f"PatentRecord(patent_id={self.patent_id!r}, title={self.title!r})"
@@ -17,6 +17,7 @@ CREATE TABLE IF NOT EXISTS uploads (
     filename TEXT NOT NULL,
     notes TEXT,
     uploaded_at TIMESTAMP NOT NULL,
+    deleted_at TIMESTAMP, -- set by a soft delete until the data is cleaned up
     FOREIGN KEY (project_id) REFERENCES projects (id)
 );
 
@@ -40,14 +41,50 @@ CREATE TABLE IF NOT EXISTS analyses (
     project_id INTEGER NOT NULL,
     patent_id TEXT NOT NULL,
     upload_id INTEGER NOT NULL,
-    analysis_data TEXT NOT NULL, -- JSON string
-    recommendations TEXT NOT NULL, -- JSON string
+    analysis_data TEXT NOT NULL, -- JSON string (legacy rows; '' once compacted)
+    recommendations TEXT NOT NULL, -- JSON string (legacy rows; '' once compacted)
     created_at TIMESTAMP NOT NULL,
+    overall_relevance INTEGER,
+    innovation_score INTEGER,
+    search_algorithms_score INTEGER,
+    content_analysis_score INTEGER,
+    user_behavior_score INTEGER,
+    technical_seo_score INTEGER,
+    ml_ai_score INTEGER,
+    payload BLOB, -- analysis_data and recommendations, see database/records.py
     FOREIGN KEY (project_id) REFERENCES projects (id),
     FOREIGN KEY (patent_id) REFERENCES patents (patent_id),
     FOREIGN KEY (upload_id) REFERENCES uploads (id)
 );
 
+-- Patent analyses shown by server_updated.py (written by the patent_analysis job)
+CREATE TABLE IF NOT EXISTS patent_analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patent_id INTEGER, -- patents.id
+    seo_impact TEXT, -- 'High', 'Medium', 'Low'
+    innovation_score INTEGER,
+    keywords TEXT, -- JSON string
+    keyphrases TEXT, -- JSON string
+    recommendations TEXT, -- JSON string
+    insight_summary TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (patent_id) REFERENCES patents (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_patent_analyses_patent ON patent_analyses (patent_id);
+
+-- Patents saved to a project from server_updated.py
+CREATE TABLE IF NOT EXISTS project_patents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id INTEGER,
+    patent_id INTEGER, -- patents.id
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id),
+    FOREIGN KEY (patent_id) REFERENCES patents (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_project_patents_project ON project_patents (project_id, patent_id);
+
 -- Ahrefs backlinks table
 CREATE TABLE IF NOT EXISTS ahrefs_backlinks (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -91,6 +128,11 @@ CREATE TABLE IF NOT EXISTS screaming_frog_data (
     FOREIGN KEY (upload_id) REFERENCES uploads (id)
 );
 
+-- Upload child rows are looked up and deleted by upload_id
+CREATE INDEX IF NOT EXISTS idx_ahrefs_backlinks_upload ON ahrefs_backlinks (upload_id);
+CREATE INDEX IF NOT EXISTS idx_ahrefs_internal_links_upload ON ahrefs_internal_links (upload_id);
+CREATE INDEX IF NOT EXISTS idx_screaming_frog_data_upload ON screaming_frog_data (upload_id);
+
 -- Search Console data
 CREATE TABLE IF NOT EXISTS search_console_data (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -105,3 +147,186 @@ CREATE TABLE IF NOT EXISTS search_console_data (
     date TEXT,
     FOREIGN KEY (upload_id) REFERENCES uploads (id)
 );
+
+-- Search Console rollups by day/week/month, maintained on ingest (see modules/uploads/rollups.py)
+CREATE TABLE IF NOT EXISTS gsc_rollups (
+    project_id INTEGER NOT NULL,
+    dimension TEXT NOT NULL, -- 'total', 'url', 'query'
+    period TEXT NOT NULL, -- 'day', 'week', 'month'
+    period_start TEXT NOT NULL, -- YYYY-MM-DD (weeks start on Monday)
+    value TEXT NOT NULL, -- the url or query ('' for total)
+    upload_id INTEGER NOT NULL,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    position_sum REAL NOT NULL DEFAULT 0, -- position weighted by impressions
+    row_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, dimension, period, period_start, value, upload_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_gsc_rollups_upload ON gsc_rollups (upload_id);
+CREATE INDEX IF NOT EXISTS idx_search_console_data_upload_url ON search_console_data (upload_id, url);
+CREATE INDEX IF NOT EXISTS idx_search_console_data_upload_query ON search_console_data (upload_id, query);
+
+-- Streaming ingestion progress per upload (see modules/uploads/ingest.py)
+CREATE TABLE IF NOT EXISTS upload_progress (
+    upload_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL, -- 'running', 'complete', 'failed'
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    rows_skipped INTEGER NOT NULL DEFAULT 0,
+    bytes_processed INTEGER NOT NULL DEFAULT 0,
+    bytes_total INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (upload_id) REFERENCES uploads (id)
+);
+
+-- Background jobs (see utils/job_queue.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    payload TEXT NOT NULL, -- JSON string
+    status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+    progress REAL NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    result TEXT, -- JSON string
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMP NOT NULL,
+    worker_id TEXT,
+    heartbeat_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after);
+
+-- MinHash signatures for similar-patent search (see utils/patent_api/similarity.py)
+CREATE TABLE IF NOT EXISTS patent_minhash (
+    patent_id TEXT PRIMARY KEY,
+    num_perm INTEGER NOT NULL, -- 0 once the patent has no text (kept so other processes drop it)
+    signature BLOB NOT NULL, -- uint32 array
+    updated_at TIMESTAMP NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0 -- increases with every write; processes refresh from it
+);
+CREATE INDEX IF NOT EXISTS idx_patent_minhash_version ON patent_minhash (version);
+
+-- Citation graph and influence scores (see utils/patent_api/citations.py)
+CREATE TABLE IF NOT EXISTS patent_citations (
+    citing_patent_id TEXT NOT NULL,
+    cited_patent_id TEXT NOT NULL,
+    fetched_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (citing_patent_id, cited_patent_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_patent_citations_cited ON patent_citations (cited_patent_id);
+
+CREATE TABLE IF NOT EXISTS citation_crawls (
+    patent_id TEXT NOT NULL,
+    direction TEXT NOT NULL, -- forward, backward
+    status TEXT NOT NULL, -- ok, error
+    citation_count INTEGER NOT NULL DEFAULT 0,
+    crawled_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (patent_id, direction)
+);
+
+CREATE TABLE IF NOT EXISTS patent_influence (
+    patent_id TEXT PRIMARY KEY,
+    pagerank REAL NOT NULL,
+    percentile REAL NOT NULL,
+    in_degree INTEGER NOT NULL,
+    out_degree INTEGER NOT NULL,
+    computed_at TIMESTAMP NOT NULL
+);
+
+-- Ranked WordNet synonyms for query expansion (see utils/synonyms.py)
+CREATE TABLE IF NOT EXISTS synonyms (
+    word TEXT PRIMARY KEY,
+    expansions TEXT NOT NULL, -- tab-separated, best first
+    updated_at TIMESTAMP NOT NULL
+) WITHOUT ROWID;
+
+-- Top patent matches per crawled page and Search Console query (see utils/patent_api/relevance.py)
+CREATE TABLE IF NOT EXISTS patent_relevance (
+    project_id INTEGER NOT NULL,
+    target_type TEXT NOT NULL, -- 'url', 'query'
+    target TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    patent_id TEXT NOT NULL,
+    score REAL NOT NULL, -- TF-IDF cosine similarity
+    computed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (project_id, target_type, target, rank)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_patent_relevance_patent ON patent_relevance (project_id, patent_id);
+
+-- Per-patent progress of a patent list import, so an interrupted run resumes (see scripts/import_patents.py)
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+    run_key TEXT NOT NULL, -- hash of the imported list
+    patent_id TEXT NOT NULL,
+    status TEXT NOT NULL, -- 'saved', 'failed'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (run_key, patent_id)
+) WITHOUT ROWID;
+
+-- Per-field metadata backfill attempts with retry backoff (see scripts/backfill_metadata.py)
+CREATE TABLE IF NOT EXISTS backfill_attempts (
+    field TEXT NOT NULL,
+    patent_id TEXT NOT NULL,
+    status TEXT NOT NULL, -- 'filled', 'missing', 'error'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_attempt_at TIMESTAMP NOT NULL,
+    next_attempt_at TIMESTAMP, -- NULL once filled
+    PRIMARY KEY (field, patent_id)
+) WITHOUT ROWID;
+
+-- Shared token vocabulary and per-patent token ID arrays (see utils/patent_api/token_store.py)
+CREATE TABLE IF NOT EXISTS token_vocab (
+    id INTEGER PRIMARY KEY,
+    token TEXT NOT NULL UNIQUE,
+    lemma TEXT NOT NULL -- lemma of the lowercase token
+);
+
+CREATE TABLE IF NOT EXISTS patent_tokens (
+    patent_id TEXT PRIMARY KEY,
+    token_count INTEGER NOT NULL,
+    tokens BLOB NOT NULL, -- zlib-compressed little-endian uint32 token IDs
+    text_hash TEXT NOT NULL, -- sha1 of the tokenizer backend and the tokenized text
+    updated_at TIMESTAMP NOT NULL
+) WITHOUT ROWID;
+
+-- SEO term counts per patent, the count matrix behind corpus rescoring (see utils/patent_api/rescoring.py)
+CREATE TABLE IF NOT EXISTS seo_terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS seo_term_counts (
+    patent_id TEXT PRIMARY KEY,
+    term_count INTEGER NOT NULL, -- number of seo_terms counted (by ascending id)
+    counts BLOB NOT NULL, -- zlib-compressed little-endian uint32 count per term
+    text_length INTEGER NOT NULL, -- length of the counted text, to detect changes
+    updated_at TIMESTAMP NOT NULL
+) WITHOUT ROWID;
+
+-- Other forms of stored patent IDs (see utils/patent_api/patent_ids.py)
+CREATE TABLE IF NOT EXISTS patent_aliases (
+    alias TEXT PRIMARY KEY, -- e.g. US6285999 for US6285999B1
+    patent_id TEXT NOT NULL -- the ID the patent is stored under
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_patent_aliases_patent ON patent_aliases (patent_id);
+
+-- Claims on in-progress computations shared between processes (see utils/singleflight.py)
+CREATE TABLE IF NOT EXISTS singleflight (
+    key TEXT PRIMARY KEY, -- operation and canonical request, e.g. patent_details:US6285999B1
+    owner TEXT NOT NULL, -- host:pid of the process computing it
+    status TEXT NOT NULL, -- running, done, failed or unshared
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT -- JSON result for waiting processes
+) WITHOUT ROWID;
@@ -0,0 +1,229 @@
+# modules/patents/jobs.py
+"""
+Background job handlers for patent saving, analysis and imports.
+
+Imported by scripts/job_worker.py so the handlers are registered with the
+job queue before workers start claiming jobs.
+"""
+
+import json
+
+from database.db_manager import get_db, iter_patent_text, save_patent
+from utils import singleflight
+from utils.job_queue import register_job_handler
+from utils.patent_api import citations
+from utils.patent_api.patent_ids import resolve_patent_id
+from utils.patent_api import token_store
+from utils.patent_api import rescoring
+
+
+def _link_to_project(project_id, patent_db_id):
+    """Link a stored patent to a project unless it already is"""
+    conn = get_db()
+    conn.execute('''
+        INSERT INTO project_patents (project_id, patent_id)
+        SELECT ?, ? WHERE NOT EXISTS (
+            SELECT 1 FROM project_patents WHERE project_id = ? AND patent_id = ?
+        )
+    ''', (project_id, patent_db_id, project_id, patent_db_id))
+    conn.commit()
+    conn.close()
+
+
+@register_job_handler('patent_save')
+def save_patent_job(payload, job):
+    """Fetch a patent's details and save it, optionally linking it to a project"""
+    from patent_search import get_patent_details
+
+    # Any form of an already stored patent's ID resolves to the stored one
+    patent_id = resolve_patent_id(payload.get('patent_id', '')) or payload.get('patent_id', '')
+    project_id = payload.get('project_id')
+
+    conn = get_db()
+    existing = conn.execute('SELECT id FROM patents WHERE patent_id = ?', (patent_id,)).fetchone()
+    conn.close()
+    if existing:
+        patent_db_id = existing['id']
+        if project_id:
+            _link_to_project(project_id, patent_db_id)
+        return {'patent_db_id': patent_db_id, 'location': f'/patents/view/{patent_db_id}', 'existing': True}
+
+    job.progress(0.1, f"Fetching {patent_id}")
+    patent_details = get_patent_details(patent_id)
+    if not patent_details:
+        raise ValueError(f"Patent {patent_id} not found")
+
+    job.progress(0.7, 'Saving patent')
+    patent_db_id = save_patent(
+        patent_id,
+        patent_details['title'],
+        patent_details['abstract'],
+        patent_details['filing_date'],
+        patent_details['issue_date'],
+        patent_details['inventors'],
+        patent_details['assignee'],
+        patent_details['category'],
+        patent_details['full_text']
+    )
+
+    # If project ID is provided, link patent to project
+    if project_id:
+        _link_to_project(project_id, patent_db_id)
+
+    return {'patent_db_id': patent_db_id, 'location': f'/patents/view/{patent_db_id}'}
+
+
+@register_job_handler('patent_analysis')
+def analyze_patent_job(payload, job):
+    """Run the PatentAnalyzer over a stored patent and save the analysis"""
+    from utils.patent_api.analyzer import ANALYZER_CHUNK_CHARS, PatentAnalyzer
+
+    patent_id = payload.get('patent_id', '')
+
+    conn = get_db()
+    # Very long full texts are left in the database and streamed below
+    patent = conn.execute('''
+        SELECT id, patent_id, title, abstract, filing_date, issue_date, inventors, assignee, category,
+               length(full_text) AS full_text_length,
+               CASE WHEN length(full_text) <= ? THEN full_text END AS full_text
+        FROM patents WHERE id = ?
+    ''', (ANALYZER_CHUNK_CHARS, patent_id)).fetchone()
+    conn.close()
+    if not patent:
+        raise ValueError(f"Patent {patent_id} not found")
+
+    patent = dict(patent)
+    # Stored citation influence feeds the innovation score without a live scrape
+    patent.update(citations.get_influence(patent['patent_id']))
+
+    analyzer = PatentAnalyzer()
+    # Concurrent jobs for the same patent and analyzer settings share one analysis
+    key = singleflight.flight_key('patent_analysis', patent['patent_id'], analyzer.config_version())
+    return singleflight.do(key, _run_analysis, patent, analyzer, job)
+
+
+def _run_analysis(patent, analyzer, job):
+    """Analyze a patent and save the analysis (see analyze_patent_job)"""
+    from utils.patent_api.analyzer import ANALYZER_CHUNK_CHARS, seo_impact
+
+    job.progress(0.1, 'Analyzing patent')
+    if (patent['full_text_length'] or 0) > ANALYZER_CHUNK_CHARS:
+        analysis = analyzer.analyze_stream(patent, iter_patent_text(patent['patent_id']))
+    else:
+        # Tokenized once per text version; later analyses reuse the stored tokens
+        token_ids = token_store.store_patent_tokens(patent, analyzer)
+        analysis = analyzer.analyze_tokens(token_ids, token_store.get_vocabulary(), patent)
+
+    job.progress(0.8, 'Generating recommendations')
+    recommendations = analyzer.generate_recommendations(analysis)
+    recommendation_items = [
+        item
+        for section in ('content_strategy', 'technical_seo', 'competitive_analysis')
+        for group in recommendations[section]
+        for item in group['items']
+    ]
+
+    overall_score = analysis['seo_relevance']['overall_relevance_score']
+    keywords = [keyword for keyword, _ in analysis['keywords'][:10]]
+    keyphrases = [phrase for phrase, _ in analysis['keyphrases'][:10]]
+    summary = (
+        f"This patent focuses on {', '.join(keywords[:3])}."
+        if keywords else 'No significant keywords were found in this patent.'
+    )
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO patent_analyses (
+            patent_id, seo_impact, innovation_score, keywords,
+            keyphrases, recommendations, insight_summary
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        patent['id'],
+        seo_impact(overall_score),
+        analysis['innovation_score'],
+        json.dumps(keywords),
+        json.dumps(keyphrases),
+        json.dumps(recommendation_items),
+        summary
+    ))
+    analysis_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    return {'analysis_id': analysis_id, 'location': f'/patents/analysis/{analysis_id}'}
+
+
+@register_job_handler('import_patents')
+def import_patents_job(payload, job):
+    """Import a categorized patent list (see scripts/import_patents.py)"""
+    from scripts.import_patents import process_patents
+
+    return process_patents(payload['patents_list'], progress_callback=job.progress,
+                           refresh=payload.get('refresh', False))
+
+
+@register_job_handler('update_assignees')
+def update_assignees_job(payload, job):
+    """Backfill missing assignees (see scripts/update_patent_assignees.py)"""
+    from scripts.update_patent_assignees import update_assignees
+
+    updated_count = update_assignees(progress_callback=job.progress)
+    return {'updated': updated_count}
+
+
+@register_job_handler('backfill_metadata')
+def backfill_metadata_job(payload, job):
+    """Backfill missing metadata fields (see scripts/backfill_metadata.py)"""
+    from scripts.backfill_metadata import backfill
+
+    return backfill(
+        tuple(payload.get('fields', ('assignee',))),
+        patent_ids=payload.get('patent_ids'),
+        progress_callback=job.progress
+    )
+
+
+@register_job_handler('crawl_citations')
+def crawl_citations_job(payload, job):
+    """Crawl citations and recompute influence scores (see scripts/crawl_citations.py)"""
+    summary = citations.crawl_citations(
+        patent_ids=payload.get('patent_ids'),
+        max_workers=payload.get('max_workers'),
+        progress_callback=lambda fraction, message: job.progress(fraction * 0.9, message)
+    )
+    job.progress(0.9, 'Computing influence scores')
+    summary.update(citations.compute_influence_scores())
+    return summary
+
+
+@register_job_handler('patent_relevance')
+def patent_relevance_job(payload, job):
+    """Match project pages and queries to patents (see scripts/build_patent_relevance.py)"""
+    from utils.patent_api.relevance import build_patent_index, compute_project_relevance
+
+    job.progress(0.0, 'Indexing patents')
+    index = build_patent_index()
+    job.progress(0.2, 'Scoring pages and queries')
+    return compute_project_relevance(
+        payload['project_id'], index=index,
+        progress_callback=lambda fraction, message: job.progress(0.2 + fraction * 0.8, message)
+    )
+
+
+@register_job_handler('seo_rescore')
+def seo_rescore_job(payload, job):
+    """Rescore every patent's SEO relevance from the stored term counts"""
+    from utils.patent_api.analyzer import PatentAnalyzer
+
+    analyzer = PatentAnalyzer()
+    if payload.get('weights_file') and not analyzer.load_seo_weights(payload['weights_file']):
+        raise ValueError(f"Could not load SEO weights from {payload['weights_file']}")
+
+    counted = rescoring.update_term_counts(
+        analyzer, progress_callback=lambda fraction, message: job.progress(fraction * 0.8, message)
+    )
+    scores = rescoring.rescore(analyzer)
+    updated = rescoring.apply_scores(scores)
+    job.progress(1.0, f"Rescored {len(scores['patent_ids'])} patents")
+    return {'counted': counted, 'patents': len(scores['patent_ids']), 'analyses_updated': updated}
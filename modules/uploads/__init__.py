@@ -0,0 +1,2 @@
+# modules/uploads/__init__.py
+# Package initialization
@@ -0,0 +1,592 @@
+# modules/uploads/ingest.py
+"""
+Streaming ingestion of CSV uploads (Ahrefs exports, crawls, Search Console).
+
+Files are read incrementally and written with executemany in large
+transactions, so memory stays bounded by the batch size rather than the file
+size. Large crawl exports are split at row boundaries and parsed in a process
+pool, with this process as the single SQLite writer. Progress is recorded
+against the upload in the upload_progress table.
+"""
+
+import io
+import os
+import re
+import csv
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (
+    ALLOWED_EXTENSIONS, INGEST_BATCH_SIZE, INGEST_COMMIT_ROWS, INGEST_MAX_FIELD_SIZE, INGEST_WORKERS,
+    INGEST_CHUNK_BYTES
+)
+from database.db_manager import get_db
+from utils.helpers import allowed_file, iter_csv
+from modules.uploads import rollups
+
+INGEST_READ_BUFFER = 1024 * 1024
+
+# upload_type -> spec registered with register_ingester
+INGESTERS = {}
+
+
+csv.field_size_limit(INGEST_MAX_FIELD_SIZE)
+
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def normalize_header(name):
+    """Normalize a CSV header for matching ('Domain Rating ' -> 'domain rating')"""
+    return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+
+def to_text(value):
+    value = value.strip()
+    return value or None
+
+
+def to_int(value):
+    value = value.strip().replace(',', '')
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def to_float(value):
+    value = value.strip().replace(',', '').rstrip('%')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def register_ingester(upload_type, table, columns, required=(), types=None, parallel=False,
+                      on_rows=None, on_reset=None):
+    """Register how an upload type's CSV maps onto its table.
+
+    Args:
+        upload_type (str): uploads.upload_type value
+        table (str): Destination table (must have an upload_id column)
+        columns (dict): Column name -> header aliases, matched after
+            normalize_header; the column name itself always matches
+        required (tuple): Columns a row must have a value for to be stored
+        types (dict): Column name -> converter (default to_text)
+        parallel (bool): Parse files larger than INGEST_CHUNK_BYTES in a
+            process pool (see ingest_upload_parallel)
+        on_rows (callable): Called as on_rows(conn, upload_id, columns, rows)
+            with each batch before it is inserted, in the same transaction
+        on_reset (callable): Called as on_reset(conn, upload_id) when an
+            upload's existing rows are removed before re-ingestion
+    """
+    INGESTERS[upload_type] = {
+        'table': table,
+        'columns': {
+            column: {normalize_header(column)} | {normalize_header(alias) for alias in aliases}
+            for column, aliases in columns.items()
+        },
+        'required': tuple(required),
+        'types': types or {},
+        'parallel': parallel,
+        'on_rows': on_rows,
+        'on_reset': on_reset,
+    }
+
+
+def detect_csv_format(file_path):
+    """Detect the encoding and delimiter of a CSV export.
+
+    Ahrefs "for Excel" exports are UTF-16 and tab separated; others are
+    UTF-8 (with or without BOM) and comma separated.
+
+    Returns:
+        tuple: (encoding, delimiter)
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(64 * 1024)
+
+    if sample.startswith((b'\xff\xfe', b'\xfe\xff')):
+        encoding = 'utf-16'
+    else:
+        encoding = 'utf-8-sig'
+
+    first_line = sample.decode(encoding, errors='ignore').split('\n', 1)[0]
+    delimiter = '\t' if first_line.count('\t') > first_line.count(',') else ','
+    return encoding, delimiter
+
+
+def build_row_converter(spec, header):
+    """Map a CSV header onto the spec's columns.
+
+    Returns:
+        tuple: (columns, convert) where convert(row) returns the values to
+            insert, or None if a required value is missing
+
+    Raises:
+        ValueError: If a required column is missing from the header
+    """
+    normalized = [normalize_header(name) for name in header]
+    positions = []
+    for column, aliases in spec['columns'].items():
+        index = next((i for i, name in enumerate(normalized) if name in aliases), None)
+        if index is not None:
+            positions.append((column, index))
+
+    columns = [column for column, _ in positions]
+    missing = [column for column in spec['required'] if column not in columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    converters = [(spec['types'].get(column, to_text), index) for column, index in positions]
+    required = [k for k, column in enumerate(columns) if column in spec['required']]
+    width = len(header)
+
+    def convert(row):
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        values = tuple(cast(row[index]) for cast, index in converters)
+        for k in required:
+            if values[k] is None:
+                return None
+        return values
+
+    return columns, convert
+
+
+def insert_statement(table, columns):
+    """INSERT statement for a table's upload_id plus mapped columns"""
+    placeholders = ', '.join('?' for _ in range(len(columns) + 1))
+    return f"INSERT INTO {table} (upload_id, {', '.join(columns)}) VALUES ({placeholders})"
+
+
+class _CountingReader(io.RawIOBase):
+    """Raw file wrapper counting the bytes read, for progress reporting."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self.raw.readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+
+def set_progress(conn, upload_id, status, rows_processed=0, rows_skipped=0,
+                 bytes_processed=0, bytes_total=0, error=None):
+    """Record an upload's ingestion progress (caller commits)"""
+    now = _now()
+    conn.execute(
+        '''INSERT INTO upload_progress
+           (upload_id, status, rows_processed, rows_skipped, bytes_processed, bytes_total,
+            error, started_at, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (upload_id) DO UPDATE SET
+               status = excluded.status, rows_processed = excluded.rows_processed,
+               rows_skipped = excluded.rows_skipped, bytes_processed = excluded.bytes_processed,
+               bytes_total = excluded.bytes_total, error = excluded.error,
+               updated_at = excluded.updated_at''',
+        (upload_id, status, rows_processed, rows_skipped, bytes_processed, bytes_total, error, now, now)
+    )
+
+
+def get_upload_progress(upload_id):
+    """Get an upload's ingestion progress as a dict, or None"""
+    conn = get_db()
+    row = conn.execute('SELECT * FROM upload_progress WHERE upload_id = ?', (upload_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    progress = dict(row)
+    progress['fraction'] = (
+        min(1.0, progress['bytes_processed'] / progress['bytes_total']) if progress['bytes_total'] else 0.0
+    )
+    return progress
+
+
+def _get_spec(conn, upload_id):
+    """Look up the upload's type and its registered ingester spec"""
+    upload = conn.execute('SELECT upload_type FROM uploads WHERE id = ?', (upload_id,)).fetchone()
+    if not upload:
+        raise ValueError(f"Upload {upload_id} not found")
+    spec = INGESTERS.get(upload['upload_type'])
+    if spec is None:
+        raise ValueError(f"No ingester registered for upload type '{upload['upload_type']}'")
+    return upload['upload_type'], spec
+
+
+def ingest_upload(upload_id, file_path, progress_callback=None, batch_size=None, commit_rows=None):
+    """Stream a CSV file into the table for the upload's type.
+
+    Rows already stored for the upload are replaced, so a failed ingestion
+    can simply be rerun. Large UTF-8 files of types registered with
+    parallel=True are handed to ingest_upload_parallel when more than one
+    worker is configured.
+
+    Args:
+        upload_id (int): The uploads row the data belongs to
+        file_path (str): Path to the CSV file
+        progress_callback (callable): Called as callback(fraction, message)
+            after each commit
+        batch_size (int): Rows per executemany call
+        commit_rows (int): Rows per transaction
+
+    Returns:
+        dict: Rows processed and skipped
+    """
+    validate_upload_file(file_path)
+    conn = get_db()
+    try:
+        _, spec = _get_spec(conn, upload_id)
+    finally:
+        conn.close()
+    if (spec['parallel'] and INGEST_WORKERS > 1 and os.path.getsize(file_path) > INGEST_CHUNK_BYTES
+            and detect_csv_format(file_path)[0] == 'utf-8-sig'):
+        return ingest_upload_parallel(upload_id, file_path, progress_callback=progress_callback,
+                                      batch_size=batch_size, commit_rows=commit_rows)
+
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    commit_rows = commit_rows or INGEST_COMMIT_ROWS
+
+    conn = get_db()
+    bytes_total = os.path.getsize(file_path)
+    processed = skipped = 0
+    try:
+        _, spec = _get_spec(conn, upload_id)
+        set_progress(conn, upload_id, 'running', bytes_total=bytes_total)
+        conn.execute(f"DELETE FROM {spec['table']} WHERE upload_id = ?", (upload_id,))
+        if spec['on_reset']:
+            spec['on_reset'](conn, upload_id)
+        conn.commit()
+
+        encoding, delimiter = detect_csv_format(file_path)
+        with open(file_path, 'rb') as raw:
+            counter = _CountingReader(raw)
+            text = io.TextIOWrapper(
+                io.BufferedReader(counter, INGEST_READ_BUFFER),
+                encoding=encoding, errors='replace', newline=''
+            )
+            rows = iter_csv(text, delimiter=delimiter)
+            header = next(rows, None)
+            if header is None:
+                raise ValueError('CSV file is empty')
+            columns, convert = build_row_converter(spec, header)
+            sql = insert_statement(spec['table'], columns)
+
+            batch = []
+            uncommitted = 0
+            for row in rows:
+                values = convert(row)
+                if values is None:
+                    skipped += 1
+                    continue
+                batch.append((upload_id,) + values)
+                if len(batch) >= batch_size:
+                    if spec['on_rows']:
+                        spec['on_rows'](conn, upload_id, columns, batch)
+                    conn.executemany(sql, batch)
+                    processed += len(batch)
+                    uncommitted += len(batch)
+                    batch = []
+                    if uncommitted >= commit_rows:
+                        set_progress(conn, upload_id, 'running', processed, skipped,
+                                     counter.bytes_read, bytes_total)
+                        conn.commit()
+                        uncommitted = 0
+                        if progress_callback:
+                            progress_callback(counter.bytes_read / bytes_total,
+                                              f"Imported {processed} rows")
+
+            if batch:
+                if spec['on_rows']:
+                    spec['on_rows'](conn, upload_id, columns, batch)
+                conn.executemany(sql, batch)
+                processed += len(batch)
+
+        set_progress(conn, upload_id, 'complete', processed, skipped, bytes_total, bytes_total)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        set_progress(conn, upload_id, 'failed', processed, skipped, 0, bytes_total, str(e))
+        conn.commit()
+        raise
+    finally:
+        conn.close()
+
+    return {'rows_processed': processed, 'rows_skipped': skipped}
+
+
+def validate_upload_file(file_path):
+    """Check a file against the upload rules in config.py.
+
+    Only the file type is checked here. MAX_CONTENT_LENGTH limits request
+    bodies where the servers receive them; files already on disk (crawl
+    exports placed by scripts/ingest_upload.py) may be any size.
+
+    Raises:
+        ValueError: If the extension isn't an allowed CSV
+    """
+    if not allowed_file(file_path, set(ALLOWED_EXTENSIONS) & {'csv'}):
+        raise ValueError(f"Not an allowed CSV file: {os.path.basename(file_path)}")
+
+
+def _next_row_end(f, position, quoted):
+    """Find the end of the row containing position.
+
+    Args:
+        f: Binary file positioned at position
+        position (int): Byte offset to scan from
+        quoted (bool): Whether position is inside a quoted field
+
+    Returns:
+        int: Offset just past the first newline outside quotes (the file
+            size if there is none)
+    """
+    while True:
+        block = f.read(64 * 1024)
+        if not block:
+            return position
+        start = 0
+        while True:
+            newline = block.find(b'\n', start)
+            if newline == -1:
+                quoted ^= block.count(b'"', start) % 2 == 1
+                break
+            quoted ^= block.count(b'"', start, newline) % 2 == 1
+            if not quoted:
+                return position + newline + 1
+            start = newline + 1
+        position += len(block)
+
+
+def split_csv_rows(file_path, chunk_bytes=None):
+    """Split a CSV file into byte ranges that start and end on row boundaries.
+
+    Quoted fields may contain newlines, so a newline only ends a row when an
+    even number of quote characters precede it (escaped quotes are doubled
+    and don't change the parity). Quotes are counted with bytes.count, so
+    the scan runs at close to disk speed.
+
+    Args:
+        file_path (str): Path to a UTF-8 CSV file
+        chunk_bytes (int): Approximate chunk size
+
+    Returns:
+        tuple: (header_end, list of (start, end) ranges covering the data rows)
+    """
+    chunk_bytes = chunk_bytes or INGEST_CHUNK_BYTES
+    size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, 'rb') as f:
+        header_end = _next_row_end(f, 0, False)
+        start = position = header_end
+        quoted = False
+        while start < size:
+            target = min(size, start + chunk_bytes)
+            # Track quote parity up to the target, then find the row end after it
+            f.seek(position)
+            remaining = target - position
+            while remaining > 0:
+                block = f.read(min(remaining, 1024 * 1024))
+                quoted ^= block.count(b'"') % 2 == 1
+                remaining -= len(block)
+            end = _next_row_end(f, target, quoted) if target < size else size
+            ranges.append((start, end))
+            # The scan stops just after an unquoted newline
+            start = position = end
+            quoted = False
+    return header_end, ranges
+
+
+def _parse_chunk(file_path, start, end, delimiter, header, upload_type, upload_id):
+    """Parse one byte range of a CSV file in a worker process.
+
+    Returns:
+        tuple: (rows ready for executemany, skipped row count)
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8', errors='replace')
+
+    _, convert = build_row_converter(INGESTERS[upload_type], header)
+    rows = []
+    skipped = 0
+    for row in iter_csv(io.StringIO(text, newline=''), delimiter=delimiter):
+        values = convert(row)
+        if values is None:
+            skipped += 1
+        else:
+            rows.append((upload_id,) + values)
+    return rows, skipped
+
+
+def ingest_upload_parallel(upload_id, file_path, workers=None, chunk_bytes=None,
+                           progress_callback=None, batch_size=None, commit_rows=None):
+    """Ingest a large UTF-8 CSV by parsing row-aligned chunks in a process pool.
+
+    Chunks are parsed concurrently but written in file order by this process
+    alone, so there is a single SQLite writer. At most two chunks per worker
+    are in flight, bounding memory regardless of file size.
+
+    Args:
+        upload_id (int): The uploads row the data belongs to
+        file_path (str): Path to the CSV file (validated with validate_upload_file)
+        workers (int): Parser processes (defaults to INGEST_WORKERS)
+        chunk_bytes (int): Approximate chunk size (defaults to INGEST_CHUNK_BYTES)
+        progress_callback (callable): Called as callback(fraction, message)
+        batch_size (int): Rows per executemany call
+        commit_rows (int): Rows per transaction
+
+    Returns:
+        dict: Rows processed and skipped
+    """
+    workers = workers or INGEST_WORKERS
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    commit_rows = commit_rows or INGEST_COMMIT_ROWS
+
+    conn = get_db()
+    bytes_total = os.path.getsize(file_path)
+    processed = skipped = 0
+    try:
+        validate_upload_file(file_path)
+        upload_type, spec = _get_spec(conn, upload_id)
+        set_progress(conn, upload_id, 'running', bytes_total=bytes_total)
+        conn.execute(f"DELETE FROM {spec['table']} WHERE upload_id = ?", (upload_id,))
+        if spec['on_reset']:
+            spec['on_reset'](conn, upload_id)
+        conn.commit()
+
+        encoding, delimiter = detect_csv_format(file_path)
+        if encoding != 'utf-8-sig':
+            raise ValueError(f"Parallel ingestion requires UTF-8 input, got {encoding}")
+
+        header_end, ranges = split_csv_rows(file_path, chunk_bytes)
+        with open(file_path, 'rb') as f:
+            header_text = f.read(header_end).decode('utf-8-sig', errors='replace')
+        header = next(iter_csv(io.StringIO(header_text, newline=''), delimiter=delimiter), None)
+        if header is None:
+            raise ValueError('CSV file is empty')
+        columns, _ = build_row_converter(spec, header)
+        sql = insert_statement(spec['table'], columns)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            next_range = 0
+            uncommitted = 0
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < workers * 2:
+                    start, end = ranges[next_range]
+                    pending.append((end, executor.submit(
+                        _parse_chunk, file_path, start, end, delimiter, header,
+                        upload_type, upload_id
+                    )))
+                    next_range += 1
+
+                end, future = pending.pop(0)
+                rows, chunk_skipped = future.result()
+                skipped += chunk_skipped
+                for offset in range(0, len(rows), batch_size):
+                    batch = rows[offset:offset + batch_size]
+                    if spec['on_rows']:
+                        spec['on_rows'](conn, upload_id, columns, batch)
+                    conn.executemany(sql, batch)
+                processed += len(rows)
+                uncommitted += len(rows)
+                del rows
+
+                if uncommitted >= commit_rows:
+                    set_progress(conn, upload_id, 'running', processed, skipped, end, bytes_total)
+                    conn.commit()
+                    uncommitted = 0
+                    if progress_callback:
+                        progress_callback(end / bytes_total, f"Imported {processed} rows")
+
+        set_progress(conn, upload_id, 'complete', processed, skipped, bytes_total, bytes_total)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        set_progress(conn, upload_id, 'failed', processed, skipped, 0, bytes_total, str(e))
+        conn.commit()
+        raise
+    finally:
+        conn.close()
+
+    return {'rows_processed': processed, 'rows_skipped': skipped}
+
+
+register_ingester(
+    'ahrefs_backlinks',
+    table='ahrefs_backlinks',
+    columns={
+        'url': ('Target URL', 'Link URL', 'URL'),
+        'backlink_url': ('Referring page URL', 'Referring page', 'Source URL'),
+        'domain_rating': ('Domain rating', 'DR'),
+        'url_rating': ('UR', 'URL rating', 'URL Rating (desc)'),
+        'anchor_text': ('Anchor', 'Anchor text'),
+        'first_seen': ('First seen',),
+        'last_seen': ('Last seen', 'Last check'),
+    },
+    required=('url', 'backlink_url'),
+    types={'domain_rating': to_int, 'url_rating': to_int},
+)
+
+register_ingester(
+    'ahrefs_internal_links',
+    table='ahrefs_internal_links',
+    columns={
+        'source_url': ('Source URL', 'Source page', 'Referring page URL', 'From'),
+        'target_url': ('Target URL', 'Destination URL', 'Link URL', 'To'),
+        'anchor_text': ('Anchor', 'Anchor text'),
+    },
+    required=('source_url', 'target_url'),
+)
+
+register_ingester(
+    'screaming_frog',
+    table='screaming_frog_data',
+    columns={
+        'url': ('Address',),
+        'status_code': ('Status Code',),
+        'title': ('Title 1',),
+        'meta_description': ('Meta Description 1',),
+        'h1': ('H1-1',),
+        'h2': ('H2-1',),
+        'content_type': ('Content Type',),
+        'word_count': ('Word Count',),
+        'inlinks': ('Inlinks',),
+        'outlinks': ('Outlinks',),
+        'redirect_url': ('Redirect URL',),
+        'indexability': ('Indexability',),
+    },
+    required=('url',),
+    types={'status_code': to_int, 'word_count': to_int, 'inlinks': to_int, 'outlinks': to_int},
+    parallel=True,
+)
+
+register_ingester(
+    'search_console',
+    table='search_console_data',
+    columns={
+        'url': ('Page', 'Landing page', 'Top pages', 'Address'),
+        'query': ('Top queries', 'Search query'),
+        'country': (),
+        'device': (),
+        'impressions': (),
+        'clicks': (),
+        'position': ('Average position', 'Avg position'),
+        'date': (),
+    },
+    required=('url',),
+    types={'impressions': to_int, 'clicks': to_int, 'position': to_float},
+    on_rows=rollups.add_rows,
+    on_reset=rollups.reset_upload,
+)
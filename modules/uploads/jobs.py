@@ -0,0 +1,24 @@
+# modules/uploads/jobs.py
+"""
+Background job handlers for upload ingestion.
+
+Imported by scripts/job_worker.py so the handlers are registered with the
+job queue before workers start claiming jobs.
+"""
+
+from database.db_manager import delete_upload
+from utils.job_queue import register_job_handler
+from modules.uploads.ingest import ingest_upload
+
+
+@register_job_handler('ingest_upload')
+def ingest_upload_job(payload, job):
+    """Stream an uploaded CSV into its table (see modules/uploads/ingest.py)"""
+    return ingest_upload(payload['upload_id'], payload['file_path'], progress_callback=job.progress)
+
+
+@register_job_handler('delete_upload')
+def delete_upload_job(payload, job):
+    """Remove a soft-deleted upload's rows in short batches"""
+    deleted = delete_upload(payload['upload_id'], progress_callback=job.progress)
+    return {'deleted': deleted}
@@ -0,0 +1,283 @@
+# modules/uploads/rollups.py
+"""
+Materialized Search Console rollups.
+
+Daily, weekly and monthly totals by url, by query and for the whole project
+are kept in gsc_rollups. They are updated incrementally as each batch of raw
+rows is ingested, in the same transaction, so trend and top-N views never
+aggregate search_console_data. Raw rows are only read for drill-downs.
+"""
+
+import datetime
+
+from database.db_manager import get_db
+
+PERIODS = ('day', 'week', 'month')
+DIMENSIONS = ('total', 'url', 'query')
+METRICS = ('clicks', 'impressions', 'ctr', 'position')
+
+_UPSERT = '''
+INSERT INTO gsc_rollups
+    (project_id, dimension, period, period_start, value, upload_id,
+     clicks, impressions, position_sum, row_count)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (project_id, dimension, period, period_start, value, upload_id) DO UPDATE SET
+    clicks = clicks + excluded.clicks,
+    impressions = impressions + excluded.impressions,
+    position_sum = position_sum + excluded.position_sum,
+    row_count = row_count + excluded.row_count
+'''
+
+def period_starts(date_text):
+    """Map a 'YYYY-MM-DD' date to its day, week (Monday) and month starts.
+
+    Returns:
+        tuple: (day, week, month) start dates, or None for an invalid date
+    """
+    try:
+        day = datetime.date.fromisoformat(date_text[:10])
+    except (TypeError, ValueError):
+        return None
+    week = day - datetime.timedelta(days=day.weekday())
+    return day.isoformat(), week.isoformat(), day.replace(day=1).isoformat()
+
+
+def reset_upload(conn, upload_id):
+    """Remove an upload's contribution to the rollups (caller commits)"""
+    conn.execute('DELETE FROM gsc_rollups WHERE upload_id = ?', (upload_id,))
+
+
+def add_rows(conn, upload_id, columns, rows):
+    """Fold a batch of ingested search_console_data rows into the rollups.
+
+    Called by the ingester with the batch about to be inserted, in the same
+    transaction (caller commits).
+
+    Args:
+        conn (sqlite3.Connection): The ingestion connection
+        upload_id (int): The upload the rows belong to
+        columns (list): Column names of the row values after upload_id
+        rows (list): (upload_id, *values) tuples
+    """
+    project = conn.execute('SELECT project_id FROM uploads WHERE id = ?', (upload_id,)).fetchone()
+    if project is None or 'date' not in columns:
+        return
+
+    # +1 skips the leading upload_id
+    index = {column: i + 1 for i, column in enumerate(columns)}
+    date_i = index['date']
+    url_i = index.get('url')
+    query_i = index.get('query')
+    clicks_i = index.get('clicks')
+    impressions_i = index.get('impressions')
+    position_i = index.get('position')
+
+    starts_cache = {}
+    totals = {}
+    for row in rows:
+        date_text = row[date_i]
+        starts = starts_cache.get(date_text)
+        if starts is None:
+            starts = starts_cache[date_text] = period_starts(date_text) or ()
+        if not starts:
+            continue
+
+        clicks = (row[clicks_i] or 0) if clicks_i else 0
+        impressions = (row[impressions_i] or 0) if impressions_i else 0
+        position = (row[position_i] or 0.0) if position_i else 0.0
+        keys = [('total', '')]
+        if url_i and row[url_i]:
+            keys.append(('url', row[url_i]))
+        if query_i and row[query_i]:
+            keys.append(('query', row[query_i]))
+
+        for period, start in zip(PERIODS, starts):
+            for dimension, value in keys:
+                key = (dimension, period, start, value)
+                entry = totals.get(key)
+                if entry is None:
+                    totals[key] = [clicks, impressions, position * impressions, 1]
+                else:
+                    entry[0] += clicks
+                    entry[1] += impressions
+                    entry[2] += position * impressions
+                    entry[3] += 1
+
+    project_id = project['project_id']
+    conn.executemany(_UPSERT, [
+        (project_id, dimension, period, start, value, upload_id, *entry)
+        for (dimension, period, start, value), entry in totals.items()
+    ])
+
+
+def rebuild_rollups(upload_id, batch_size=5000):
+    """Recompute one upload's rollups from its raw rows (e.g. after a schema upgrade).
+
+    Returns:
+        int: Raw rows folded into the rollups
+    """
+    columns = ['url', 'query', 'clicks', 'impressions', 'position', 'date']
+    conn = get_db()
+    reset_upload(conn, upload_id)
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(
+            f'''SELECT id, upload_id, {', '.join(columns)} FROM search_console_data
+                WHERE upload_id = ? AND id > ? ORDER BY id LIMIT ?''',
+            (upload_id, last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        add_rows(conn, upload_id, columns, [tuple(row)[1:] for row in rows])
+        total += len(rows)
+    conn.commit()
+    conn.close()
+    return total
+
+
+def choose_period(start=None, end=None):
+    """Pick the coarsest rollup period that covers [start, end] exactly"""
+    start_starts = period_starts(start) if start else None
+    end_day = period_starts(end) if end else None
+    if end_day:
+        following = (datetime.date.fromisoformat(end_day[0]) + datetime.timedelta(days=1)).isoformat()
+        next_starts = period_starts(following)
+    else:
+        next_starts = None
+
+    if (not start_starts or start_starts[0] == start_starts[2]) and \
+            (not next_starts or next_starts[0] == next_starts[2]):
+        return 'month'
+    if (not start_starts or start_starts[0] == start_starts[1]) and \
+            (not next_starts or next_starts[0] == next_starts[1]):
+        return 'week'
+    return 'day'
+
+
+def _range_clause(start, end):
+    clauses = []
+    params = []
+    if start:
+        clauses.append('period_start >= ?')
+        params.append(start)
+    if end:
+        clauses.append('period_start <= ?')
+        params.append(end)
+    return ''.join(f' AND {clause}' for clause in clauses), params
+
+
+def _metrics(row):
+    impressions = row['impressions'] or 0
+    return {
+        'clicks': row['clicks'] or 0,
+        'impressions': impressions,
+        'ctr': round(row['clicks'] / impressions, 4) if impressions else 0.0,
+        'position': round(row['position_sum'] / impressions, 2) if impressions else None,
+    }
+
+
+def get_trend(project_id, period='day', dimension='total', value=None, start=None, end=None):
+    """Clicks, impressions, CTR and position per period.
+
+    Args:
+        project_id (int): The project
+        period (str): 'day', 'week' or 'month'
+        dimension (str): 'total' for the whole project, or 'url' / 'query'
+            together with value
+        value (str): The url or query to trend
+        start (str): First date (YYYY-MM-DD), inclusive
+        end (str): Last date, inclusive
+
+    Returns:
+        list: One dict per period, oldest first
+    """
+    if period not in PERIODS or dimension not in DIMENSIONS:
+        raise ValueError('Invalid period or dimension')
+    if dimension != 'total' and not value:
+        raise ValueError(f"A value is required for the {dimension} dimension")
+
+    if start:
+        # Include the period that contains the start date
+        start = (period_starts(start) or (start,) * 3)[PERIODS.index(period)]
+    range_sql, range_params = _range_clause(start, end)
+    conn = get_db()
+    rows = conn.execute(
+        f'''SELECT period_start, SUM(clicks) AS clicks, SUM(impressions) AS impressions,
+                   SUM(position_sum) AS position_sum
+            FROM gsc_rollups
+            WHERE project_id = ? AND dimension = ? AND period = ? AND value = ?{range_sql}
+            GROUP BY period_start ORDER BY period_start''',
+        (project_id, dimension, period, value or '', *range_params)
+    ).fetchall()
+    conn.close()
+    return [dict(period_start=row['period_start'], **_metrics(row)) for row in rows]
+
+
+def get_top(project_id, dimension='query', metric='clicks', start=None, end=None, limit=20):
+    """Top urls or queries over a date range.
+
+    The coarsest rollup period aligned with the range is read, so an
+    all-time or whole-month query reads monthly rows only.
+
+    Returns:
+        list: Dicts with the value and its metrics, best first
+    """
+    if dimension not in ('url', 'query') or metric not in METRICS:
+        raise ValueError('Invalid dimension or metric')
+
+    period = choose_period(start, end)
+    range_sql, range_params = _range_clause(start, end)
+    order = {
+        'clicks': 'SUM(clicks) DESC',
+        'impressions': 'SUM(impressions) DESC',
+        'ctr': 'CAST(SUM(clicks) AS REAL) / MAX(SUM(impressions), 1) DESC',
+        'position': 'SUM(position_sum) / MAX(SUM(impressions), 1) ASC',
+    }[metric]
+
+    conn = get_db()
+    rows = conn.execute(
+        f'''SELECT value, SUM(clicks) AS clicks, SUM(impressions) AS impressions,
+                   SUM(position_sum) AS position_sum
+            FROM gsc_rollups
+            WHERE project_id = ? AND dimension = ? AND period = ?{range_sql}
+            GROUP BY value ORDER BY {order}, value LIMIT ?''',
+        (project_id, dimension, period, *range_params, limit)
+    ).fetchall()
+    conn.close()
+    return [dict(value=row['value'], **_metrics(row)) for row in rows]
+
+
+def get_rows(project_id, url=None, query=None, start=None, end=None, limit=100):
+    """Drill down into the raw rows for one url or query.
+
+    Returns:
+        list: search_console_data rows as dicts, newest first
+    """
+    if not url and not query:
+        raise ValueError('A url or query is required for a drill-down')
+
+    clauses = ['u.project_id = ?']
+    params = [project_id]
+    for column, value in (('url', url), ('query', query)):
+        if value:
+            clauses.append(f's.{column} = ?')
+            params.append(value)
+    if start:
+        clauses.append('s.date >= ?')
+        params.append(start)
+    if end:
+        clauses.append('s.date <= ?')
+        params.append(end)
+
+    conn = get_db()
+    rows = conn.execute(
+        f'''SELECT s.url, s.query, s.country, s.device, s.impressions, s.clicks, s.position, s.date
+            FROM search_console_data s JOIN uploads u ON u.id = s.upload_id
+            WHERE {' AND '.join(clauses)}
+            ORDER BY s.date DESC LIMIT ?''',
+        (*params, limit)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
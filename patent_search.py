@@ -11,13 +11,7 @@ import urllib.parse
 import urllib.request
 from datetime import datetime
 
-# Import libraries for text analysis
-import nltk
-from nltk.corpus import wordnet
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet')
+from utils.synonyms import expand_query
 
 # Base URL for Google Patents API
 GOOGLE_PATENTS_API_URL = "https://patents.google.com/api/search"
@@ -29,15 +23,8 @@ def clean_html(text):
 
 def expand_keywords(keywords):
     """Expand keywords with synonyms for better search results"""
-    expanded = set(keywords.split())
-    
-    for word in keywords.split():
-        for syn in wordnet.synsets(word):
-            for lemma in syn.lemmas():
-                expanded.add(lemma.name().replace('_', ' '))
-    
-    # Limit to top 10 synonyms to avoid over-expansion
-    return ' OR '.join(list(expanded)[:10])
+    # Ranked synonyms come from the precomputed table (see utils/synonyms.py)
+    return ' OR '.join(expand_query(keywords))
 
 def search_patents(query, num_results=10):
     """
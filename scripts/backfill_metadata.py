@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Backfill missing patent metadata from Google Patents.
+
+Usage:
+    python scripts/backfill_metadata.py assignee [inventors ...] [--workers N]
+
+Only the patent_id and the requested columns are read. A patent is fetched
+once for all of its missing fields, pages are downloaded concurrently under
+the import rate limit (see scripts/import_patents.py), and updates are
+written in batched transactions.
+
+Every attempt is recorded per field in backfill_attempts. A patent whose
+page couldn't be fetched, or didn't contain the field, is retried with
+exponential backoff (BACKFILL_RETRY_HOURS, doubled per attempt) and given
+up on after BACKFILL_MAX_ATTEMPTS, instead of being refetched on every run.
+"""
+
+import os
+import sys
+import time
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import BACKFILL_BATCH_SIZE, BACKFILL_MAX_ATTEMPTS, BACKFILL_RETRY_HOURS
+from database.db_manager import get_db, notify_patent_saved
+from scripts.import_patents import IMPORT_FETCH_WORKERS, download_patent_page, parse_patent_page
+
+# Fields parse_patent_page extracts that can be backfilled
+BACKFILL_FIELDS = ('title', 'abstract', 'filing_date', 'issue_date', 'inventors', 'assignee', 'full_text')
+
+# Placeholder values stored by older imports that count as missing
+MISSING_VALUES = ('', 'not specified', 'Unknown Assignee', 'Unknown')
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def patents_to_backfill(conn, fields, patent_ids=None, max_attempts=BACKFILL_MAX_ATTEMPTS):
+    """Find patents with a missing field that is due for another attempt.
+
+    Returns:
+        dict: patent_id -> list of fields to fill
+    """
+    placeholders = ', '.join('?' for _ in MISSING_VALUES)
+    now = _timestamp(datetime.datetime.now())
+    due = {}
+    for field in fields:
+        sql = f'''SELECT p.patent_id FROM patents p
+                  LEFT JOIN backfill_attempts b ON b.field = ? AND b.patent_id = p.patent_id
+                  WHERE (p.{field} IS NULL OR p.{field} IN ({placeholders}))
+                  AND (b.patent_id IS NULL OR (b.attempts < ? AND b.next_attempt_at <= ?))'''
+        params = [field, *MISSING_VALUES, max_attempts, now]
+        if patent_ids:
+            sql += f" AND p.patent_id IN ({', '.join('?' for _ in patent_ids)})"
+            params.extend(patent_ids)
+        for row in conn.execute(sql, params):
+            due.setdefault(row['patent_id'], []).append(field)
+    return due
+
+
+def _save_batch(conn, fields, results):
+    """Write a batch of fetched values and attempt records in one transaction"""
+    now = datetime.datetime.now()
+    attempts = []
+    for field in fields:
+        updates = [
+            (values[field], patent_id) for patent_id, wanted, values in results
+            if field in wanted and values and values.get(field)
+        ]
+        conn.executemany(f'UPDATE patents SET {field} = ? WHERE patent_id = ?', updates)
+
+    for patent_id, wanted, values in results:
+        for field in wanted:
+            if values is None:
+                status = 'error'
+            elif values.get(field):
+                status = 'filled'
+            else:
+                status = 'missing'
+            attempts.append((field, patent_id, status, _timestamp(now)))
+
+    # next_attempt_at doubles with every failed attempt
+    conn.executemany(
+        '''INSERT INTO backfill_attempts (field, patent_id, status, attempts, last_attempt_at, next_attempt_at)
+           VALUES (?1, ?2, ?3, 1, ?4, CASE WHEN ?3 = 'filled' THEN NULL
+                                      ELSE datetime(?4, '+' || ?5 || ' minutes') END)
+           ON CONFLICT (field, patent_id) DO UPDATE SET
+           status = excluded.status, attempts = attempts + 1, last_attempt_at = excluded.last_attempt_at,
+           next_attempt_at = CASE WHEN excluded.status = 'filled' THEN NULL
+                             ELSE datetime(excluded.last_attempt_at,
+                                           '+' || (?5 << attempts) || ' minutes') END''',
+        [(*attempt, int(BACKFILL_RETRY_HOURS * 60)) for attempt in attempts]
+    )
+    conn.commit()
+
+
+def backfill(fields, patent_ids=None, max_workers=None, batch_size=BACKFILL_BATCH_SIZE,
+             max_attempts=BACKFILL_MAX_ATTEMPTS, progress_callback=None):
+    """Fill missing metadata fields of stored patents.
+
+    Args:
+        fields (tuple): Columns to fill, from BACKFILL_FIELDS
+        patent_ids (list): Only consider these patents
+        max_workers (int): Concurrent downloads (defaults to IMPORT_FETCH_WORKERS)
+        batch_size (int): Patents written per transaction
+        max_attempts (int): Attempts per patent and field before giving up
+        progress_callback (callable): Called as callback(fraction, message)
+            after each written batch
+
+    Returns:
+        dict: Counts of due patents, filled fields and failed patents
+    """
+    unknown = [field for field in fields if field not in BACKFILL_FIELDS]
+    if unknown:
+        raise ValueError(f"Cannot backfill {', '.join(unknown)}")
+
+    conn = get_db()
+    due = patents_to_backfill(conn, fields, patent_ids, max_attempts)
+    summary = {'patents': len(due), 'filled': 0, 'failed': 0}
+    print(f"Found {len(due)} patents with missing {', '.join(fields)} due for an attempt")
+    if not due:
+        conn.close()
+        return summary
+
+    local = threading.local()
+
+    def fetch(patent_id):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        html = download_patent_page(patent_id, local.session)
+        return parse_patent_page(patent_id, html) if html is not None else None
+
+    results = []
+    executor = ThreadPoolExecutor(max_workers=max_workers or IMPORT_FETCH_WORKERS)
+    try:
+        futures = {executor.submit(fetch, patent_id): patent_id for patent_id in due}
+        for done, future in enumerate(as_completed(futures), start=1):
+            patent_id = futures[future]
+            try:
+                values = future.result()
+            except Exception as e:
+                print(f"Error backfilling patent {patent_id}: {e}")
+                values = None
+
+            if values is None:
+                summary['failed'] += 1
+            else:
+                summary['filled'] += sum(1 for field in due[patent_id] if values.get(field))
+            results.append((patent_id, due[patent_id], values))
+
+            if len(results) >= batch_size or done == len(due):
+                _save_batch(conn, fields, results)
+                for patent_id, wanted, values in results:
+                    # Save hooks (e.g. the similarity index) only care about new text
+                    if 'full_text' in wanted and values and values.get('full_text'):
+                        notify_patent_saved({'patent_id': patent_id, 'full_text': values['full_text']})
+                results = []
+                if progress_callback:
+                    progress_callback(done / len(due), f"Backfilled {done} of {len(due)} patents")
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    conn.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill missing patent metadata')
+    parser.add_argument('fields', nargs='+', choices=BACKFILL_FIELDS)
+    parser.add_argument('--patent-ids', help='Comma-separated patents to consider (default: all)')
+    parser.add_argument('--workers', type=int, help='Concurrent downloads')
+    args = parser.parse_args()
+
+    start = time.time()
+    summary = backfill(
+        tuple(args.fields),
+        patent_ids=args.patent_ids.split(',') if args.patent_ids else None,
+        max_workers=args.workers,
+        progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+    )
+    print(f"Filled {summary['filled']} fields on {summary['patents']} patents, "
+          f"{summary['failed']} fetches failed, in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Index the ID aliases of stored patents.
+
+Registers the kindless and canonical forms of every stored patent ID in
+patent_aliases, so lookups by any form resolve to the stored patent. New
+patents are indexed when saved; run this once for existing databases.
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.patent_ids import build_alias_index, get_index
+
+
+def main():
+    start = time.time()
+    indexed = build_alias_index(
+        progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+    )
+    print(f"Indexed {indexed} patents ({len(get_index().aliases)} aliases) in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
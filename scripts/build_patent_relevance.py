@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Match each project's crawled pages and Search Console queries to patents.
+
+The patent index is built once and shared by every project scored in the
+same run. Rerun after new crawls, Search Console uploads or patents.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import get_projects
+from utils.patent_api.relevance import build_patent_index, compute_project_relevance
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Match project pages and queries to patents')
+    parser.add_argument('project_ids', nargs='*', type=int, help='Projects to score (default: all)')
+    parser.add_argument('--top-k', type=int, default=10, help='Matches stored per page or query')
+    args = parser.parse_args()
+
+    start = time.time()
+    index = build_patent_index()
+    print(f"Indexed {len(index.patent_ids)} patents ({len(index.vocabulary)} lemmas) "
+          f"in {time.time() - start:.1f}s")
+
+    project_ids = args.project_ids or [project['id'] for project in get_projects()]
+    for project_id in project_ids:
+        start = time.time()
+        summary = compute_project_relevance(project_id, index=index, top_k=args.top_k)
+        print(f"Project {project_id}: {summary['pages']} pages, {summary['queries']} queries, "
+              f"{summary['matches']} matches in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
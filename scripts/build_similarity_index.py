@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Build MinHash signatures for similar-patent search.
+
+Only patents without a stored signature are processed unless --rebuild is
+given. New patents are indexed automatically when saved.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.similarity import build_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the similar-patent index')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every signature')
+    args = parser.parse_args()
+
+    start = time.time()
+    computed = build_index(rebuild=args.rebuild)
+    print(f"Computed {computed} signatures in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
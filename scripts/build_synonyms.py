@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Build the synonym table used for search query expansion.
+
+Ranks the synonyms of every WordNet lemma once and stores them in SQLite.
+Rerun after upgrading the WordNet data.
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.synonyms import build_synonym_table
+
+
+def main():
+    start = time.time()
+    stored = build_synonym_table(
+        progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+    )
+    print(f"Stored synonyms for {stored} words in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
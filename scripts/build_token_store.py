@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Tokenize stored patents into the token store.
+
+Stores each patent's token IDs so analyses can be recomputed without
+re-running NLTK. Only patents whose text is new or changed are tokenized,
+so rerunning is cheap.
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.token_store import build_token_store, get_vocabulary
+
+
+def main():
+    start = time.time()
+    checked = build_token_store(
+        progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+    )
+    print(f"Checked {checked} patents ({len(get_vocabulary())} distinct tokens) "
+          f"in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Compact stored analyses.
+
+Moves the scores of analyses saved as JSON text into scalar columns and
+stores the analysis and recommendations as a compressed payload. Safe to
+rerun; analyses that already have a payload are skipped.
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import init_db, compact_analyses
+
+
+def main():
+    start = time.time()
+    init_db()
+    converted = compact_analyses(
+        progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+    )
+    print(f"Compacted {converted} analyses in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
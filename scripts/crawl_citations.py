@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Crawl patent citations into the local citation graph and recompute
+PageRank influence scores.
+
+Patents crawled within CITATION_RECRAWL_DAYS are skipped, so the crawl can be
+interrupted and resumed.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.citations import crawl_citations, compute_influence_scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl citations and compute influence scores')
+    parser.add_argument('patent_ids', nargs='*', help='Patents to crawl (default: all stored patents)')
+    parser.add_argument('--workers', type=int, help='Concurrent fetches')
+    parser.add_argument('--direction', choices=['forward', 'backward', 'both'], default='both')
+    parser.add_argument('--recrawl-days', type=int, help='Recrawl patents older than this many days')
+    parser.add_argument('--scores-only', action='store_true', help='Skip crawling and only recompute scores')
+    args = parser.parse_args()
+
+    if not args.scores_only:
+        directions = ('forward', 'backward') if args.direction == 'both' else (args.direction,)
+        start = time.time()
+        summary = crawl_citations(
+            patent_ids=args.patent_ids or None,
+            max_workers=args.workers,
+            directions=directions,
+            recrawl_days=args.recrawl_days,
+            progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+        )
+        print(f"Crawled {summary['pairs']} patent/direction pairs, {summary['edges']} citations, "
+              f"{summary['failed']} failures in {time.time() - start:.1f}s")
+
+    start = time.time()
+    result = compute_influence_scores()
+    print(f"Scored {result['nodes']} patents over {result['edges']} citations "
+          f"({result['iterations']} iterations) in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
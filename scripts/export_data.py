@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Export tables to CSV, NDJSON or Parquet.
+
+Usage:
+    python scripts/export_data.py [TABLE ...] [--format parquet] [--output-dir DIR]
+    python scripts/export_data.py analyses --project-id 3 --columns id,patent_id,overall_relevance -o -
+
+With no tables every exportable table is written to DIR as <table>.<format>,
+e.g. for a nightly full extract. Each file is written under a temporary name
+and renamed when complete, so readers never see a partial export.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.export import EXPORT_TABLES, FORMATS, export_table, parse_filter
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export tables to CSV, NDJSON or Parquet')
+    parser.add_argument('tables', nargs='*',
+                        help=f"Tables to export (default: all of {', '.join(sorted(EXPORT_TABLES))})")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--columns', help='Comma-separated columns to export')
+    parser.add_argument('--where', action='append', default=[], type=parse_filter,
+                        help="Filter such as 'date>=2024-01-01' (repeatable)")
+    parser.add_argument('--project-id', type=int, help='Only export rows of this project')
+    parser.add_argument('--output-dir', default='exports')
+    parser.add_argument('-o', '--output', help="Output file for a single table ('-' for stdout)")
+    args = parser.parse_args()
+
+    unknown = [table for table in args.tables if table not in EXPORT_TABLES]
+    if unknown:
+        parser.error(f"Unknown tables: {', '.join(unknown)}")
+    tables = args.tables or sorted(EXPORT_TABLES)
+    if args.project_id is not None and not args.tables:
+        tables = [table for table in tables if EXPORT_TABLES[table]]
+    if args.output and len(tables) != 1:
+        parser.error('--output needs exactly one table')
+    columns = args.columns.split(',') if args.columns else None
+
+    if args.output == '-':
+        try:
+            export_table(tables[0], sys.stdout.buffer, args.format, columns, args.where, args.project_id)
+        except (ValueError, RuntimeError) as e:
+            parser.error(str(e))
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for table in tables:
+        path = args.output or os.path.join(args.output_dir, f'{table}.{args.format}')
+        start = time.time()
+        try:
+            with open(path + '.tmp', 'wb') as out:
+                count = export_table(table, out, args.format, columns, args.where, args.project_id)
+        except ValueError as e:
+            # e.g. a lazily created table that doesn't exist yet
+            print(f"Skipping {table}: {e}")
+            os.remove(path + '.tmp')
+            continue
+        os.replace(path + '.tmp', path)
+        print(f"Exported {count} {table} rows to {path} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
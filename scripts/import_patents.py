@@ -3,15 +3,33 @@ import os
 import sys
 import json
 import re
+import hashlib
+import datetime
+import threading
 import requests
 from bs4 import BeautifulSoup
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.db_manager import save_patent
+from database.db_manager import get_db, save_patents, notify_patent_saved, PATENT_FIELDS
+from utils import metrics
+from utils.helpers import RateLimiter
+from utils.patent_api.patent_ids import resolve_patent_id
+from config import (
+    IMPORT_FETCH_WORKERS, IMPORT_RATE_LIMIT, IMPORT_FETCH_RETRIES, IMPORT_FETCH_TIMEOUT,
+    IMPORT_SAVE_BATCH
+)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Shared by every fetch thread, replacing the random sleep before each request
+FETCH_LIMITER = RateLimiter(IMPORT_RATE_LIMIT, burst=IMPORT_FETCH_WORKERS)
 
 # Patent categories
 CATEGORIES = {
@@ -51,16 +69,11 @@ CATEGORIES = {
 }
 
 def extract_patent_id(patent_string):
-    """Extract patent ID from a patent string."""
-    # For patterns like US6285999B1
-    match = re.search(r'(US\d+[A-Z]\d+)', patent_string)
+    """Extract patent ID from a patent string, as the ID it is stored under."""
+    # For patterns like US6285999B1, US 6,285,999 B1 and US9165040
+    match = re.search(r'(US[\s-]?(?:RE|PP|D)?[\d,/]*\d(?:[\s-]?[A-Z]\d?\b)?)', patent_string)
     if match:
-        return match.group(1)
-    
-    # For patterns like US9165040
-    match = re.search(r'(US\d+)', patent_string)
-    if match:
-        return match.group(1)
+        return resolve_patent_id(match.group(1))
     
     # If no ID found, return None
     return None
@@ -75,93 +88,139 @@ def extract_patent_title(patent_string):
     # If no title found, return empty string
     return ""
 
-def fetch_patent_data(patent_id):
-    """Fetch detailed patent data from Google Patents."""
-    print(f"Fetching data for patent {patent_id}...")
+def download_patent_page(patent_id, session=None):
+    """Download a patent's Google Patents page (the fetch stage).
     
-    # Add a delay to avoid rate limiting
-    time.sleep(random.uniform(1, 3))
+    Waits on the shared rate limiter before every request and retries rate
+    limiting, server errors and connection errors with exponential backoff.
     
+    Returns:
+        str: The page HTML, or None if it couldn't be fetched
+    """
     url = f"https://patents.google.com/patent/{patent_id}/en"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    session = session or requests
     
-    try:
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"Failed to fetch patent {patent_id}. Status code: {response.status_code}")
-            return None
-        
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract patent information
-        title_elem = soup.select_one('h1.heading')
-        title = title_elem.text.strip() if title_elem else ""
-        
-        # Extract abstract
-        abstract_elem = soup.select_one('div.abstract')
-        abstract = abstract_elem.text.strip() if abstract_elem else ""
-        
-        # Extract filing and issue dates
-        filing_date = ""
-        issue_date = ""
-        date_elements = soup.select('time')
-        for elem in date_elements:
-            if 'itemprop' in elem.attrs:
-                if elem['itemprop'] == 'publicationDate':
-                    issue_date = elem.text.strip()
-                elif elem['itemprop'] == 'filingDate':
-                    filing_date = elem.text.strip()
+    for attempt in range(IMPORT_FETCH_RETRIES + 1):
+        if attempt:
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+        FETCH_LIMITER.acquire()
+        try:
+            with metrics.phase('fetch', 'import_patents'):
+                response = session.get(url, headers=HEADERS, timeout=IMPORT_FETCH_TIMEOUT)
+        except requests.RequestException as e:
+            metrics.record_fetch('import_patents', 'error')
+            print(f"Error fetching patent {patent_id}: {str(e)}")
+            continue
         
-        # Extract inventors
-        inventors_elems = soup.select('dd[itemprop="inventor"] span[itemprop="name"]')
-        inventors = ", ".join([inv.text.strip() for inv in inventors_elems]) if inventors_elems else ""
+        if response.status_code == 200:
+            metrics.record_fetch('import_patents', 'ok')
+            return response.text
         
-        # Extract assignee - improved to better target "Current Assignee" information
-        assignee = ""
-        # Try first with the specific itemprop
-        assignee_elem = soup.select_one('dd[itemprop="assigneeSearch"] span')
+        metrics.record_fetch('import_patents', 'http_error')
+        print(f"Failed to fetch patent {patent_id}. Status code: {response.status_code}")
+        if response.status_code == 429:
+            # Slow every worker down, not just this one
+            FETCH_LIMITER.pause(2 ** (attempt + 1))
+        elif response.status_code < 500:
+            return None
+    
+    return None
+
+def extract_assignee(soup):
+    """Extract the current assignee from a parsed patent page, or None"""
+    # Try first with the specific itemprop
+    assignee_elem = soup.select_one('dd[itemprop="assigneeSearch"] span')
+    if assignee_elem:
+        return assignee_elem.text.strip()
+    
+    # Backup method: look for text labels
+    assignee_labels = soup.find_all('dt', string=lambda x: x and 'Current Assignee' in x)
+    if assignee_labels:
+        # Get the next dd element after the "Current Assignee" label
+        assignee_elem = assignee_labels[0].find_next('dd')
         if assignee_elem:
-            assignee = assignee_elem.text.strip()
-        else:
-            # Backup method: look for text labels
-            assignee_labels = soup.find_all('dt', string=lambda x: x and 'Current Assignee' in x)
-            if assignee_labels and len(assignee_labels) > 0:
-                # Get the next dd element after the "Current Assignee" label
-                assignee_elem = assignee_labels[0].find_next('dd')
-                if assignee_elem:
-                    assignee = assignee_elem.text.strip()
-        
-        # Extract full text (claims and description)
-        claims_elem = soup.select_one('section[itemprop="claims"]')
-        claims = claims_elem.text.strip() if claims_elem else ""
-        
-        description_elem = soup.select_one('section[itemprop="description"]')
-        description = description_elem.text.strip() if description_elem else ""
-        
-        full_text = f"CLAIMS:\n{claims}\n\nDESCRIPTION:\n{description}" if claims or description else ""
-        
-        return {
-            'patent_id': patent_id,
-            'title': title,
-            'abstract': abstract,
-            'filing_date': filing_date,
-            'issue_date': issue_date,
-            'inventors': inventors,
-            'assignee': assignee,
-            'full_text': full_text
-        }
+            return assignee_elem.text.strip()
+    
+    # Last resort: any "Current Assignee" text in the side panel
+    aside = soup.select_one('aside')
+    if aside:
+        assignee_section = aside.find(string=lambda x: x and 'Current Assignee' in x)
+        if assignee_section:
+            next_elem = assignee_section.parent.find_next_sibling()
+            if next_elem:
+                return next_elem.text.strip()
+    
+    return None
+
+def parse_patent_page(patent_id, html):
+    """Extract patent fields from a Google Patents page (the parse stage)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Extract patent information
+    title_elem = soup.select_one('h1.heading')
+    title = title_elem.text.strip() if title_elem else ""
+    
+    # Extract abstract
+    abstract_elem = soup.select_one('div.abstract')
+    abstract = abstract_elem.text.strip() if abstract_elem else ""
+    
+    # Extract filing and issue dates
+    filing_date = ""
+    issue_date = ""
+    date_elements = soup.select('time')
+    for elem in date_elements:
+        if 'itemprop' in elem.attrs:
+            if elem['itemprop'] == 'publicationDate':
+                issue_date = elem.text.strip()
+            elif elem['itemprop'] == 'filingDate':
+                filing_date = elem.text.strip()
     
+    # Extract inventors
+    inventors_elems = soup.select('dd[itemprop="inventor"] span[itemprop="name"]')
+    inventors = ", ".join([inv.text.strip() for inv in inventors_elems]) if inventors_elems else ""
+    
+    assignee = extract_assignee(soup) or ""
+    
+    # Extract full text (claims and description)
+    claims_elem = soup.select_one('section[itemprop="claims"]')
+    claims = claims_elem.text.strip() if claims_elem else ""
+    
+    description_elem = soup.select_one('section[itemprop="description"]')
+    description = description_elem.text.strip() if description_elem else ""
+    
+    full_text = f"CLAIMS:\n{claims}\n\nDESCRIPTION:\n{description}" if claims or description else ""
+    
+    return {
+        'patent_id': patent_id,
+        'title': title,
+        'abstract': abstract,
+        'filing_date': filing_date,
+        'issue_date': issue_date,
+        'inventors': inventors,
+        'assignee': assignee,
+        'full_text': full_text
+    }
+
+def fetch_patent_data(patent_id, session=None):
+    """Fetch detailed patent data from Google Patents."""
+    print(f"Fetching data for patent {patent_id}...")
+    
+    html = download_patent_page(patent_id, session)
+    if html is None:
+        return None
+    
+    try:
+        return parse_patent_page(patent_id, html)
     except Exception as e:
-        print(f"Error fetching patent {patent_id}: {str(e)}")
+        print(f"Error parsing patent {patent_id}: {str(e)}")
         return None
 
-def process_patents(patents_list):
-    """Process a list of patents and save to database."""
-    # Extract all patent IDs from the list
-    all_patents = []
+def parse_patent_list(patents_list):
+    """Parse a categorized patent list into patent dicts (id, title, category).
+    
+    Patents listed more than once keep their first category.
+    """
+    all_patents = {}
     current_category = ""
     current_subcategory = ""
     
@@ -184,54 +243,138 @@ def process_patents(patents_list):
         
         # Extract patent ID and title
         patent_id = extract_patent_id(line)
-        if patent_id:
+        if patent_id and patent_id not in all_patents:
             title = extract_patent_title(line)
             combined_category = f"{current_category}/{current_subcategory}" if current_category and current_subcategory else ""
             
-            all_patents.append({
+            all_patents[patent_id] = {
                 'id': patent_id,
                 'title': title,
                 'category': combined_category
-            })
+            }
     
-    # Process each patent
-    for patent in all_patents:
-        patent_id = patent['id']
-        
-        # Fetch detailed patent data
-        data = fetch_patent_data(patent_id)
-        
-        # If we couldn't fetch the data, create a minimal record
-        if not data:
-            save_patent(
-                patent_id=patent_id,
-                title=patent['title'],
-                abstract="",
-                filing_date="",
-                issue_date="",
-                inventors="",
-                assignee="",
-                category=patent['category'],
-                full_text=""
-            )
-            print(f"Saved minimal record for patent {patent_id}")
-        else:
-            # Save the patent to the database
-            save_patent(
-                patent_id=data['patent_id'],
-                title=data['title'] or patent['title'],
-                abstract=data['abstract'],
-                filing_date=data['filing_date'],
-                issue_date=data['issue_date'],
-                inventors=data['inventors'],
-                assignee=data['assignee'],
-                category=patent['category'],
-                full_text=data['full_text']
+    return list(all_patents.values())
+
+def _run_key(patents):
+    """Identify an import run by its patent list, so a rerun resumes it"""
+    digest = hashlib.sha1()
+    for patent in patents:
+        digest.update(f"{patent['id']}\t{patent['category']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def _pending_patents(conn, patents, run_key, refresh):
+    """Drop patents this run already saved, and (unless refreshing) patents
+    already stored with their full text"""
+    done = {
+        row['patent_id'] for row in conn.execute(
+            "SELECT patent_id FROM import_checkpoints WHERE run_key = ? AND status = 'saved'",
+            (run_key,)
+        )
+    }
+    if not refresh:
+        done.update(
+            row['patent_id'] for row in conn.execute(
+                "SELECT patent_id FROM patents WHERE full_text IS NOT NULL AND full_text != ''"
             )
-            print(f"Saved patent {patent_id} to database")
-        
-        # Add a delay to avoid rate limiting
-        time.sleep(random.uniform(0.5, 1.5))
+        )
+    return [patent for patent in patents if patent['id'] not in done]
+
+def _save_batch(conn, run_key, batch):
+    """Upsert a batch of patents and checkpoint them in one transaction"""
+    save_patents([record for record, fetched in batch if fetched], conn=conn)
+    # Minimal records never overwrite a patent that is already stored
+    conn.executemany(
+        f'''INSERT INTO patents ({', '.join(PATENT_FIELDS)})
+           VALUES ({', '.join('?' for _ in PATENT_FIELDS)})
+           ON CONFLICT (patent_id) DO NOTHING''',
+        [tuple(record[field] for field in PATENT_FIELDS) for record, fetched in batch if not fetched]
+    )
+    updated_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany(
+        '''INSERT INTO import_checkpoints (run_key, patent_id, status, attempts, updated_at)
+           VALUES (?, ?, ?, 1, ?)
+           ON CONFLICT (run_key, patent_id) DO UPDATE SET
+           status = excluded.status, attempts = attempts + 1, updated_at = excluded.updated_at''',
+        [(run_key, record['patent_id'], 'saved' if fetched else 'failed', updated_at)
+         for record, fetched in batch]
+    )
+    conn.commit()
+    # Only upserted records changed the stored row; the save hooks would
+    # otherwise re-derive a stored patent from a minimal record's empty text
+    for record, fetched in batch:
+        if fetched:
+            notify_patent_saved(record)
+
+def process_patents(patents_list, progress_callback=None, max_workers=None, refresh=False):
+    """Process a list of patents and save to database.
+    
+    Runs as a pipeline: parse the list, skip patents already imported,
+    download pages concurrently under a shared rate limit, parse them, and
+    upsert in batches. Every saved batch is checkpointed in the
+    import_checkpoints table, so rerunning an interrupted import of the
+    same list resumes where it stopped. Patents that couldn't be fetched are
+    saved as minimal records and retried on the next run.
+    
+    progress_callback, if given, is called as callback(fraction, message)
+    after each saved batch (e.g. JobContext.progress from the job queue).
+    
+    Returns:
+        dict: Counts of listed, skipped, fetched and failed patents
+    """
+    all_patents = parse_patent_list(patents_list)
+    run_key = _run_key(all_patents)
+    
+    conn = get_db()
+    pending = _pending_patents(conn, all_patents, run_key, refresh)
+    summary = {'listed': len(all_patents), 'skipped': len(all_patents) - len(pending),
+               'fetched': 0, 'failed': 0}
+    print(f"Importing {len(pending)} of {len(all_patents)} patents "
+          f"({summary['skipped']} already imported)")
+    
+    local = threading.local()
+    
+    def fetch(patent):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return fetch_patent_data(patent['id'], local.session)
+    
+    batch = []
+    executor = ThreadPoolExecutor(max_workers=max_workers or IMPORT_FETCH_WORKERS)
+    try:
+        futures = {executor.submit(fetch, patent): patent for patent in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            patent = futures[future]
+            data = future.result()
+            
+            if data:
+                summary['fetched'] += 1
+                record = dict(data, title=data['title'] or patent['title'], category=patent['category'])
+            else:
+                # If we couldn't fetch the data, create a minimal record
+                summary['failed'] += 1
+                record = {
+                    'patent_id': patent['id'], 'title': patent['title'], 'abstract': "",
+                    'filing_date': "", 'issue_date': "", 'inventors': "", 'assignee': "",
+                    'category': patent['category'], 'full_text': ""
+                }
+            batch.append((record, bool(data)))
+            
+            if len(batch) >= IMPORT_SAVE_BATCH or done == len(pending):
+                _save_batch(conn, run_key, batch)
+                print(f"Saved {done} of {len(pending)} patents")
+                batch = []
+                if progress_callback:
+                    progress_callback(done / len(pending), f"Imported {done} of {len(pending)} patents")
+    finally:
+        # On an interruption, drop queued fetches; saved batches are checkpointed
+        executor.shutdown(cancel_futures=True)
+    
+    # A completed run needs no checkpoint; failed patents are retried next time
+    if not summary['failed']:
+        conn.execute('DELETE FROM import_checkpoints WHERE run_key = ?', (run_key,))
+        conn.commit()
+    conn.close()
+    return summary
 
 def main():
     """Main function."""
@@ -400,7 +543,9 @@ US8843477B1: "Method and system for filtering electronic messages"
     """
     
     # Process the patents
-    process_patents(patents_list)
+    summary = process_patents(patents_list)
+    print(f"Imported {summary['fetched']} patents, {summary['failed']} failed, "
+          f"{summary['skipped']} already imported")
 
 if __name__ == "__main__":
     main()
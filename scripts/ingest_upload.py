@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Ingest a CSV export into a project.
+
+Usage:
+    python scripts/ingest_upload.py PROJECT_ID UPLOAD_TYPE FILE [--enqueue]
+
+UPLOAD_TYPE is one of the registered ingesters, e.g. ahrefs_backlinks,
+ahrefs_internal_links or screaming_frog. Large crawl exports are parsed in
+parallel (see INGEST_WORKERS). With --enqueue the file is ingested by a job worker.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import save_upload
+from modules.uploads.ingest import INGESTERS, ingest_upload
+from utils import job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest a CSV export')
+    parser.add_argument('project_id', type=int)
+    parser.add_argument('upload_type', choices=sorted(INGESTERS))
+    parser.add_argument('file')
+    parser.add_argument('--notes')
+    parser.add_argument('--enqueue', action='store_true', help='Ingest in a background job')
+    args = parser.parse_args()
+
+    file_path = os.path.abspath(args.file)
+    upload_id = save_upload(args.project_id, args.upload_type, os.path.basename(file_path), args.notes)
+
+    if args.enqueue:
+        job_id = job_queue.enqueue_job('ingest_upload', {'upload_id': upload_id, 'file_path': file_path})
+        print(f"Created upload {upload_id}, queued job {job_id}")
+        return
+
+    start = time.time()
+    result = ingest_upload(
+        upload_id, file_path,
+        progress_callback=lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+    )
+    print(f"Upload {upload_id}: {result['rows_processed']} rows imported, "
+          f"{result['rows_skipped']} skipped in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Run background job workers.
+
+Usage:
+    python scripts/job_worker.py [--workers N]
+    python scripts/job_worker.py --enqueue update_assignees
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import JOB_WORKERS
+from utils import job_queue
+
+# Modules whose import registers job handlers
+HANDLER_MODULES = ('modules.patents.jobs', 'modules.uploads.jobs')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SEO Patent Analysis Tool job workers')
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS,
+                        help='Number of worker processes (default: JOB_WORKERS or 2)')
+    parser.add_argument('--enqueue', metavar='JOB_TYPE', help='Queue a job instead of running workers')
+    parser.add_argument('--payload', default='{}', help='JSON payload for --enqueue')
+    args = parser.parse_args()
+
+    if args.enqueue:
+        job_id = job_queue.enqueue_job(args.enqueue, json.loads(args.payload))
+        print(f"Queued job {job_id} ({args.enqueue})")
+        return
+
+    print(f"Starting {args.workers} job worker(s)...")
+    job_queue.run_workers(args.workers, HANDLER_MODULES)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Recompute SEO relevance scores for the whole corpus.
+
+Usage:
+    python scripts/rescore_patents.py [--weights weights.json] [--full] [--dry-run]
+
+Counts any SEO terms not yet counted (e.g. a keyword added to the weights
+file) and any new or changed patents, then rescores every patent from the
+stored count matrix and updates the analyses score columns. After the
+first run only the matrix product is left, so a weight change takes
+seconds rather than a re-read of every text.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.analyzer import PatentAnalyzer
+from utils.patent_api.rescoring import apply_scores, rescore, update_term_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute SEO relevance scores for all patents')
+    parser.add_argument('--weights', help='JSON file with seo_keywords and/or seo_categories')
+    parser.add_argument('--full', action='store_true', help='Recount every patent')
+    parser.add_argument('--dry-run', action='store_true', help="Print a score summary without updating analyses")
+    args = parser.parse_args()
+
+    analyzer = PatentAnalyzer()
+    if args.weights and not analyzer.load_seo_weights(args.weights):
+        sys.exit(1)
+
+    progress = lambda fraction, message: print(f"[{fraction:.0%}] {message}")
+
+    start = time.time()
+    counted = update_term_counts(analyzer, full=args.full, progress_callback=progress)
+    print(f"Counted SEO terms in {counted} patents in {time.time() - start:.1f}s")
+
+    start = time.time()
+    scores = rescore(analyzer)
+    overall = scores['overall_relevance_score']
+    print(f"Rescored {len(scores['patent_ids'])} patents in {time.time() - start:.2f}s"
+          + (f" (mean relevance {overall.mean():.1f})" if len(overall) else ''))
+    if not args.dry_run:
+        apply_scores(scores, progress)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Check that every supported form of a patent ID parses to the same key.
+
+Usage:
+    python scripts/test_patent_ids.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.patent_ids import parse_patent_id
+
+
+def test_canonical_forms():
+    """Test that each input parses to the expected canonical ID"""
+    test_cases = [
+        ("US6285999B1", "US6285999B1"),
+        ("US 6,285,999 B1", "US6285999B1"),
+        ("us-6285999-b1", "US6285999B1"),
+        ("6285999", "US6285999"),
+        ("US06285999B1", "US6285999B1"),
+        ("https://patents.google.com/patent/US6285999B1/en", "US6285999B1"),
+        ("US 2013/0232132 A1", "US20130232132A1"),
+        ("US2013232132A1", "US20130232132A1"),
+        ("USD512345S", "USD512345S"),
+        ("D512345", "USD512345"),
+        ("USRE12345E", "USRE12345E"),
+        ("RE12345", "USRE12345"),
+        ("RE 12,345 E", "USRE12345E"),
+        ("USPP12345P2", "USPP12345P2"),
+        ("PP12345", "USPP12345"),
+        ("PP12345P3", "USPP12345P3"),
+        ("EP1234567A1", "EP1234567A1"),
+        ("DE10123456A1", "DE10123456A1"),
+        ("not a patent", None),
+    ]
+
+    print("Testing canonical forms:")
+    failures = 0
+    for raw, expected in test_cases:
+        number = parse_patent_id(raw)
+        result = number.canonical if number else None
+        status = "✓" if result == expected else "✗"
+        failures += result != expected
+        print(f"{status} Input: '{raw}', Expected: '{expected}', Got: '{result}'")
+    print()
+    return not failures
+
+
+def test_aliases():
+    """Test the alias forms registered for a stored patent ID"""
+    test_cases = [
+        ("US6285999B1", ["US6285999B1", "US6285999"]),
+        ("RE12345E", ["USRE12345E", "USRE12345"]),
+        ("PP12345", ["USPP12345"]),
+    ]
+
+    print("Testing aliases:")
+    failures = 0
+    for raw, expected in test_cases:
+        result = parse_patent_id(raw).aliases()
+        status = "✓" if result == expected else "✗"
+        failures += result != expected
+        print(f"{status} Input: '{raw}', Expected: {expected}, Got: {result}")
+    print()
+    return not failures
+
+
+def main():
+    """Main test function"""
+    print("== Patent ID Test ==")
+    print()
+
+    passed = test_canonical_forms()
+    passed = test_aliases() and passed
+
+    print("Tests completed.")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
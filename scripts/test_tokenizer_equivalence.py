@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compare the regex tokenizer against NLTK tokenization.
+
+Usage:
+    python scripts/test_tokenizer_equivalence.py [--source db|corpus] [--limit N] [--min-overlap 0.9]
+
+For every patent the top keywords and keyphrases are extracted with both
+tokenizer backends and their overlap (shared terms / top N) is reported.
+The regex backend is safe to enable when the overlap stays above the
+threshold on our own patents.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.patent_api.analyzer import PatentAnalyzer
+
+
+def load_patents(source, limit):
+    """Patents from the database, or the synthetic benchmark corpus"""
+    if source == 'corpus':
+        from benchmarks.corpus import get_corpus
+        return get_corpus(limit)
+    from database.db_manager import get_patents
+    patents = get_patents(per_page=limit, load=('abstract', 'full_text'))
+    return [patent.to_dict(lazy_fields=('abstract', 'full_text')) for patent in patents]
+
+
+def overlap(first, second):
+    """Share of the terms in first that also appear in second"""
+    if not first:
+        return 1.0
+    return len({term for term, _ in first} & {term for term, _ in second}) / len(first)
+
+
+def test_top_keyword_overlap(patents, top_n, min_overlap):
+    """Test that both backends find (nearly) the same top keywords and keyphrases"""
+    nltk_analyzer = PatentAnalyzer(tokenizer='nltk')
+    regex_analyzer = PatentAnalyzer(tokenizer='regex')
+
+    print(f"Testing top-{top_n} keyword overlap on {len(patents)} patents:")
+    failures = 0
+    keyword_scores = []
+    phrase_scores = []
+    for patent in patents:
+        text = f"{patent.get('title') or ''}\n\n{patent.get('abstract') or ''}\n\n{patent.get('full_text') or ''}"
+        keywords = overlap(nltk_analyzer.extract_keywords(text, top_n), regex_analyzer.extract_keywords(text, top_n))
+        phrases = overlap(nltk_analyzer.extract_keyphrases(text, top_n), regex_analyzer.extract_keyphrases(text, top_n))
+        keyword_scores.append(keywords)
+        phrase_scores.append(phrases)
+        if min(keywords, phrases) < min_overlap:
+            failures += 1
+            print(f"✗ {patent['patent_id']}: keywords {keywords:.0%}, keyphrases {phrases:.0%}")
+
+    if patents:
+        print(f"Mean keyword overlap: {sum(keyword_scores) / len(keyword_scores):.1%}, "
+              f"mean keyphrase overlap: {sum(phrase_scores) / len(phrase_scores):.1%}")
+    status = "✓" if not failures else "✗"
+    print(f"{status} {len(patents) - failures} of {len(patents)} patents at or above {min_overlap:.0%} overlap")
+    print()
+    return not failures
+
+
+def test_tokens_per_second(patents):
+    """Report tokenizer throughput of both backends"""
+    texts = [f"{p.get('title') or ''}\n\n{p.get('abstract') or ''}\n\n{p.get('full_text') or ''}" for p in patents]
+    print("Testing tokenizer throughput:")
+    for tokenizer in ('nltk', 'regex'):
+        analyzer = PatentAnalyzer(tokenizer=tokenizer)
+        start = time.perf_counter()
+        tokens = sum(len(analyzer.tokenize(text)) for text in texts)
+        elapsed = time.perf_counter() - start
+        print(f"  - {tokenizer}: {tokens} tokens in {elapsed:.2f}s ({tokens / elapsed if elapsed else 0:,.0f} tokens/sec)")
+    print()
+
+
+def main():
+    """Main test function"""
+    parser = argparse.ArgumentParser(description='Compare the regex and NLTK tokenizers')
+    parser.add_argument('--source', choices=('db', 'corpus'), default='db')
+    parser.add_argument('--limit', type=int, default=200, help='Number of patents to compare')
+    parser.add_argument('--top-n', type=int, default=50)
+    parser.add_argument('--min-overlap', type=float, default=0.9)
+    args = parser.parse_args()
+
+    print("== Tokenizer Equivalence Test ==")
+    print()
+
+    patents = load_patents(args.source, args.limit)
+    passed = test_top_keyword_overlap(patents, args.top_n, args.min_overlap)
+    test_tokens_per_second(patents)
+
+    print("Tests completed.")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
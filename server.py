@@ -25,7 +25,18 @@ logging.basicConfig(
 logger = logging.getLogger('seo_patent_tool')
 
 # Add database imports
-from database.db_manager import get_patents, get_patent_by_id, ensure_patents_exist, get_projects, create_project
+from database.db_manager import get_patents, get_patent_by_id, ensure_patents_exist, get_projects, create_project, delete_upload
+from utils import metrics
+from utils import job_queue
+from utils import prefork
+from utils import admission
+from utils import profiling
+from utils.patent_api import similarity
+from utils.patent_api import relevance
+from modules.uploads.ingest import get_upload_progress
+from modules.uploads import rollups
+from utils import export
+from config import MAX_CONTENT_LENGTH
 
 # Default port and host
 PORT = int(os.environ.get('PORT', 8000))
@@ -41,8 +52,22 @@ INCLUDES_DIR = os.path.join(STATIC_ROOT, INCLUDES_DIR)
 class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
     """Custom handler for SEO Patent Analysis Tool"""
     
+    def send_response(self, code, message=None):
+        """Send the response line, recording the status for request metrics"""
+        self._metrics_status = int(code)
+        super().send_response(code, message)
+        if getattr(self, 'profile_id', None):
+            self.send_header('X-Profile-Id', self.profile_id)
+    
     def do_GET(self):
         """Handle GET requests"""
+        with metrics.track_request(self, 'GET'), admission.admit(self) as admitted:
+            if admitted:
+                with profiling.profile_request(self):
+                    self.handle_get()
+    
+    def handle_get(self):
+        """Route a GET request to an API handler or a static page"""
         # Parse the URL
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
@@ -50,6 +75,11 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
         
         logger.info(f"Handling request: {path} with params: {query_params}")
         
+        # Metrics endpoint for Prometheus
+        if path == '/metrics':
+            self.handle_metrics()
+            return
+        
         # Handle API endpoints
         if path.startswith('/api/'):
             logger.info(f"Processing API request: {path}")
@@ -110,8 +140,9 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
                 # For HTML files, process includes
                 if ext == '.html':
                     logger.info(f"Processing HTML file: {file_path}")
-                    content = f.read().decode('utf-8')
-                    content = self.process_includes(content)
+                    with metrics.phase('render', 'html'):
+                        content = f.read().decode('utf-8')
+                        content = self.process_includes(content)
                     self.wfile.write(content.encode('utf-8'))
                 else:
                     # For non-HTML files, send as is
@@ -128,6 +159,28 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
     
     def do_POST(self):
         """Handle POST requests"""
+        with metrics.track_request(self, 'POST'), admission.admit(self) as admitted:
+            if admitted:
+                with profiling.profile_request(self):
+                    if self.body_too_large():
+                        return
+                    self.handle_post()
+    
+    def body_too_large(self):
+        """Answer 413 if the request body is larger than MAX_CONTENT_LENGTH"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = 0
+        if content_length <= MAX_CONTENT_LENGTH:
+            return False
+        self.close_connection = True
+        self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                        f'Request body larger than {MAX_CONTENT_LENGTH} bytes')
+        return True
+
+    def handle_post(self):
+        """Route a POST request to an API handler"""
         # Parse the URL
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
@@ -138,6 +191,17 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
         if path.startswith('/api/'):
             self.handle_api(path, {})
             return
+        
+        self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+    
+    def handle_metrics(self):
+        """Handle /metrics endpoint (Prometheus text format)"""
+        body = metrics.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
     def handle_api(self, path, query_params):
         """Handle API requests"""
@@ -145,17 +209,34 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
             self.handle_api_patents(query_params)
         elif path == '/api/patent':
             self.handle_api_patent(query_params)
+        elif path.startswith('/api/patent/') and path.endswith('/similar'):
+            self.handle_api_similar_patents(path.split('/')[-2], query_params)
         elif path == '/api/projects':
             self.handle_api_projects()
         elif path == '/api/projects/create' and self.command == 'POST':
             self.handle_api_projects_create()
+        elif path == '/api/jobs' or path.startswith('/api/jobs/'):
+            self.handle_api_jobs(path, query_params)
+        elif path.startswith('/api/uploads/') and path.endswith('/progress'):
+            self.handle_api_upload_progress(path.split('/')[-2])
+        elif path.startswith('/api/uploads/') and path.endswith('/delete') and self.command == 'POST':
+            self.handle_api_upload_delete(path.split('/')[-2])
+        elif path == '/api/relevance':
+            self.handle_api_relevance(query_params)
+        elif path in ('/api/gsc/trend', '/api/gsc/top', '/api/gsc/rows'):
+            self.handle_api_gsc(path.rsplit('/', 1)[-1], query_params)
+        elif path == '/api/export':
+            self.handle_api_export(query_params)
+        elif path in ('/api/admin/profiling', '/api/admin/profiles') or path.startswith('/api/admin/profiles/'):
+            self.handle_api_profiling(path, query_params)
         else:
             self.send_error(HTTPStatus.NOT_FOUND, 'API endpoint not found')
             
     def handle_api_projects(self):
         """Handle /api/projects endpoint"""
         # Get projects from the database
-        projects = get_projects()
+        with metrics.phase('db', 'get_projects'):
+            projects = get_projects()
         
         # Convert to JSON serializable format
         projects_json = []
@@ -192,7 +273,8 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
                 raise ValueError("Project name is required")
             
             # Create the project
-            project_id = create_project(name, description, url)
+            with metrics.phase('db', 'create_project'):
+                project_id = create_project(name, description, url)
             
             # Return success response
             response = {
@@ -218,13 +300,202 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(response).encode('utf-8'))
     
+    def handle_api_jobs(self, path, query_params):
+        """Handle /api/jobs, /api/jobs/<id> and POST /api/jobs/<id>/cancel"""
+        parts = path.strip('/').split('/')
+        
+        if len(parts) == 2:
+            status = query_params.get('status', [None])[0]
+            limit = int(query_params.get('limit', ['50'])[0])
+            self.send_json_response(job_queue.list_jobs(status=status, limit=limit))
+            return
+        
+        try:
+            job_id = int(parts[2])
+        except ValueError:
+            self.send_error(HTTPStatus.BAD_REQUEST, 'Invalid job ID')
+            return
+        
+        if len(parts) == 4 and parts[3] == 'cancel' and self.command == 'POST':
+            if not job_queue.cancel_job(job_id):
+                self.send_error(HTTPStatus.CONFLICT, 'Job not found or already finished')
+                return
+        elif len(parts) != 3:
+            self.send_error(HTTPStatus.NOT_FOUND, 'API endpoint not found')
+            return
+        
+        job = job_queue.get_job(job_id)
+        if not job:
+            self.send_error(HTTPStatus.NOT_FOUND, 'Job not found')
+            return
+        self.send_json_response(job)
+    
+    def handle_api_upload_progress(self, upload_id):
+        """Handle /api/uploads/<id>/progress endpoint"""
+        try:
+            upload_id = int(upload_id)
+        except ValueError:
+            self.send_error(HTTPStatus.BAD_REQUEST, 'Invalid upload ID')
+            return
+        
+        with metrics.phase('db', 'get_upload_progress'):
+            progress = get_upload_progress(upload_id)
+        if not progress:
+            self.send_error(HTTPStatus.NOT_FOUND, 'No ingestion progress for upload')
+            return
+        self.send_json_response(progress)
+    
+    def handle_api_upload_delete(self, upload_id):
+        """Handle POST /api/uploads/<id>/delete (soft delete, data removed by a job)"""
+        try:
+            upload_id = int(upload_id)
+        except ValueError:
+            self.send_error(HTTPStatus.BAD_REQUEST, 'Invalid upload ID')
+            return
+        
+        with metrics.phase('db', 'delete_upload'):
+            job_id = delete_upload(upload_id, soft=True)
+        if not job_id:
+            self.send_error(HTTPStatus.NOT_FOUND, 'Upload not found')
+            return
+        
+        status_url = f'/api/jobs/{job_id}'
+        self.send_json_response({'job_id': job_id, 'status': 'queued', 'status_url': status_url},
+                                HTTPStatus.ACCEPTED)
+    
+    def handle_api_relevance(self, query_params):
+        """Handle /api/relevance?project_id=&url=|query=|patent_id= (stored patent matches)"""
+        params = {key: values[0] for key, values in query_params.items()}
+        try:
+            project_id = int(params['project_id'])
+        except (KeyError, ValueError):
+            self.send_error(HTTPStatus.BAD_REQUEST, 'Missing or invalid project_id')
+            return
+        
+        with metrics.phase('db', 'get_relevance'):
+            if params.get('patent_id'):
+                result = relevance.get_patent_targets(project_id, params['patent_id'])
+            elif params.get('url'):
+                result = relevance.get_relevant_patents(project_id, 'url', params['url'])
+            elif params.get('query'):
+                result = relevance.get_relevant_patents(project_id, 'query', params['query'])
+            else:
+                self.send_error(HTTPStatus.BAD_REQUEST, 'One of url, query or patent_id is required')
+                return
+        self.send_json_response(result)
+    
+    def handle_api_gsc(self, view, query_params):
+        """Handle /api/gsc/trend, /api/gsc/top (rollups) and /api/gsc/rows (raw drill-down)"""
+        params = {key: values[0] for key, values in query_params.items()}
+        try:
+            project_id = int(params['project_id'])
+            limit = min(int(params.get('limit', 20 if view == 'top' else 100)), 1000)
+            with metrics.phase('db', f'gsc_{view}'):
+                if view == 'trend':
+                    result = rollups.get_trend(
+                        project_id, params.get('period', 'day'), params.get('dimension', 'total'),
+                        params.get('value'), params.get('start'), params.get('end')
+                    )
+                elif view == 'top':
+                    result = rollups.get_top(
+                        project_id, params.get('dimension', 'query'), params.get('metric', 'clicks'),
+                        params.get('start'), params.get('end'), limit
+                    )
+                else:
+                    result = rollups.get_rows(
+                        project_id, params.get('url'), params.get('query'),
+                        params.get('start'), params.get('end'), limit
+                    )
+        except (KeyError, ValueError) as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, f'Invalid GSC query: {e}')
+            return
+        self.send_json_response(result)
+    
+    def handle_api_export(self, query_params):
+        """Handle /api/export?table=&format=csv|ndjson|parquet&columns=&filter=&project_id= (streamed)"""
+        table = query_params.get('table', [''])[0]
+        fmt = query_params.get('format', ['csv'])[0]
+        try:
+            if fmt not in export.WRITERS:
+                raise ValueError(f"Unknown export format '{fmt}'")
+            if fmt == 'parquet' and export.pyarrow is None:
+                raise ValueError('Parquet export is not available (pyarrow is not installed)')
+            columns = query_params.get('columns', [''])[0]
+            project_id = query_params.get('project_id', [None])[0]
+            query = export.ExportQuery(
+                table,
+                columns=columns.split(',') if columns else None,
+                filters=[export.parse_filter(text) for text in query_params.get('filter', [])],
+                project_id=int(project_id) if project_id is not None else None
+            )
+        except ValueError as e:
+            self.send_error(HTTPStatus.BAD_REQUEST, f'Invalid export: {e}')
+            return
+        
+        # Rows are written as they are read; the response ends when the connection closes
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-type', export.CONTENT_TYPES[fmt])
+        self.send_header('Content-Disposition', f'attachment; filename="{table}.{fmt}"')
+        self.end_headers()
+        with metrics.phase('db', f'export_{table}'):
+            try:
+                count = export.WRITERS[fmt](query, self.wfile)
+            except (BrokenPipeError, ConnectionResetError):
+                logger.info(f"Export of {table} cancelled by the client")
+                return
+        logger.info(f"Exported {count} {table} rows as {fmt}")
+    
+    def handle_api_profiling(self, path, query_params):
+        """Handle /api/admin/profiling (GET or POST settings), /api/admin/profiles and /api/admin/profiles/<file>"""
+        if not profiling.authorized(self):
+            self.send_json_response({'error': 'Forbidden'}, HTTPStatus.FORBIDDEN)
+            return
+        
+        if path == '/api/admin/profiling':
+            if self.command != 'POST':
+                self.send_json_response(profiling.get_settings())
+                return
+            content_length = int(self.headers.get('Content-Length', 0))
+            try:
+                data = json.loads(self.rfile.read(content_length).decode('utf-8') or '{}')
+                settings = profiling.configure(data.get('sample_rate'), data.get('mode'), data.get('duration'))
+            except ValueError as e:
+                self.send_json_response({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+                return
+            self.send_json_response(settings)
+        elif path == '/api/admin/profiles':
+            limit = int(query_params.get('limit', ['50'])[0])
+            self.send_json_response(profiling.list_profiles(limit))
+        else:
+            profile = profiling.read_profile(path.rsplit('/', 1)[-1])
+            if profile is None:
+                self.send_json_response({'error': 'Profile not found'}, HTTPStatus.NOT_FOUND)
+                return
+            content_type, body = profile
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    def send_json_response(self, data, status=HTTPStatus.OK):
+        """Send a JSON response"""
+        with metrics.phase('render', 'json'):
+            body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+    
     def handle_api_patents(self, query_params):
         """Handle /api/patents endpoint"""
         category = query_params.get('category', [None])[0]
         page = int(query_params.get('page', ['1'])[0])
         per_page = int(query_params.get('per_page', ['10'])[0])
         
-        result = get_patents(category, page, per_page)
+        with metrics.phase('db', 'get_patents'):
+            # The list includes abstracts but never needs full texts
+            result = get_patents(category, page, per_page, load=('abstract',))
         
         # Convert patents to JSON serializable format
         patents_json = {
@@ -260,7 +531,8 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
             self.send_error(HTTPStatus.BAD_REQUEST, 'Missing patent ID')
             return
         
-        patent = get_patent_by_id(patent_id)
+        with metrics.phase('db', 'get_patent_by_id'):
+            patent = get_patent_by_id(patent_id, load=('abstract', 'full_text'))
         
         if not patent:
             self.send_error(HTTPStatus.NOT_FOUND, 'Patent not found')
@@ -284,6 +556,20 @@ class SEOPatentHandler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(patent_json).encode('utf-8'))
     
+    def handle_api_similar_patents(self, patent_id, query_params):
+        """Handle /api/patent/<id>/similar endpoint"""
+        top_k = int(query_params.get('n', ['10'])[0])
+        min_similarity = float(query_params.get('min', ['0'])[0])
+        
+        with metrics.phase('analysis', 'similar_patents'):
+            result = similarity.get_similar_patents(patent_id, top_k, min_similarity)
+        
+        if result is None:
+            self.send_error(HTTPStatus.NOT_FOUND, 'Patent not found')
+            return
+        
+        self.send_json_response(result)
+    
     def process_includes(self, content):
         """Process includes in HTML content"""
         # Find all include placeholders
@@ -329,9 +615,9 @@ def run_server(port=PORT, host=HOST):
     """Run the HTTP server"""
     try:
         server_address = (host, port)
-        httpd = http.server.HTTPServer(server_address, SEOPatentHandler)
         logger.info(f"Starting server on {host}:{port}...")
-        httpd.serve_forever()
+        prefork.serve_prefork(server_address, SEOPatentHandler, server_class=http.server.ThreadingHTTPServer,
+                              warmup=prefork.warm_caches, on_worker_start=prefork.start_worker_metrics)
     except OSError as e:
         if e.errno == 98:  # Address already in use
             logger.error(f"Port {port} is already in use, attempting to stop the existing process")
@@ -343,9 +629,9 @@ def run_server(port=PORT, host=HOST):
                 time.sleep(2)  # Give some time for the port to be released
                 # Retry starting the server
                 server_address = (host, port)
-                httpd = http.server.HTTPServer(server_address, SEOPatentHandler)
                 logger.info(f"Starting server on {host}:{port}...")
-                httpd.serve_forever()
+                prefork.serve_prefork(server_address, SEOPatentHandler, server_class=http.server.ThreadingHTTPServer,
+                                      warmup=prefork.warm_caches, on_worker_start=prefork.start_worker_metrics)
             except Exception as retry_error:
                 logger.error(f"Could not restart server: {str(retry_error)}")
                 logger.error("Please stop the existing server process manually")
@@ -4,32 +4,56 @@ SEO Patent Analysis Tool - Simple HTTP Server
 """
 
 import os
+import re
 import sys
 import json
-import sqlite3
 import urllib.parse
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from http import HTTPStatus
+from http.cookies import SimpleCookie
 
 # Import the authentication module
 import auth
 
 # Configuration
 PORT = 8080
-DATABASE = 'database/seo_tool.db'
 SERVER_ROOT = os.path.dirname(os.path.abspath(__file__))
 STATIC_ROOT = os.path.join(SERVER_ROOT, 'static')
 INCLUDES_DIR = os.path.join(STATIC_ROOT, 'includes')
 
 # Import the patent search module
 sys.path.append(SERVER_ROOT)
-from patent_search import search_patents, get_patent_details
+from patent_search import search_patents
+from utils import metrics
+from utils import job_queue
+from utils import prefork
+from utils import admission
+from utils import profiling
+from utils.patent_api import similarity
+from utils.patent_api.patent_ids import resolve_patent_id
+from database.db_manager import get_db
+from database.records import PatentRecord
+from config import MAX_CONTENT_LENGTH
 
 class SEOPatentHandler(BaseHTTPRequestHandler):
     """Custom handler for SEO Patent Analysis Tool"""
     
+    def send_response(self, code, message=None):
+        """Send the response line, recording the status for request metrics"""
+        self._metrics_status = int(code)
+        super().send_response(code, message)
+        if getattr(self, 'profile_id', None):
+            self.send_header('X-Profile-Id', self.profile_id)
+    
     def do_GET(self):
         """Handle GET requests"""
+        with metrics.track_request(self, 'GET'), admission.admit(self) as admitted:
+            if admitted:
+                with profiling.profile_request(self):
+                    self.handle_get()
+    
+    def handle_get(self):
+        """Route a GET request"""
         # Parse the URL and query parameters
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
@@ -52,6 +76,11 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
                 self.end_headers()
                 return
         
+        # Metrics endpoint for Prometheus
+        if path == '/metrics':
+            self.handle_metrics()
+            return
+        
         # Handle API requests
         if path.startswith('/api/'):
             self.handle_api_request(path, query_params)
@@ -110,8 +139,9 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
             
             # For HTML files, we need to process includes
             if self.path.endswith('.html'):
-                content = f.read().decode('utf-8')
-                content = self.process_includes(content)
+                with metrics.phase('render', 'html'):
+                    content = f.read().decode('utf-8')
+                    content = self.process_includes(content)
                 self.wfile.write(content.encode('utf-8'))
             else:
                 # For non-HTML files, send as is
@@ -124,6 +154,28 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
     
     def do_POST(self):
         """Handle POST requests"""
+        with metrics.track_request(self, 'POST'), admission.admit(self) as admitted:
+            if admitted:
+                with profiling.profile_request(self):
+                    if self.body_too_large():
+                        return
+                    self.handle_post()
+    
+    def body_too_large(self):
+        """Answer 413 if the request body is larger than MAX_CONTENT_LENGTH"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = 0
+        if content_length <= MAX_CONTENT_LENGTH:
+            return False
+        self.close_connection = True
+        self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                        f'Request body larger than {MAX_CONTENT_LENGTH} bytes')
+        return True
+
+    def handle_post(self):
+        """Route a POST request"""
         # Parse the URL
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
@@ -173,6 +225,16 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
             self.handle_patent_analysis(post_params)
             return
         
+        # Handle job cancellation
+        elif path.startswith('/api/jobs/'):
+            self.handle_jobs_api(path, {})
+            return
+        
+        # Change profiling settings
+        elif path == '/api/admin/profiling':
+            self.handle_profiling_api(path, {}, post_params)
+            return
+        
         # If no specific handler, return 404
         self.send_error(HTTPStatus.NOT_FOUND)
     
@@ -185,33 +247,62 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
             return
             
         if path == '/api/projects':
-            self.send_json(self.get_projects())
+            with metrics.phase('db', 'get_projects'):
+                projects = self.get_projects()
+            self.send_json(projects)
         elif path == '/api/patents':
-            self.send_json(self.get_patents())
+            with metrics.phase('db', 'get_patents'):
+                patents = self.get_patents()
+            self.send_json(patents)
+        elif path.startswith('/api/patent/') and path.endswith('/similar'):
+            patent_id = path.split('/')[-2]
+            top_k = int(query_params.get('n', ['10'])[0])
+            with metrics.phase('analysis', 'similar_patents'):
+                result = similarity.get_similar_patents(patent_id, top_k)
+            if result is None:
+                self.send_json({'error': 'Patent not found'}, HTTPStatus.NOT_FOUND)
+            else:
+                self.send_json(result)
         elif path.startswith('/api/patent/'):
             patent_id = path.split('/')[-1]
-            self.send_json(self.get_patent(patent_id))
+            with metrics.phase('db', 'get_patent'):
+                patent = self.get_patent(patent_id)
+            self.send_json(patent)
+        elif path == '/api/jobs' or path.startswith('/api/jobs/'):
+            self.handle_jobs_api(path, query_params)
+        elif path in ('/api/admin/profiling', '/api/admin/profiles') or path.startswith('/api/admin/profiles/'):
+            self.handle_profiling_api(path, query_params)
         elif path == '/api/search':
             query = query_params.get('q', [''])[0]
             num_results = int(query_params.get('n', ['10'])[0])
-            results = search_patents(query, num_results)
+            with metrics.phase('fetch', 'search_patents'):
+                results = search_patents(query, num_results)
             self.send_json(results)
         else:
             self.send_json({'error': 'Not found'}, HTTPStatus.NOT_FOUND)
     
     def send_json(self, data, status=HTTPStatus.OK):
         """Send JSON response"""
+        with metrics.phase('render', 'json'):
+            body = json.dumps(data).encode()
         self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.send_header('X-Robots-Tag', 'noindex, nofollow')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
+    
+    def handle_metrics(self):
+        """Handle /metrics endpoint (Prometheus text format)"""
+        body = metrics.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
     def get_db_connection(self):
-        """Get a database connection"""
-        conn = sqlite3.connect(os.path.join(SERVER_ROOT, DATABASE))
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get a database connection (the one db_manager and the job workers use)"""
+        return get_db()
     
     def get_projects(self):
         """Get all projects from the database"""
@@ -221,16 +312,24 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
         return [dict(project) for project in projects]
     
     def get_patents(self):
-        """Get all patents from the database"""
+        """Get all patents from the database (without their full texts)"""
         conn = self.get_db_connection()
-        patents = conn.execute('SELECT * FROM patents').fetchall()
+        columns = ', '.join(PatentRecord.COLUMNS + ('abstract',))
+        patents = conn.execute(f'SELECT {columns} FROM patents').fetchall()
         conn.close()
-        return [dict(patent) for patent in patents]
+        return [PatentRecord(patent).to_dict() for patent in patents]
     
     def get_patent(self, patent_id):
-        """Get a specific patent from the database"""
+        """Get a specific patent from the database by numeric id or patent number"""
         conn = self.get_db_connection()
-        patent = conn.execute('SELECT * FROM patents WHERE id = ?', (patent_id,)).fetchone()
+        patent = None
+        if patent_id.isdigit():
+            patent = conn.execute('SELECT * FROM patents WHERE id = ?', (patent_id,)).fetchone()
+        if not patent:
+            # A patent number in any form, e.g. US6285999, 6285999 or US6285999B1
+            patent = conn.execute(
+                'SELECT * FROM patents WHERE patent_id = ?', (resolve_patent_id(patent_id) or patent_id,)
+            ).fetchone()
         
         if patent:
             patent_dict = dict(patent)
@@ -238,7 +337,7 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
             # Get analyses for this patent
             analyses = conn.execute(
                 'SELECT * FROM patent_analyses WHERE patent_id = ?', 
-                (patent_id,)
+                (patent['id'],)
             ).fetchall()
             
             if analyses:
@@ -305,7 +404,7 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
         self.end_headers()
     
     def handle_patent_save(self, post_params):
-        """Handle patent save requests"""
+        """Handle patent save requests by queueing a background job"""
         if isinstance(post_params, dict):
             patent_id = post_params.get('patent_id', '')
             project_id = post_params.get('project_id', '')
@@ -313,112 +412,105 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
             patent_id = post_params.get('patent_id', [''])[0]
             project_id = post_params.get('project_id', [''])[0]
         
-        # Get patent details from API
-        patent_details = get_patent_details(patent_id)
+        if not patent_id:
+            self.send_json({'error': 'Missing patent ID'}, HTTPStatus.BAD_REQUEST)
+            return
         
-        if patent_details:
-            conn = self.get_db_connection()
-            
-            # Insert patent into database
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO patents (
-                    patent_id, title, abstract, filing_date, issue_date, 
-                    assignee, inventors, category, full_text
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                patent_details['patent_id'],
-                patent_details['title'],
-                patent_details['abstract'],
-                patent_details['filing_date'],
-                patent_details['issue_date'],
-                patent_details['assignee'],
-                patent_details['inventors'],
-                patent_details['category'],
-                patent_details['full_text']
-            ))
-            
-            # Get the inserted patent ID
-            patent_db_id = cursor.lastrowid
-            
-            # If project ID is provided, link patent to project
-            if project_id:
-                cursor.execute('''
-                    INSERT INTO project_patents (project_id, patent_id)
-                    VALUES (?, ?)
-                ''', (project_id, patent_db_id))
-            
-            conn.commit()
-            conn.close()
-            
-            # Redirect to patent details page
-            self.send_response(HTTPStatus.FOUND)
-            self.send_header('Location', f'/patents/view/{patent_db_id}')
-            self.end_headers()
-        else:
-            # If patent not found, redirect back with error
-            self.send_response(HTTPStatus.FOUND)
-            self.send_header('Location', '/patents/search?error=1')
-            self.end_headers()
+        job_id = job_queue.enqueue_job('patent_save', {
+            'patent_id': patent_id,
+            'project_id': project_id or None
+        })
+        self.send_job_accepted(job_id)
     
     def handle_patent_analysis(self, post_params):
-        """Handle patent analysis requests"""
+        """Handle patent analysis requests by queueing a background job"""
         if isinstance(post_params, dict):
             patent_id = post_params.get('patent_id', '')
         else:
             patent_id = post_params.get('patent_id', [''])[0]
         
-        # Get patent from database
-        conn = self.get_db_connection()
-        patent = conn.execute('SELECT * FROM patents WHERE id = ?', (patent_id,)).fetchone()
+        if not patent_id:
+            self.send_json({'error': 'Missing patent ID'}, HTTPStatus.BAD_REQUEST)
+            return
         
-        if patent:
-            # Perform analysis (placeholder)
-            analysis = {
-                'patent_id': patent_id,
-                'seo_impact': 'High',
-                'innovation_score': 85,
-                'keywords': json.dumps(['ranking', 'algorithm', 'quality', 'relevance']),
-                'keyphrases': json.dumps(['search quality', 'page ranking', 'site authority']),
-                'recommendations': json.dumps([
-                    'Focus on comprehensive content that demonstrates E-A-T',
-                    'Create content that fully addresses user intent',
-                    'Improve technical SEO aspects mentioned in the patent'
-                ]),
-                'insight_summary': 'This patent suggests Google places high importance on content quality and relevance signals.'
-            }
-            
-            # Save analysis to database
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO patent_analyses (
-                    patent_id, seo_impact, innovation_score, keywords,
-                    keyphrases, recommendations, insight_summary
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                patent_id,
-                analysis['seo_impact'],
-                analysis['innovation_score'],
-                analysis['keywords'],
-                analysis['keyphrases'],
-                analysis['recommendations'],
-                analysis['insight_summary']
-            ))
-            
-            analysis_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            # Redirect to analysis page
-            self.send_response(HTTPStatus.FOUND)
-            self.send_header('Location', f'/patents/analysis/{analysis_id}')
-            self.end_headers()
+        job_id = job_queue.enqueue_job('patent_analysis', {'patent_id': patent_id})
+        self.send_job_accepted(job_id)
+    
+    def send_job_accepted(self, job_id):
+        """Respond 202 Accepted with the URL to poll for job status"""
+        status_url = f'/api/jobs/{job_id}'
+        self.send_response(HTTPStatus.ACCEPTED)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Location', status_url)
+        self.send_header('X-Robots-Tag', 'noindex, nofollow')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': status_url
+        }).encode())
+    
+    def handle_jobs_api(self, path, query_params):
+        """Handle /api/jobs endpoints (list, status, cancel)"""
+        parts = path.strip('/').split('/')
+        
+        if len(parts) == 2:
+            status = query_params.get('status', [None])[0]
+            limit = int(query_params.get('limit', ['50'])[0])
+            self.send_json(job_queue.list_jobs(status=status, limit=limit))
+            return
+        
+        try:
+            job_id = int(parts[2])
+        except ValueError:
+            self.send_json({'error': 'Invalid job ID'}, HTTPStatus.BAD_REQUEST)
+            return
+        
+        if len(parts) == 4 and parts[3] == 'cancel' and self.command == 'POST':
+            if job_queue.cancel_job(job_id):
+                self.send_json(job_queue.get_job(job_id))
+            else:
+                self.send_json({'error': 'Job not found or already finished'}, HTTPStatus.CONFLICT)
+        elif len(parts) == 3:
+            job = job_queue.get_job(job_id)
+            if job:
+                self.send_json(job)
+            else:
+                self.send_json({'error': 'Job not found'}, HTTPStatus.NOT_FOUND)
         else:
-            conn.close()
-            # If patent not found, redirect back with error
-            self.send_response(HTTPStatus.FOUND)
-            self.send_header('Location', '/patents?error=1')
+            self.send_json({'error': 'Not found'}, HTTPStatus.NOT_FOUND)
+    
+    def handle_profiling_api(self, path, query_params, post_params=None):
+        """Handle /api/admin/profiling (GET or POST settings), /api/admin/profiles and /api/admin/profiles/<file>"""
+        if not profiling.authorized(self):
+            self.send_json({'error': 'Forbidden'}, HTTPStatus.FORBIDDEN)
+            return
+        
+        if path == '/api/admin/profiling':
+            if post_params is None:
+                self.send_json(profiling.get_settings())
+                return
+            try:
+                settings = profiling.configure(post_params.get('sample_rate'), post_params.get('mode'),
+                                               post_params.get('duration'))
+            except ValueError as e:
+                self.send_json({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+                return
+            self.send_json(settings)
+        elif path == '/api/admin/profiles':
+            limit = int(query_params.get('limit', ['50'])[0])
+            self.send_json(profiling.list_profiles(limit))
+        else:
+            profile = profiling.read_profile(path.rsplit('/', 1)[-1])
+            if profile is None:
+                self.send_json({'error': 'Profile not found'}, HTTPStatus.NOT_FOUND)
+                return
+            content_type, body = profile
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
+            self.wfile.write(body)
     
     def process_includes(self, content):
         """Process includes in HTML content"""
@@ -442,74 +534,17 @@ class SEOPatentHandler(BaseHTTPRequestHandler):
 
 def init_db():
     """Initialize the database if it doesn't exist"""
-    db_path = os.path.join(SERVER_ROOT, DATABASE)
-    
-    # Create database directory if it doesn't exist
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    
-    # Connect to database
-    conn = sqlite3.connect(db_path)
+    # get_db creates the tables from database/schema.sql
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Create tables if they don't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS projects (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        description TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS patents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        patent_id TEXT NOT NULL,
-        title TEXT NOT NULL,
-        abstract TEXT,
-        filing_date TEXT,
-        issue_date TEXT,
-        assignee TEXT,
-        inventors TEXT,
-        category TEXT,
-        full_text TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS patent_analyses (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        patent_id INTEGER,
-        seo_impact TEXT,
-        innovation_score INTEGER,
-        keywords TEXT,
-        keyphrases TEXT,
-        recommendations TEXT,
-        insight_summary TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (patent_id) REFERENCES patents (id)
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS project_patents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        project_id INTEGER,
-        patent_id INTEGER,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (project_id) REFERENCES projects (id),
-        FOREIGN KEY (patent_id) REFERENCES patents (id)
-    )
-    ''')
-    
     # Insert demo data if tables are empty
     if not cursor.execute('SELECT COUNT(*) FROM projects').fetchone()[0]:
         cursor.execute('''
-        INSERT INTO projects (name, description)
+        INSERT INTO projects (name, description, created_at)
         VALUES 
-            ('SEO Strategy 2025', 'Research for upcoming algorithm changes'),
-            ('Competitor Analysis', 'Patent analysis of major competitors')
+            ('SEO Strategy 2025', 'Research for upcoming algorithm changes', CURRENT_TIMESTAMP),
+            ('Competitor Analysis', 'Patent analysis of major competitors', CURRENT_TIMESTAMP)
         ''')
     
     if not cursor.execute('SELECT COUNT(*) FROM patents').fetchone()[0]:
@@ -542,10 +577,9 @@ def run_server():
     os.makedirs('static', exist_ok=True)
     
     server_address = ('0.0.0.0', PORT)
-    httpd = HTTPServer(server_address, SEOPatentHandler)
-    
     print(f"Server running at http://localhost:{PORT}/")
-    httpd.serve_forever()
+    prefork.serve_prefork(server_address, SEOPatentHandler, server_class=ThreadingHTTPServer,
+                          warmup=prefork.warm_caches, on_worker_start=prefork.start_worker_metrics)
 
 if __name__ == '__main__':
     run_server()
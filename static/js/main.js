@@ -138,6 +138,22 @@ function submitFormAsync(form) {
         
         return response.text();
     })
+    .then(data => {
+        // Background jobs return a status URL; wait for the job to finish
+        if (data && typeof data === 'object' && data.status_url) {
+            return pollJob(data.status_url, job => {
+                if (submitBtn) {
+                    submitBtn.innerHTML = `<span class="spinner"></span> ${Math.round(job.progress * 100)}%`;
+                }
+            }).then(job => {
+                if (job.status !== 'succeeded') {
+                    throw new Error(job.error || `Job ${job.status}`);
+                }
+                return Object.assign({ redirect: job.result && job.result.location }, job.result);
+            });
+        }
+        return data;
+    })
     .then(data => {
         // Reset loading state
         form.classList.remove('is-loading');
@@ -195,6 +211,35 @@ function handleFormSuccess(form, data) {
     }
 }
 
+/**
+ * Poll a background job until it finishes
+ */
+function pollJob(statusUrl, onProgress, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        function check() {
+            fetch(statusUrl)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Could not fetch job status');
+                    }
+                    return response.json();
+                })
+                .then(job => {
+                    if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+                        resolve(job);
+                        return;
+                    }
+                    if (onProgress) {
+                        onProgress(job);
+                    }
+                    setTimeout(check, interval);
+                })
+                .catch(reject);
+        }
+        check();
+    });
+}
+
 /**
  * Handle form submission error
  */
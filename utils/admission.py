@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Admission Control
+-----------------
+Bounded concurrency and per-client rate limits for the HTTP servers.
+
+Each request is put in a route class: ``heavy`` (search, similarity,
+relevance, GSC aggregations, exports), ``api`` (other API calls and form
+posts) or ``static`` (pages and assets). Every class has its own in-flight
+limit, so slow routes can't take the threads static pages need. A request
+whose class is full waits up to ADMISSION_QUEUE_TIMEOUT for a slot and is
+then answered at once with 503 and a ``Retry-After`` header, instead of
+queueing until the client times out.
+
+API and heavy requests also draw from a per-client token bucket
+(ADMISSION_CLIENT_RATE requests per second, bursts of ADMISSION_CLIENT_BURST,
+heavy requests costing ADMISSION_HEAVY_COST); a client that runs dry gets
+429 with the time until it may retry.
+
+Limits are per process, so with pre-forked workers (see utils/prefork.py)
+they apply to each worker. Decisions are counted in
+``seo_admission_decisions_total`` and in-flight requests per class in
+``seo_admission_in_flight``.
+"""
+
+import re
+import json
+import math
+import time
+import threading
+from http import HTTPStatus
+from contextlib import contextmanager
+
+from utils import metrics
+from config import (
+    ADMISSION_STATIC_LIMIT, ADMISSION_API_LIMIT, ADMISSION_HEAVY_LIMIT, ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER, ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST, ADMISSION_HEAVY_COST,
+    ADMISSION_TRUST_PROXY
+)
+
+ROUTE_CLASSES = ('static', 'api', 'heavy')
+
+# Routes that run analysis, search or fetch work, in either server
+_HEAVY_ROUTES = re.compile(
+    r'^/(?:api/(?:search|relevance|export|gsc/[^/]+|patent/[^/]+/similar)|patents/search)/?$'
+)
+
+# Never limited, so monitoring still works when the server is overloaded
+_EXEMPT_PATHS = ('/metrics',)
+
+# Idle clients are forgotten once this many are tracked
+_MAX_CLIENTS = 10000
+
+
+def route_class(method, path):
+    """The route class of a request, or None if it is exempt.
+
+    Args:
+        method (str): HTTP method
+        path (str): Request path without query string
+
+    Returns:
+        str: 'static', 'api' or 'heavy'
+    """
+    if path in _EXEMPT_PATHS:
+        return None
+    if _HEAVY_ROUTES.match(path):
+        return 'heavy'
+    if path.startswith('/api/') or method != 'GET':
+        return 'api'
+    return 'static'
+
+
+class ClientRateLimiter:
+    """Token buckets per client.
+
+    Args:
+        rate (float): Tokens added per second (0 disables the limit)
+        burst (float): Bucket size
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._buckets = {}  # client -> (tokens, last update)
+        self._lock = threading.Lock()
+
+    def acquire(self, client, cost=1.0):
+        """Take cost tokens from the client's bucket.
+
+        Returns:
+            float: 0 if the request may proceed, otherwise seconds until the
+                bucket holds enough tokens
+        """
+        if self.rate <= 0:
+            return 0
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < cost:
+                self._buckets[client] = (tokens, now)
+                return (cost - tokens) / self.rate
+            self._buckets[client] = (tokens - cost, now)
+            if len(self._buckets) > _MAX_CLIENTS:
+                self._prune(now)
+        return 0
+
+    def _prune(self, now):
+        """Drop buckets that have refilled, i.e. clients that went quiet"""
+        full_after = self.burst / self.rate
+        self._buckets = {
+            client: (tokens, updated) for client, (tokens, updated) in self._buckets.items()
+            if now - updated < full_after
+        }
+
+
+class AdmissionController:
+    """In-flight limits per route class plus per-client rate limits.
+
+    Args:
+        limits (dict): Route class -> maximum concurrent requests (0 = unlimited)
+        queue_timeout (float): Seconds to wait for a free slot before shedding
+        rate_limiter (ClientRateLimiter): Per-client limits for API and heavy routes
+    """
+
+    def __init__(self, limits=None, queue_timeout=ADMISSION_QUEUE_TIMEOUT, rate_limiter=None):
+        self.limits = limits or {
+            'static': ADMISSION_STATIC_LIMIT,
+            'api': ADMISSION_API_LIMIT,
+            'heavy': ADMISSION_HEAVY_LIMIT,
+        }
+        self.queue_timeout = queue_timeout
+        self.rate_limiter = rate_limiter or ClientRateLimiter(ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST)
+        self._in_flight = dict.fromkeys(ROUTE_CLASSES, 0)
+        self._released = threading.Condition()
+
+    def _acquire_slot(self, cls):
+        limit = self.limits.get(cls, 0)
+        deadline = time.monotonic() + self.queue_timeout
+        with self._released:
+            while limit and self._in_flight[cls] >= limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._released.wait(remaining)
+            self._in_flight[cls] += 1
+        metrics.ADMISSION_IN_FLIGHT.inc(route_class=cls)
+        return True
+
+    def _release_slot(self, cls):
+        with self._released:
+            self._in_flight[cls] -= 1
+            self._released.notify()
+        metrics.ADMISSION_IN_FLIGHT.dec(route_class=cls)
+
+    @contextmanager
+    def admit(self, handler):
+        """Admit a request or answer it with 429/503.
+
+        Usage::
+
+            with admission.admit(self) as admitted:
+                if admitted:
+                    self.handle_get()
+
+        Args:
+            handler (BaseHTTPRequestHandler): The active request handler
+
+        Yields:
+            bool: Whether the handler should serve the request
+        """
+        cls = route_class(handler.command, handler.path.split('?', 1)[0])
+        if cls is None:
+            yield True
+            return
+
+        if cls != 'static':
+            wait = self.rate_limiter.acquire(client_key(handler), ADMISSION_HEAVY_COST if cls == 'heavy' else 1)
+            if wait:
+                metrics.record_admission(cls, 'rate_limited')
+                _reject(handler, HTTPStatus.TOO_MANY_REQUESTS, wait, 'Too many requests')
+                yield False
+                return
+
+        if not self._acquire_slot(cls):
+            metrics.record_admission(cls, 'shed')
+            _reject(handler, HTTPStatus.SERVICE_UNAVAILABLE, ADMISSION_RETRY_AFTER, 'Server busy')
+            yield False
+            return
+
+        metrics.record_admission(cls, 'admitted')
+        try:
+            yield True
+        finally:
+            self._release_slot(cls)
+
+
+def client_key(handler):
+    """The client a request is counted against: its address, or the first
+    X-Forwarded-For hop when ADMISSION_TRUST_PROXY is set"""
+    if ADMISSION_TRUST_PROXY:
+        forwarded = handler.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',', 1)[0].strip()
+    return handler.client_address[0]
+
+
+def _reject(handler, status, retry_after, message):
+    """Answer a request that wasn't admitted, without reading its body"""
+    body = json.dumps({'error': message}).encode()
+    handler.send_response(status)
+    handler.send_header('Content-type', 'application/json')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('Retry-After', str(max(1, math.ceil(retry_after))))
+    handler.send_header('Connection', 'close')
+    handler.end_headers()
+    handler.wfile.write(body)
+    handler.close_connection = True
+
+
+_controller = AdmissionController()
+
+
+def admit(handler):
+    """Admit a request with the process-wide controller (see AdmissionController.admit)"""
+    return _controller.admit(handler)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Data Export
+-----------
+Streams patents, analyses and project SEO tables from SQLite to CSV, NDJSON
+or Parquet. Rows are read with ``fetchmany`` and written batch by batch, so
+memory stays constant however large the table is.
+
+Columns are validated against the table's own schema (``PRAGMA
+table_info``), so only real column names ever reach the SQL. Parquet output
+needs pyarrow; CSV and NDJSON use the standard library only.
+"""
+
+import io
+import csv
+import json
+
+from database.db_manager import get_db
+from database.records import decode_payload
+from config import EXPORT_BATCH_SIZE, EXPORT_ROW_GROUP_ROWS, EXPORT_PARQUET_COMPRESSION
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Exportable tables and how they are scoped to a project:
+# 'project' tables have a project_id column, 'upload' tables an upload_id
+EXPORT_TABLES = {
+    'patents': None,
+    'analyses': 'project',
+    'search_console_data': 'upload',
+    'ahrefs_backlinks': 'upload',
+    'ahrefs_internal_links': 'upload',
+    'screaming_frog_data': 'upload',
+    'gsc_rollups': 'project',
+    'patent_relevance': 'project',
+}
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+FILTER_OPERATORS = ('>=', '<=', '!=', '=', '>', '<')
+
+# Analyses store these fields in the compressed payload column
+_PAYLOAD_COLUMNS = ('analysis_data', 'recommendations')
+
+
+def table_columns(conn, table):
+    """Exportable columns of a table and their declared types.
+
+    Binary columns are left out.
+
+    Returns:
+        dict: Column name -> declared type (upper case), in table order
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Table '{table}' cannot be exported")
+    columns = {
+        row[1]: (row[2] or '').upper()
+        for row in conn.execute(f'PRAGMA table_info({table})')
+    }
+    if not columns:
+        raise ValueError(f"Table '{table}' does not exist")
+    return {name: decltype for name, decltype in columns.items() if decltype != 'BLOB'}
+
+
+def parse_filter(text):
+    """Parse 'column<op>value' (e.g. 'date>=2024-01-01') into a filter tuple.
+
+    Returns:
+        tuple: (column, operator, value)
+    """
+    for operator in FILTER_OPERATORS:
+        column, found, value = text.partition(operator)
+        if found and column:
+            return column.strip(), operator, value
+    raise ValueError(f"Invalid filter '{text}'")
+
+
+class ExportQuery:
+    """A validated, streaming SELECT over one exportable table.
+
+    Attributes:
+        table (str): The table
+        columns (list): Selected column names, in output order
+        types (list): Declared SQLite type of each selected column
+    """
+
+    def __init__(self, table, columns=None, filters=None, project_id=None,
+                 batch_size=EXPORT_BATCH_SIZE):
+        """
+        Args:
+            table (str): One of EXPORT_TABLES
+            columns (list): Columns to export (default: all)
+            filters (list): (column, operator, value) tuples, all of which must match
+            project_id (int): Only export rows of this project
+            batch_size (int): Rows fetched per batch
+        """
+        conn = get_db()
+        try:
+            available = table_columns(conn, table)
+        finally:
+            conn.close()
+
+        self.table = table
+        self.batch_size = batch_size
+        self.columns = list(columns) if columns else list(available)
+
+        unknown = [column for column in self.columns if column not in available]
+        for column, operator, _ in filters or ():
+            if column not in available:
+                unknown.append(column)
+            if operator not in FILTER_OPERATORS:
+                raise ValueError(f"Invalid filter operator '{operator}'")
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}")
+
+        self.types = [available.get(column, 'TEXT') for column in self.columns]
+
+        # Payload fields of analyses are decoded from the payload column,
+        # falling back to the legacy JSON text columns
+        self._decode = table == 'analyses' and any(c in _PAYLOAD_COLUMNS for c in self.columns)
+        select = [f't.{column}' for column in self.columns if not (self._decode and column in _PAYLOAD_COLUMNS)]
+        if self._decode:
+            select += ['t.payload', 't.analysis_data', 't.recommendations']
+
+        where = []
+        self.params = []
+        for column, operator, value in filters or ():
+            where.append(f't.{column} {operator} ?')
+            self.params.append(value)
+        if project_id is not None:
+            scope = EXPORT_TABLES[table]
+            if scope == 'project':
+                where.append('t.project_id = ?')
+            elif scope == 'upload':
+                where.append('t.upload_id IN (SELECT id FROM uploads WHERE project_id = ? AND deleted_at IS NULL)')
+            else:
+                raise ValueError(f"Table '{table}' is not scoped to a project")
+            self.params.append(project_id)
+
+        self.sql = f"SELECT {', '.join(select)} FROM {table} t"
+        if where:
+            self.sql += ' WHERE ' + ' AND '.join(where)
+
+    def _decode_rows(self, rows):
+        positions = sorted(self.columns.index(column) for column in _PAYLOAD_COLUMNS if column in self.columns)
+        decoded_rows = []
+        for row in rows:
+            *values, payload, analysis_data, recommendations = row
+            if payload is not None:
+                fields = decode_payload(payload)
+            else:
+                fields = {
+                    'analysis_data': json.loads(analysis_data) if analysis_data else None,
+                    'recommendations': json.loads(recommendations) if recommendations else None,
+                }
+            for position in positions:
+                field = fields.get(self.columns[position])
+                values.insert(position, json.dumps(field) if field is not None else None)
+            decoded_rows.append(tuple(values))
+        return decoded_rows
+
+    def batches(self):
+        """Yield lists of row tuples, batch_size rows at a time"""
+        conn = get_db()
+        conn.row_factory = None
+        try:
+            cursor = conn.execute(self.sql, self.params)
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield self._decode_rows(rows) if self._decode else rows
+        finally:
+            conn.close()
+
+
+def write_csv(query, out):
+    """Write a query as CSV with a header row to a binary stream"""
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(query.columns)
+    count = 0
+    for rows in query.batches():
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    text.detach()
+    return count
+
+
+def write_ndjson(query, out):
+    """Write a query as one JSON object per line to a binary stream"""
+    count = 0
+    for rows in query.batches():
+        out.write(''.join(
+            json.dumps(dict(zip(query.columns, row))) + '\n' for row in rows
+        ).encode('utf-8'))
+        count += len(rows)
+    return count
+
+
+def _arrow_type(decltype):
+    if 'INT' in decltype:
+        return pyarrow.int64()
+    if any(name in decltype for name in ('REAL', 'FLOA', 'DOUB')):
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+_PYTHON_TYPES = {'int64': (int,), 'double': (int, float), 'string': (str,)}
+
+
+def _arrow_batch(schema, rows):
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        # SQLite doesn't enforce column types; values of another type are nulled
+        accepted = _PYTHON_TYPES[str(field.type)]
+        arrays.append(pyarrow.array(
+            [value if isinstance(value, accepted) else None for value in values], type=field.type
+        ))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(query, out, compression=EXPORT_PARQUET_COMPRESSION,
+                  row_group_rows=EXPORT_ROW_GROUP_ROWS):
+    """Write a query as compressed Parquet to a binary stream.
+
+    Batches are buffered until a row group is full, so memory is bounded by
+    row_group_rows.
+    """
+    if pyarrow is None:
+        raise RuntimeError('pyarrow is required for Parquet export')
+
+    schema = pyarrow.schema([
+        (column, _arrow_type(decltype)) for column, decltype in zip(query.columns, query.types)
+    ])
+    writer = pyarrow.parquet.ParquetWriter(out, schema, compression=compression)
+    pending = []
+    pending_rows = 0
+    count = 0
+    try:
+        for rows in query.batches():
+            pending.append(_arrow_batch(schema, rows))
+            pending_rows += len(rows)
+            count += len(rows)
+            if pending_rows >= row_group_rows:
+                writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+    finally:
+        writer.close()
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'ndjson': write_ndjson,
+    'parquet': write_parquet,
+}
+
+
+def export_table(table, out, fmt='csv', columns=None, filters=None, project_id=None):
+    """Stream a table to a binary stream.
+
+    Args:
+        table (str): One of EXPORT_TABLES
+        out: Binary file object
+        fmt (str): 'csv', 'ndjson' or 'parquet'
+        columns (list): Columns to export (default: all)
+        filters (list): (column, operator, value) tuples
+        project_id (int): Only export rows of this project
+
+    Returns:
+        int: Number of rows written
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    return WRITERS[fmt](ExportQuery(table, columns, filters, project_id), out)
@@ -2,7 +2,9 @@
 import os
 import re
 import json
+import time
 import datetime
+import threading
 from urllib.parse import urlparse
 
 def get_project_path(project_name):
@@ -78,6 +80,55 @@ def parse_csv(file_path, delimiter=','):
     
     return data
 
+def iter_csv(source, delimiter=',', encoding='utf-8-sig'):
+    """Stream CSV rows as lists without loading the whole file.
+
+    source may be a path or an open text file (opened with newline='').
+    The first row yielded is the header. Unlike parse_csv, errors are
+    raised so callers can fail the import.
+    """
+    import csv
+    
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r', encoding=encoding, newline='') as f:
+            yield from csv.reader(f, delimiter=delimiter)
+    else:
+        yield from csv.reader(source, delimiter=delimiter)
+
+class RateLimiter:
+    """Thread-safe token bucket limiting how often an action may happen.
+    
+    acquire() blocks until a token is available, so workers sharing one
+    limiter make at most `rate` calls per second on average, with bursts of
+    up to `burst` calls.
+    """
+    
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Wait for and take one token"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now and sleep off the deficit outside the lock
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+    
+    def pause(self, seconds):
+        """Hold back every caller for a while, e.g. after an HTTP 429"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
 def read_file(file_path):
     """Read a file as text"""
     try:
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Job Queue
+---------
+A small persistent job queue stored in the application's SQLite database.
+HTTP handlers enqueue work and return immediately; worker processes started
+with ``scripts/job_worker.py`` claim jobs, report progress, and retry failed
+jobs with exponential backoff.
+"""
+
+import os
+import json
+import time
+import socket
+import datetime
+import threading
+import traceback
+import multiprocessing
+
+from database.db_manager import get_db
+from config import JOB_POLL_INTERVAL, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF, JOB_STALE_SECONDS
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+# job_type -> handler(payload, job) registered with register_job_handler
+JOB_HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a running handler when its job has been cancelled."""
+
+
+def _now(offset_seconds=0):
+    """Timestamp string in the format used throughout the database"""
+    moment = datetime.datetime.now() + datetime.timedelta(seconds=offset_seconds)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _job_to_dict(row):
+    """Convert a jobs row to a JSON serializable dict"""
+    if row is None:
+        return None
+    job = dict(row)
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+def register_job_handler(job_type):
+    """Decorator registering a handler for a job type.
+
+    The handler is called as ``handler(payload, job)`` where ``job`` is a
+    JobContext; its return value is stored as the job result.
+    """
+    def decorator(fn):
+        JOB_HANDLERS[job_type] = fn
+        return fn
+    return decorator
+
+
+def enqueue_job(job_type, payload=None, max_attempts=None):
+    """Add a job to the queue.
+
+    Args:
+        job_type (str): Registered handler name
+        payload (dict): JSON serializable handler arguments
+        max_attempts (int): Attempts before the job is marked failed
+
+    Returns:
+        int: The new job ID
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    now = _now()
+    cursor.execute(
+        '''INSERT INTO jobs (job_type, payload, status, max_attempts, run_after, created_at)
+           VALUES (?, ?, 'queued', ?, ?, ?)''',
+        (job_type, json.dumps(payload or {}), max_attempts or JOB_MAX_ATTEMPTS, now, now)
+    )
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def get_job(job_id):
+    """Get a job by ID as a dict, or None"""
+    conn = get_db()
+    row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    return _job_to_dict(row)
+
+
+def list_jobs(status=None, job_type=None, limit=50):
+    """List recent jobs, newest first, optionally filtered"""
+    conn = get_db()
+    clauses = []
+    params = []
+    if status:
+        clauses.append('status = ?')
+        params.append(status)
+    if job_type:
+        clauses.append('job_type = ?')
+        params.append(job_type)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = conn.execute(
+        f'SELECT * FROM jobs {where} ORDER BY id DESC LIMIT ?', (*params, limit)
+    ).fetchall()
+    conn.close()
+    return [_job_to_dict(row) for row in rows]
+
+
+def cancel_job(job_id):
+    """Cancel a job.
+
+    Queued jobs are cancelled immediately; running jobs are flagged and stop
+    at their next progress report.
+
+    Returns:
+        bool: False if the job doesn't exist or has already finished
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+        (_now(), job_id)
+    )
+    cancelled = cursor.rowcount > 0
+    if not cancelled:
+        cursor.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+            (job_id,)
+        )
+        cancelled = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return cancelled
+
+
+def claim_job(worker_id):
+    """Atomically claim the next runnable job.
+
+    Jobs left 'running' by a worker that stopped sending heartbeats are
+    handled first: the lost run counts as an attempt, so they are queued for
+    a retry with backoff, failed once max_attempts is reached, or cancelled
+    if cancellation was requested.
+
+    Args:
+        worker_id (str): Identifier of the claiming worker
+
+    Returns:
+        dict: The claimed job, or None if the queue is empty
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    now = _now()
+    try:
+        # Take the write lock up front so two workers can't claim the same row
+        cursor.execute('BEGIN IMMEDIATE')
+        stale = cursor.execute(
+            '''SELECT id, attempts, max_attempts, cancel_requested FROM jobs
+               WHERE status = 'running' AND heartbeat_at < ?''',
+            (_now(-JOB_STALE_SECONDS),)
+        ).fetchall()
+        for job in stale:
+            _finish_attempt(cursor, job, f"Worker stopped sending heartbeats for {JOB_STALE_SECONDS}s")
+        row = cursor.execute(
+            '''SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ?
+               ORDER BY run_after, id LIMIT 1''',
+            (now,)
+        ).fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        cursor.execute(
+            '''UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1,
+                   started_at = ?, heartbeat_at = ?, error = NULL
+               WHERE id = ?''',
+            (worker_id, now, now, row['id'])
+        )
+        job = cursor.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+        conn.commit()
+        return _job_to_dict(job)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _finish_attempt(cursor, job, error):
+    """End a running job's attempt: cancel it if requested, otherwise retry
+    it with exponential backoff or fail it once max_attempts is reached.
+
+    Returns:
+        str: The job's new status
+    """
+    if job['cancel_requested']:
+        cursor.execute(
+            "UPDATE jobs SET status = 'cancelled', error = ?, finished_at = ?, worker_id = NULL WHERE id = ?",
+            (error, _now(), job['id'])
+        )
+        return 'cancelled'
+    if job['attempts'] < job['max_attempts']:
+        delay = JOB_RETRY_BACKOFF * (2 ** (job['attempts'] - 1))
+        cursor.execute(
+            "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, worker_id = NULL WHERE id = ?",
+            (error, _now(delay), job['id'])
+        )
+        return 'queued'
+    cursor.execute(
+        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, worker_id = NULL WHERE id = ?",
+        (error, _now(), job['id'])
+    )
+    return 'failed'
+
+
+def complete_job(job_id, worker_id, result=None):
+    """Mark a job as succeeded and store its result.
+
+    Returns:
+        bool: False if worker_id no longer owns the running job (it was
+            requeued as stale or finished elsewhere), in which case nothing
+            is recorded
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, finished_at = ?
+           WHERE id = ? AND status = 'running' AND worker_id = ?''',
+        (json.dumps(result), _now(), job_id, worker_id)
+    )
+    completed = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return completed
+
+
+def fail_job(job_id, worker_id, error):
+    """Record a failed attempt, scheduling a retry with exponential backoff.
+
+    A job whose cancellation was requested while it ran is cancelled instead.
+
+    Returns:
+        str: The job's new status ('queued' if it will be retried, else
+            'failed' or 'cancelled'), or None if worker_id no longer owns
+            the running job
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        job = cursor.execute(
+            '''SELECT id, attempts, max_attempts, cancel_requested FROM jobs
+               WHERE id = ? AND status = 'running' AND worker_id = ?''',
+            (job_id, worker_id)
+        ).fetchone()
+        status = _finish_attempt(cursor, job, error) if job is not None else None
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return status
+
+
+def _mark_cancelled(job_id, worker_id):
+    conn = get_db()
+    conn.execute(
+        '''UPDATE jobs SET status = 'cancelled', finished_at = ?
+           WHERE id = ? AND status = 'running' AND worker_id = ?''',
+        (_now(), job_id, worker_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting and cancellation."""
+
+    def __init__(self, job):
+        self.id = job['id']
+        self.job_type = job['job_type']
+        self.attempt = job['attempts']
+        self.worker_id = job['worker_id']
+
+    def progress(self, fraction, message=None):
+        """Report progress and check for cancellation.
+
+        Args:
+            fraction (float): Completed fraction between 0 and 1
+            message (str): Optional human-readable status
+
+        Raises:
+            JobCancelled: If the job was cancelled while running, or this
+                worker no longer owns it
+        """
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''UPDATE jobs SET progress = ?, progress_message = ?, heartbeat_at = ?
+               WHERE id = ? AND status = 'running' AND worker_id = ?''',
+            (max(0.0, min(1.0, fraction)), message, _now(), self.id, self.worker_id)
+        )
+        owned = cursor.rowcount > 0
+        cancel_requested = conn.execute(
+            'SELECT cancel_requested FROM jobs WHERE id = ?', (self.id,)
+        ).fetchone()[0]
+        conn.commit()
+        conn.close()
+        if not owned:
+            raise JobCancelled(f"Job {self.id} is no longer owned by worker {self.worker_id}")
+        if cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+
+def _send_heartbeats(job_id, worker_id, stop):
+    """Refresh a running job's heartbeat until stop is set, so handlers that
+    don't report progress aren't taken for dead and run again"""
+    interval = max(1.0, JOB_STALE_SECONDS / 3)
+    while not stop.wait(interval):
+        try:
+            conn = get_db()
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND worker_id = ?",
+                (_now(), job_id, worker_id)
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error sending heartbeat for job {job_id}: {e}")
+
+
+def run_job(job):
+    """Run one claimed job through its handler and record the outcome"""
+    handler = JOB_HANDLERS.get(job['job_type'])
+    if handler is None:
+        fail_job(job['id'], job['worker_id'], f"No handler registered for job type '{job['job_type']}'")
+        return
+
+    context = JobContext(job)
+    stop_heartbeats = threading.Event()
+    heartbeats = threading.Thread(
+        target=_send_heartbeats, args=(job['id'], job['worker_id'], stop_heartbeats),
+        name=f"job-{job['id']}-heartbeat", daemon=True
+    )
+    heartbeats.start()
+    try:
+        result = handler(job['payload'], context)
+    except JobCancelled:
+        _mark_cancelled(job['id'], job['worker_id'])
+        print(f"Job {job['id']} ({job['job_type']}) cancelled")
+    except Exception as e:
+        status = fail_job(job['id'], job['worker_id'], f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+        print(f"Job {job['id']} ({job['job_type']}) failed: {e} [{status}]")
+    else:
+        if complete_job(job['id'], job['worker_id'], result):
+            print(f"Job {job['id']} ({job['job_type']}) succeeded")
+        else:
+            print(f"Job {job['id']} ({job['job_type']}) finished after this worker lost it; result discarded")
+    finally:
+        stop_heartbeats.set()
+        heartbeats.join()
+
+
+def run_worker(worker_id=None, poll_interval=None, max_jobs=None):
+    """Claim and run jobs until interrupted.
+
+    Args:
+        worker_id (str): Identifier recorded on claimed jobs
+        poll_interval (float): Seconds to sleep when the queue is empty
+        max_jobs (int): Exit after this many jobs (None to run forever)
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = poll_interval or JOB_POLL_INTERVAL
+    processed = 0
+
+    while max_jobs is None or processed < max_jobs:
+        job = claim_job(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+
+
+def run_workers(num_workers, handler_modules=()):
+    """Start worker processes and restart any that exit.
+
+    Args:
+        num_workers (int): Number of worker processes
+        handler_modules (iterable): Modules to import in each worker so their
+            handlers are registered
+    """
+    def start(index):
+        process = multiprocessing.Process(
+            target=_worker_main, args=(index, tuple(handler_modules), num_workers > 1),
+            name=f"job-worker-{index}"
+        )
+        process.start()
+        return process
+
+    processes = {index: start(index) for index in range(num_workers)}
+    try:
+        while True:
+            time.sleep(JOB_POLL_INTERVAL)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    print(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    processes[index] = start(index)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+
+def _worker_main(index, handler_modules, shared_singleflight=False):
+    import importlib
+    for module in handler_modules:
+        importlib.import_module(module)
+    if shared_singleflight:
+        # Workers running the same jobs share fetches and analyses
+        from utils import singleflight
+        singleflight.enable_shared()
+    try:
+        run_worker(f"{socket.gethostname()}:{os.getpid()}:{index}")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Metrics
+-------
+Lightweight in-process metrics (counters, gauges and histograms) rendered in
+the Prometheus text exposition format for the ``/metrics`` endpoint.
+
+Under the pre-fork server every worker labels its samples ``worker="<n>"``
+and dumps them to ``<prefix>.<n>`` (see ``set_worker``); ``/metrics`` in any
+worker answers with its own samples merged with the other workers' latest
+dumps, so scrapes see every worker whichever one they land on.
+"""
+
+import os
+import re
+import glob
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+from utils import profiling
+from config import METRICS_FILE, METRICS_DUMP_INTERVAL
+
+# Default latency buckets in seconds (same spread as the Prometheus clients)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    """Format a label set as {a="x",b="y"}"""
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    """Format a sample value"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for a labelled metric."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self, const_labels=()):
+        """Render the metric in the Prometheus text format.
+
+        Args:
+            const_labels (tuple): (name, value) labels added to every sample
+
+        Returns:
+            list: Output lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            labels = _format_labels(self.labelnames, labelvalues, const_labels)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing counter."""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """A cumulative histogram of observed values."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts plus one overflow slot, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the wrapped block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, const_labels=()):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1])) for key, state in self._values.items())
+        for labelvalues, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues,
+                                        [*const_labels, ('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues, const_labels)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registry holding every metric exposed by the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        # (name, value) labels added to every sample, e.g. the pre-fork worker
+        self.const_labels = ()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.metric_type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render all metrics in the Prometheus text format.
+
+        Returns:
+            str: The exposition text
+        """
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(self.const_labels))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file_path):
+        """Atomically write the current metrics to a file.
+
+        Args:
+            file_path (str): Destination path
+
+        Returns:
+            bool: True if the file was written
+        """
+        try:
+            directory = os.path.dirname(os.path.abspath(file_path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, file_path)
+            return True
+        except OSError as e:
+            print(f"Error writing metrics file: {e}")
+            return False
+
+
+REGISTRY = MetricsRegistry()
+
+# HTTP server metrics
+REQUEST_LATENCY = REGISTRY.histogram(
+    'seo_http_request_duration_seconds', 'HTTP request latency by route',
+    ('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'seo_http_requests_in_flight', 'HTTP requests currently being served', ('method',))
+
+# Time spent in each phase of a request: db, render, analysis, fetch
+PHASE_LATENCY = REGISTRY.histogram(
+    'seo_phase_duration_seconds', 'Time spent per phase and operation',
+    ('phase', 'operation'))
+
+# Caches and outbound requests
+CACHE_REQUESTS = REGISTRY.counter(
+    'seo_cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'seo_cache_hit_ratio', 'Fraction of cache lookups that were hits', ('cache',))
+FETCHER_REQUESTS = REGISTRY.counter(
+    'seo_fetcher_requests_total', 'Outbound patent fetches by source and outcome',
+    ('source', 'outcome'))
+
+# Admission control (see utils/admission.py)
+ADMISSION_DECISIONS = REGISTRY.counter(
+    'seo_admission_decisions_total', 'Admission decisions by route class',
+    ('route_class', 'decision'))
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    'seo_admission_in_flight', 'Admitted requests currently being served by route class',
+    ('route_class',))
+
+# Deduplicated concurrent calls (see utils/singleflight.py)
+SINGLEFLIGHT_CALLS = REGISTRY.counter(
+    'seo_singleflight_calls_total', 'Single-flight calls by operation and role',
+    ('operation', 'role'))
+
+_ID_SEGMENT = re.compile(r'^(?:\d+|[A-Z]{2}\d{4,}[A-Z]?\d?)$', re.IGNORECASE)
+
+
+def route_label(path):
+    """Collapse a request path into a low-cardinality route label.
+
+    Numeric and patent-number path segments become ``:id`` and static assets
+    are grouped by extension, so each patent page doesn't get its own series.
+
+    Args:
+        path (str): The request path without query string
+
+    Returns:
+        str: The route label
+    """
+    if path.startswith('/static/') or os.path.splitext(path)[1] not in ('', '.html'):
+        ext = os.path.splitext(path)[1].lstrip('.') or 'other'
+        return f"static:{ext}"
+    segments = [':id' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/')]
+    return '/'.join(segments) or '/'
+
+
+@contextmanager
+def phase(name, operation):
+    """Time a phase of work (db, render, analysis, fetch).
+
+    Args:
+        name (str): The phase name
+        operation (str): What is being done, e.g. 'get_patents'
+    """
+    # Also a named span when the request is being profiled
+    with PHASE_LATENCY.time(phase=name, operation=operation), profiling.span(f"{name}:{operation}"):
+        yield
+
+
+def record_cache(cache, hit):
+    """Record a cache lookup and refresh the hit ratio gauge.
+
+    Args:
+        cache (str): Cache name
+        hit (bool): Whether the lookup was a hit
+    """
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+    hits = CACHE_REQUESTS.value(cache=cache, result='hit')
+    total = hits + CACHE_REQUESTS.value(cache=cache, result='miss')
+    CACHE_HIT_RATIO.set(hits / total if total else 0, cache=cache)
+
+
+def record_fetch(source, outcome):
+    """Record an outbound fetch.
+
+    Args:
+        source (str): Where the fetch went, e.g. 'google_patents'
+        outcome (str): 'ok', 'http_error' or 'error'
+    """
+    FETCHER_REQUESTS.inc(source=source, outcome=outcome)
+
+
+def record_admission(route_class, decision):
+    """Record an admission decision.
+
+    Args:
+        route_class (str): 'static', 'api' or 'heavy'
+        decision (str): 'admitted', 'shed' or 'rate_limited'
+    """
+    ADMISSION_DECISIONS.inc(route_class=route_class, decision=decision)
+
+
+def record_singleflight(operation, role):
+    """Record a single-flight call.
+
+    Args:
+        operation (str): The key's operation, e.g. 'patent_details'
+        role (str): 'leader', 'follower' (same process), 'process_follower'
+            (another process) or 'fallback' (computed after waiting failed)
+    """
+    SINGLEFLIGHT_CALLS.inc(operation=operation, role=role)
+
+
+@contextmanager
+def track_request(handler, method):
+    """Track latency, status and in-flight count for one HTTP request.
+
+    The handler's ``send_response`` must record the status code in
+    ``handler._metrics_status`` (see the servers' SEOPatentHandler).
+
+    Args:
+        handler (BaseHTTPRequestHandler): The active request handler
+        method (str): The HTTP method
+    """
+    route = route_label(handler.path.split('?', 1)[0])
+    handler._metrics_status = 0
+    REQUESTS_IN_FLIGHT.inc(method=method)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec(method=method)
+        status = handler._metrics_status or 500
+        REQUEST_LATENCY.observe(time.perf_counter() - start, method=method, route=route, status=status)
+
+
+# Pre-fork worker index and the prefix of the workers' dump files
+_worker = {'index': None, 'prefix': None}
+
+
+def set_worker(index, prefix):
+    """Mark this process as pre-fork worker index.
+
+    Its samples get a ``worker`` label (a restarted worker starts its
+    counters from zero, which Prometheus handles per series), and render()
+    merges in the dumps the other workers write to ``<prefix>.<n>``.
+
+    Args:
+        index (int): The worker index
+        prefix (str): Path prefix of every worker's dump file
+    """
+    _worker['index'] = index
+    _worker['prefix'] = prefix
+    REGISTRY.const_labels = (('worker', str(index)),)
+
+
+def merge_expositions(texts):
+    """Merge Prometheus text expositions into one.
+
+    Each family's HELP and TYPE are written once, followed by the samples
+    of every input, as the format requires.
+
+    Args:
+        texts (list): Exposition texts
+
+    Returns:
+        str: The merged exposition text
+    """
+    families = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith(('# HELP ', '# TYPE ')):
+                kind, name = line.split(' ', 3)[1:3]
+                family = families.setdefault(name, {'HELP': None, 'TYPE': None, 'samples': []})
+                family[kind] = family[kind] or line
+            elif line and not line.startswith('#') and family is not None:
+                family['samples'].append(line)
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.extend(line for line in (family['HELP'], family['TYPE']) if line)
+        lines.extend(family['samples'])
+    return '\n'.join(lines) + '\n'
+
+
+def _worker_dumps():
+    """The latest dumps of the other pre-fork workers"""
+    texts = []
+    own = f"{_worker['prefix']}.{_worker['index']}"
+    for path in sorted(glob.glob(glob.escape(_worker['prefix']) + '.*')):
+        if path == own or not path.rsplit('.', 1)[1].isdigit():
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+        except OSError:
+            continue
+    return texts
+
+
+def render():
+    """Render the default registry, merged with the other workers' dumps under pre-fork."""
+    if _worker['prefix'] is None:
+        return REGISTRY.render()
+    return merge_expositions([REGISTRY.render(), *_worker_dumps()])
+
+
+def start_file_dumper(file_path=None, interval=None):
+    """Periodically dump metrics to a local file from a daemon thread.
+
+    Args:
+        file_path (str): Destination path (defaults to METRICS_FILE)
+        interval (float): Seconds between dumps (defaults to METRICS_DUMP_INTERVAL)
+
+    Returns:
+        threading.Thread: The dumper thread, or None if no file is configured
+    """
+    file_path = file_path or METRICS_FILE
+    interval = interval or METRICS_DUMP_INTERVAL
+    if not file_path:
+        return None
+
+    def _dump_loop():
+        while True:
+            REGISTRY.dump(file_path)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_dump_loop, name='metrics-dumper', daemon=True)
+    thread.start()
+    return thread
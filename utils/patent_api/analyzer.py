@@ -1,5 +1,6 @@
 import re
 import json
+import hashlib
 import nltk
 from nltk.tokenize import sent_tokenize, word_tokenize
 from nltk.corpus import stopwords
@@ -9,6 +10,138 @@ from collections import Counter
 import string
 import math
 import random
+import itertools
+
+from utils import metrics
+from utils import profiling
+from config import (
+    ANALYZER_TOKENIZER, SEO_WEIGHTS_FILE, ANALYZER_CHUNK_CHARS, ANALYZER_CHUNK_OVERLAP,
+    ANALYZER_MAX_TERMS
+)
+
+TOKENIZERS = ('nltk', 'regex')
+
+# Approximates Treebank tokens: words with inner hyphens or periods ("e-mail",
+# "1.5"), split contractions ("is" "n't"), clitics ("'s") and single
+# punctuation characters
+_TOKEN_PATTERN = re.compile(r"\w+(?=n't\b)|n't\b|\w+(?:[-.]\w+)*|'\w+|[^\w\s]")
+
+TECHNICAL_TERMS = ['algorithm', 'system', 'method', 'apparatus', 'process',
+                   'technique', 'device', 'mechanism', 'framework', 'architecture']
+
+# Simple regex patterns for different entity types
+_ORG_PATTERN = re.compile(r'(?:[A-Z][a-z]+ )+(?:Inc|LLC|Corporation|Corp|Company|Co|Ltd)')
+_TECH_PATTERN = re.compile(r'(?:algorithm|system|method|engine|model|framework|platform|technology|database|network|interface|API)', re.IGNORECASE)
+_APP_PATTERN = re.compile(r'(?:search engine|recommender system|information retrieval|content analysis|user tracking|web crawler|indexing system)', re.IGNORECASE)
+
+
+def _chunk_cut(text, start, end):
+    """Where to end a chunk of text[start:end]: after whitespace followed by text"""
+    # Prefer a line break in the second half of the chunk
+    low = start + (end - start) // 2
+    cut = text.rfind('\n', low, end)
+    while cut >= low:
+        if not text[cut + 1].isspace():
+            return cut + 1
+        cut = text.rfind('\n', low, cut)
+    for cut in range(end - 1, start, -1):
+        if text[cut].isspace() and not text[cut + 1].isspace():
+            return cut + 1
+    # No whitespace at all; split the word
+    return end
+
+
+def iter_text_chunks(parts, chunk_chars=ANALYZER_CHUNK_CHARS, overlap_chars=ANALYZER_CHUNK_OVERLAP):
+    """
+    Regroup a stream of text pieces into overlapping chunks.
+    
+    Chunks end where whitespace is followed by text (at a line break where
+    possible), so words and runs of blank lines are never split. Each chunk
+    starts with the last overlap_chars characters of the previous one.
+    
+    Args:
+        parts (iterable): Strings of any size, e.g. from db_manager.iter_patent_text
+        chunk_chars (int): Approximate size of the new text in each chunk
+        overlap_chars (int): Characters repeated from the previous chunk
+        
+    Yields:
+        tuple: (text, overlap), where text[:overlap] repeats the previous chunk
+    """
+    buffer = ''
+    position = 0
+    tail = ''
+    for part in parts:
+        buffer = buffer[position:] + part
+        position = 0
+        while len(buffer) - position > chunk_chars:
+            cut = _chunk_cut(buffer, position, position + chunk_chars)
+            chunk = buffer[position:cut]
+            position = cut
+            yield tail + chunk, len(tail)
+            tail = chunk[-overlap_chars:] if overlap_chars else ''
+    yield tail + buffer[position:], len(tail)
+
+
+def seo_impact(overall_score):
+    """Map an overall relevance score to the High/Medium/Low label"""
+    if overall_score >= 60:
+        return 'High'
+    if overall_score >= 30:
+        return 'Medium'
+    return 'Low'
+
+
+def _prune(counts, limit=ANALYZER_MAX_TERMS):
+    """Keep a streaming counter's memory bounded by dropping its rarest terms"""
+    if len(counts) <= limit:
+        return counts
+    return Counter(dict(counts.most_common(limit // 2)))
+
+
+class TextStats:
+    """
+    Full text statistics used by the innovation score, accumulated chunk by
+    chunk so the full text never has to be held in memory.
+    
+    Attributes:
+        length (int): Characters in the full text
+        technical_count (int): Occurrences of TECHNICAL_TERMS
+        num_claims (int): Paragraph breaks in the claims section, or None
+            if there is no 'CLAIMS:' section
+    """
+    
+    def __init__(self):
+        self.length = 0
+        self.technical_count = 0
+        self.num_claims = None
+        self._claims_done = False
+    
+    def update(self, chunk):
+        """Add a chunk of the full text (chunks must not split words or blank lines)"""
+        self.length += len(chunk)
+        lowered = chunk.lower()
+        self.technical_count += sum(lowered.count(term) for term in TECHNICAL_TERMS)
+        
+        if self._claims_done:
+            return
+        if self.num_claims is None:
+            start = chunk.find('CLAIMS:')
+            if start < 0:
+                return
+            self.num_claims = 0
+            chunk = chunk[start + len('CLAIMS:'):]
+        # The claims section ends at a second 'CLAIMS:' marker, if any
+        end = chunk.find('CLAIMS:')
+        if end >= 0:
+            chunk = chunk[:end]
+            self._claims_done = True
+        self.num_claims += chunk.count('\n\n')
+    
+    def track(self, parts):
+        """Pass full text pieces through, updating the statistics on the way"""
+        for chunk, _ in iter_text_chunks(parts, overlap_chars=0):
+            self.update(chunk)
+            yield chunk
 
 # Download necessary NLTK resources on first import
 try:
@@ -31,7 +164,14 @@ class PatentAnalyzer:
     A utility class for analyzing patents and extracting SEO-relevant information.
     """
     
-    def __init__(self):
+    def __init__(self, tokenizer=None):
+        """
+        Args:
+            tokenizer (str): 'nltk' or 'regex' (defaults to ANALYZER_TOKENIZER)
+        """
+        self.tokenizer = tokenizer or ANALYZER_TOKENIZER
+        if self.tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer '{self.tokenizer}'")
         self.stop_words = set(stopwords.words('english'))
         self.lemmatizer = WordNetLemmatizer()
         
@@ -66,7 +206,70 @@ class PatentAnalyzer:
             "click through": 8,
             "bounce rate": 7
         }
+        
+        # Terms scored per relevance category (terms missing from
+        # seo_keywords count towards the maximum with weight 5)
+        self.seo_categories = {
+            'search_algorithms': ['algorithm', 'ranking', 'relevance', 'search engine'],
+            'content_analysis': ['content', 'semantic', 'natural language', 'text'],
+            'user_behavior': ['user experience', 'click through', 'bounce rate', 'behavior'],
+            'technical_seo': ['crawling', 'indexing', 'metadata', 'link'],
+            'ml_ai': ['machine learning', 'artificial intelligence', 'neural network', 'model']
+        }
+        
+        if SEO_WEIGHTS_FILE:
+            self.load_seo_weights(SEO_WEIGHTS_FILE)
+    
+    def load_seo_weights(self, path):
+        """
+        Replace the SEO keyword weights and/or category map from a JSON file.
+        
+        Args:
+            path (str): JSON file with "seo_keywords" ({term: weight}) and/or
+                "seo_categories" ({category: [terms]})
+            
+        Returns:
+            bool: Whether the file was loaded
+        """
+        try:
+            with open(path, 'r') as f:
+                weights = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading SEO weights from {path}: {e}")
+            return False
+        
+        if 'seo_keywords' in weights:
+            self.seo_keywords = {term.lower(): weight for term, weight in weights['seo_keywords'].items()}
+        if 'seo_categories' in weights:
+            self.seo_categories = {category: list(terms) for category, terms in weights['seo_categories'].items()}
+        return True
+    
+    def config_version(self):
+        """
+        Short hash of the settings that change analysis results: the
+        tokenizer backend, SEO keyword weights and categories.
+        
+        Returns:
+            str: 12 hex digits
+        """
+        config = json.dumps([self.tokenizer, self.seo_keywords, self.seo_categories], sort_keys=True)
+        return hashlib.sha1(config.encode('utf-8')).hexdigest()[:12]
     
+    def word_tokenize(self, text):
+        """
+        Split text into word and punctuation tokens with the configured backend.
+        
+        Args:
+            text (str): The text to tokenize
+            
+        Returns:
+            list: Tokens in text order
+        """
+        if self.tokenizer == 'regex':
+            return _TOKEN_PATTERN.findall(text)
+        return word_tokenize(text)
+    
+    @profiling.traced('analyzer.preprocess_text')
     def preprocess_text(self, text):
         """
         Preprocess text for analysis:
@@ -85,7 +288,7 @@ class PatentAnalyzer:
             return []
         
         # Tokenize
-        tokens = word_tokenize(text.lower())
+        tokens = self.word_tokenize(text.lower())
         
         # Remove punctuation and stopwords, then lemmatize
         tokens = [
@@ -96,6 +299,23 @@ class PatentAnalyzer:
         
         return tokens
     
+    def tokenize(self, text):
+        """
+        Tokenize text for the token store (utils/patent_api/token_store.py).
+        
+        Tokens keep their case so entity patterns still work on stored
+        tokens; filtering and lemmatization happen per vocabulary entry.
+        
+        Args:
+            text (str): The text to tokenize
+            
+        Returns:
+            list: Tokens in text order
+        """
+        if not text:
+            return []
+        return self.word_tokenize(text)
+    
     def extract_keywords(self, text, top_n=50):
         """
         Extract the most important keywords from text.
@@ -119,6 +339,7 @@ class PatentAnalyzer:
         # Return top N keywords
         return keyword_counts.most_common(top_n)
     
+    @profiling.traced('analyzer.extract_keyphrases')
     def extract_keyphrases(self, text, top_n=30, ngram_range=(2, 3)):
         """
         Extract the most important keyphrases from text.
@@ -135,7 +356,7 @@ class PatentAnalyzer:
             return []
         
         # Tokenize without removing stopwords
-        tokens = word_tokenize(text.lower())
+        tokens = self.word_tokenize(text.lower())
         
         # Remove punctuation only
         tokens = [
@@ -174,27 +395,24 @@ class PatentAnalyzer:
                 'applications': []
             }
         
-        # Simple regex patterns for different entity types
-        org_pattern = r'(?:[A-Z][a-z]+ )+(?:Inc|LLC|Corporation|Corp|Company|Co|Ltd)'
-        tech_pattern = r'(?:algorithm|system|method|engine|model|framework|platform|technology|database|network|interface|API)'
-        app_pattern = r'(?:search engine|recommender system|information retrieval|content analysis|user tracking|web crawler|indexing system)'
-        
-        # Find matches
-        orgs = re.findall(org_pattern, text)
-        techs = re.findall(tech_pattern, text, re.IGNORECASE)
-        apps = re.findall(app_pattern, text, re.IGNORECASE)
-        
-        # Count frequencies
-        org_counts = Counter(orgs)
-        tech_counts = Counter([tech.lower() for tech in techs])
-        app_counts = Counter([app.lower() for app in apps])
-        
+        return self._top_entities(self._count_entities(text), top_n)
+    
+    def _count_entities(self, text, overlap=0):
+        """Count entity matches in text, skipping those within the first overlap characters"""
+        org_counts = Counter(m.group() for m in _ORG_PATTERN.finditer(text) if m.end() > overlap)
+        tech_counts = Counter(m.group().lower() for m in _TECH_PATTERN.finditer(text) if m.end() > overlap)
+        app_counts = Counter(m.group().lower() for m in _APP_PATTERN.finditer(text) if m.end() > overlap)
+        return org_counts, tech_counts, app_counts
+    
+    def _top_entities(self, counts, top_n):
+        org_counts, tech_counts, app_counts = counts
         return {
             'organizations': org_counts.most_common(top_n),
             'technologies': tech_counts.most_common(top_n),
             'applications': app_counts.most_common(top_n)
         }
     
+    @profiling.traced('analyzer.calculate_seo_relevance')
     def calculate_seo_relevance(self, text):
         """
         Calculate the SEO relevance of a patent.
@@ -212,36 +430,38 @@ class PatentAnalyzer:
                 'relevance_by_category': {}
             }
         
-        # Preprocess
-        tokens = self.preprocess_text(text)
+        return self._score_seo_relevance(self._count_seo_keywords(text))
+    
+    def _count_seo_keywords(self, text, overlap=0):
+        """Count SEO keywords in text, skipping those within the first overlap characters"""
         text_lower = text.lower()
-        
-        # Count SEO keywords
+        overlap_lower = text[:overlap].lower()
         seo_keyword_counts = {}
-        total_relevance_score = 0
-        
-        for keyword, weight in self.seo_keywords.items():
-            count = text_lower.count(keyword)
+        for keyword in self.seo_keywords:
+            count = text_lower.count(keyword) - overlap_lower.count(keyword)
             if count > 0:
                 seo_keyword_counts[keyword] = count
-                total_relevance_score += count * weight
+        return seo_keyword_counts
+    
+    def _score_seo_relevance(self, seo_keyword_counts):
+        """Turn SEO keyword counts into the calculate_seo_relevance result"""
+        # In seo_keywords order, which breaks ties when sorting
+        seo_keyword_counts = {
+            keyword: seo_keyword_counts[keyword] for keyword in self.seo_keywords
+            if seo_keyword_counts.get(keyword)
+        }
+        total_relevance_score = sum(
+            count * self.seo_keywords[keyword] for keyword, count in seo_keyword_counts.items()
+        )
         
         # Calculate overall relevance score (0-100)
         max_possible_score = sum(weight * 10 for weight in self.seo_keywords.values())
         overall_score = min(100, int((total_relevance_score / max_possible_score) * 100))
         
         # Categorize relevance
-        categories = {
-            'search_algorithms': ['algorithm', 'ranking', 'relevance', 'search engine'],
-            'content_analysis': ['content', 'semantic', 'natural language', 'text'],
-            'user_behavior': ['user experience', 'click through', 'bounce rate', 'behavior'],
-            'technical_seo': ['crawling', 'indexing', 'metadata', 'link'],
-            'ml_ai': ['machine learning', 'artificial intelligence', 'neural network', 'model']
-        }
-        
         relevance_by_category = {}
         
-        for category, terms in categories.items():
+        for category, terms in self.seo_categories.items():
             category_score = 0
             for term in terms:
                 if term in seo_keyword_counts:
@@ -266,12 +486,14 @@ class PatentAnalyzer:
             'relevance_by_category': relevance_by_category
         }
     
-    def calculate_innovation_score(self, patent_data):
+    def calculate_innovation_score(self, patent_data, text_stats=None):
         """
         Calculate an innovation score for the patent.
         
         Args:
             patent_data (dict): Patent data
+            text_stats (TextStats): Statistics of the full text, if it was
+                streamed (by default computed from patent_data['full_text'])
             
         Returns:
             int: Innovation score (0-100)
@@ -282,10 +504,13 @@ class PatentAnalyzer:
         # Initialize with a baseline score
         score = 50
         
+        if text_stats is None:
+            text_stats = TextStats()
+            text_stats.update(patent_data.get('full_text') or '')
+        
         # Factor 1: Length and detail of the patent
-        full_text = patent_data.get('full_text', '')
-        if full_text:
-            text_length = len(full_text)
+        if text_stats.length:
+            text_length = text_stats.length
             # Longer patents might indicate more detailed innovation
             if text_length > 20000:
                 score += 10
@@ -295,9 +520,7 @@ class PatentAnalyzer:
                 score -= 5
         
         # Factor 2: Technical complexity (basic approximation)
-        technical_terms = ['algorithm', 'system', 'method', 'apparatus', 'process', 
-                          'technique', 'device', 'mechanism', 'framework', 'architecture']
-        technical_count = sum(full_text.lower().count(term) for term in technical_terms)
+        technical_count = text_stats.technical_count
         
         if technical_count > 100:
             score += 15
@@ -307,9 +530,8 @@ class PatentAnalyzer:
             score += 5
         
         # Factor 3: Presence of claims
-        if 'CLAIMS:' in full_text:
-            claims_section = full_text.split('CLAIMS:')[1]
-            num_claims = claims_section.count('\n\n')
+        if text_stats.num_claims is not None:
+            num_claims = text_stats.num_claims
             
             if num_claims > 15:
                 score += 10
@@ -336,9 +558,20 @@ class PatentAnalyzer:
                 # If year extraction fails, don't adjust the score
                 pass
         
+        # Factor 5: Citation influence (precomputed by utils/patent_api/citations.py)
+        influence_percentile = patent_data.get('influence_percentile')
+        if influence_percentile is not None:
+            if influence_percentile >= 0.9:
+                score += 15
+            elif influence_percentile >= 0.75:
+                score += 10
+            elif influence_percentile >= 0.5:
+                score += 5
+        
         # Ensure score is in range 0-100
         return max(0, min(100, score))
     
+    @profiling.traced('analyzer.analyze_patent')
     def analyze_patent(self, patent_data):
         """
         Perform a comprehensive analysis of a patent.
@@ -354,23 +587,32 @@ class PatentAnalyzer:
         abstract = patent_data.get('abstract', '')
         full_text = patent_data.get('full_text', '')
         
+        # Very long specifications are analyzed in chunks to bound memory
+        if full_text and len(full_text) > ANALYZER_CHUNK_CHARS:
+            return self.analyze_stream(patent_data)
+        
         # Combine text for analysis
         combined_text = f"{title}\n\n{abstract}\n\n{full_text}"
         
         # Extract keywords
-        keywords = self.extract_keywords(combined_text)
+        with metrics.phase('analysis', 'extract_keywords'):
+            keywords = self.extract_keywords(combined_text)
         
         # Extract keyphrases
-        keyphrases = self.extract_keyphrases(combined_text)
+        with metrics.phase('analysis', 'extract_keyphrases'):
+            keyphrases = self.extract_keyphrases(combined_text)
         
         # Extract entities
-        entities = self.extract_entities(combined_text)
+        with metrics.phase('analysis', 'extract_entities'):
+            entities = self.extract_entities(combined_text)
         
         # Calculate SEO relevance
-        seo_relevance = self.calculate_seo_relevance(combined_text)
+        with metrics.phase('analysis', 'calculate_seo_relevance'):
+            seo_relevance = self.calculate_seo_relevance(combined_text)
         
         # Calculate innovation score
-        innovation_score = self.calculate_innovation_score(patent_data)
+        with metrics.phase('analysis', 'calculate_innovation_score'):
+            innovation_score = self.calculate_innovation_score(patent_data)
         
         # Return analysis
         return {
@@ -381,6 +623,149 @@ class PatentAnalyzer:
             'innovation_score': innovation_score
         }
     
+    @profiling.traced('analyzer.analyze_stream')
+    def analyze_stream(self, patent_data, full_text_parts=None, ngram_range=(2, 3)):
+        """
+        Analyze a patent whose full text arrives in pieces, with bounded memory.
+        
+        The combined text is processed in overlapping chunks (see
+        iter_text_chunks) and the per-chunk counts are merged as they are
+        produced. N-grams and patterns spanning chunk boundaries are counted
+        once. Only the ANALYZER_MAX_TERMS most frequent keywords and
+        keyphrases are tracked, so peak memory doesn't grow with the text.
+        
+        Args:
+            patent_data (dict): Patent data; full_text is used unless
+                full_text_parts is given
+            full_text_parts (iterable): Pieces of the full text, e.g.
+                db_manager.iter_patent_text(patent_id)
+            ngram_range (tuple): Range of n-gram sizes for keyphrases
+            
+        Returns:
+            dict: Analysis results, as returned by analyze_patent
+        """
+        if full_text_parts is None:
+            full_text_parts = (patent_data.get('full_text') or '',)
+        
+        text_stats = TextStats()
+        parts = itertools.chain(
+            (f"{patent_data.get('title') or ''}\n\n{patent_data.get('abstract') or ''}\n\n",),
+            text_stats.track(full_text_parts)
+        )
+        
+        keyword_counts = Counter()
+        phrase_counts = Counter()
+        entity_counts = (Counter(), Counter(), Counter())
+        seo_keyword_counts = Counter()
+        # Last tokens of the previous chunk, to complete n-grams across the boundary
+        phrase_tail = []
+        
+        for text, overlap in iter_text_chunks(parts):
+            new_text = text[overlap:]
+            
+            with metrics.phase('analysis', 'extract_keywords'):
+                keyword_counts.update(self.preprocess_text(new_text))
+                keyword_counts = _prune(keyword_counts)
+            
+            with metrics.phase('analysis', 'extract_keyphrases'):
+                tokens = phrase_tail + [
+                    token for token in self.word_tokenize(new_text.lower())
+                    if token not in string.punctuation and len(token) > 2
+                ]
+                for n in range(ngram_range[0], ngram_range[1] + 1):
+                    # N-grams entirely within the tail were counted with the previous chunk
+                    skip = max(0, len(phrase_tail) - n + 1)
+                    phrase_counts.update(
+                        ' '.join(gram) for gram in itertools.islice(ngrams(tokens, n), skip, None)
+                    )
+                phrase_counts = _prune(phrase_counts)
+                phrase_tail = tokens[-(ngram_range[1] - 1):] if ngram_range[1] > 1 else []
+            
+            with metrics.phase('analysis', 'extract_entities'):
+                for total, counts in zip(entity_counts, self._count_entities(text, overlap)):
+                    total.update(counts)
+            
+            with metrics.phase('analysis', 'calculate_seo_relevance'):
+                seo_keyword_counts.update(self._count_seo_keywords(text, overlap))
+        
+        with metrics.phase('analysis', 'calculate_innovation_score'):
+            innovation_score = self.calculate_innovation_score(patent_data, text_stats)
+        
+        return {
+            'keywords': keyword_counts.most_common(50),
+            'keyphrases': phrase_counts.most_common(30),
+            'entities': self._top_entities(entity_counts, 15),
+            'seo_relevance': self._score_seo_relevance(seo_keyword_counts),
+            'innovation_score': innovation_score
+        }
+    
+    @profiling.traced('analyzer.analyze_tokens')
+    def analyze_tokens(self, token_ids, vocabulary, patent_data=None, ngram_range=(2, 3)):
+        """
+        Analyze a patent from its stored token IDs instead of its raw text.
+        
+        Produces the same structure as analyze_patent without running the
+        NLTK tokenizer or lemmatizer: stopword filtering and lemmas come from
+        the vocabulary, so changed stopwords, SEO weights or n-gram ranges
+        can be applied to the whole corpus from the token store.
+        
+        Args:
+            token_ids (list): Token IDs of the patent's combined text
+            vocabulary (TokenVocabulary): Maps IDs to tokens and lemmas
+            patent_data (dict): Patent data for the innovation score
+            ngram_range (tuple): Range of n-gram sizes for keyphrases
+            
+        Returns:
+            dict: Analysis results
+        """
+        token_ids = [int(token_id) for token_id in token_ids]
+        vocabulary.ensure(max(token_ids, default=0))
+        
+        # Per distinct token: its keyword lemma (None if filtered out) and
+        # whether it can appear in a keyphrase
+        keyword_lemmas = {}
+        phrase_tokens = {}
+        for token_id in set(token_ids):
+            token = vocabulary.lowered[token_id]
+            usable = token not in string.punctuation and len(token) > 2
+            phrase_tokens[token_id] = token if usable else None
+            keyword_lemmas[token_id] = (
+                vocabulary.lemmas[token_id] if usable and token not in self.stop_words else None
+            )
+        
+        with metrics.phase('analysis', 'extract_keywords'):
+            keyword_counts = Counter(
+                keyword_lemmas[token_id] for token_id in token_ids if keyword_lemmas[token_id] is not None
+            )
+            keywords = keyword_counts.most_common(50)
+        
+        with metrics.phase('analysis', 'extract_keyphrases'):
+            tokens = [phrase_tokens[token_id] for token_id in token_ids if phrase_tokens[token_id] is not None]
+            all_ngrams = []
+            for n in range(ngram_range[0], ngram_range[1] + 1):
+                all_ngrams.extend([' '.join(gram) for gram in ngrams(tokens, n)])
+            keyphrases = Counter(all_ngrams).most_common(30)
+        
+        # Keyword and entity patterns match against the tokens joined by spaces
+        text = ' '.join(vocabulary.tokens[token_id] for token_id in token_ids)
+        
+        with metrics.phase('analysis', 'extract_entities'):
+            entities = self.extract_entities(text)
+        
+        with metrics.phase('analysis', 'calculate_seo_relevance'):
+            seo_relevance = self.calculate_seo_relevance(text)
+        
+        with metrics.phase('analysis', 'calculate_innovation_score'):
+            innovation_score = self.calculate_innovation_score(patent_data or {})
+        
+        return {
+            'keywords': keywords,
+            'keyphrases': keyphrases,
+            'entities': entities,
+            'seo_relevance': seo_relevance,
+            'innovation_score': innovation_score
+        }
+    
     def generate_recommendations(self, analysis):
         """
         Generate SEO recommendations based on patent analysis.
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Citation Graph
+--------------
+Persistent store of patent citation edges, a bounded-concurrency crawler that
+fills it from Google Patents, and a CSR graph used to compute PageRank-style
+influence scores with NumPy. Scores are stored per patent so analysis never
+needs a live citation scrape.
+"""
+
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from database.db_manager import get_db
+from config import CITATION_CRAWL_WORKERS, CITATION_RECRAWL_DAYS, PAGERANK_DAMPING
+
+
+def _now(offset_days=0):
+    moment = datetime.datetime.now() + datetime.timedelta(days=offset_days)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def save_citations(conn, patent_id, citations, direction):
+    """Store scraped citations as directed citing -> cited edges.
+
+    Args:
+        conn (sqlite3.Connection): Open connection (caller commits)
+        patent_id (str): The patent whose citation tab was scraped
+        citations (list): Dicts from GooglePatentsAPI.get_patent_citations
+        direction (str): 'forward' (patents citing this one) or 'backward'
+    """
+    fetched_at = _now()
+    if direction == 'forward':
+        edges = [(c['patent_id'], patent_id, fetched_at) for c in citations]
+    else:
+        edges = [(patent_id, c['patent_id'], fetched_at) for c in citations]
+
+    conn.executemany(
+        '''INSERT OR REPLACE INTO patent_citations (citing_patent_id, cited_patent_id, fetched_at)
+           VALUES (?, ?, ?)''',
+        edges
+    )
+    conn.execute(
+        '''INSERT OR REPLACE INTO citation_crawls (patent_id, direction, status, citation_count, crawled_at)
+           VALUES (?, ?, 'ok', ?, ?)''',
+        (patent_id, direction, len(edges), fetched_at)
+    )
+
+
+def _patents_to_crawl(conn, patent_ids, directions, recrawl_days):
+    """List (patent_id, direction) pairs not crawled within recrawl_days"""
+    if patent_ids is None:
+        patent_ids = [row['patent_id'] for row in conn.execute('SELECT patent_id FROM patents')]
+    cutoff = _now(-recrawl_days)
+    fresh = {
+        (row['patent_id'], row['direction'])
+        for row in conn.execute(
+            "SELECT patent_id, direction FROM citation_crawls WHERE status = 'ok' AND crawled_at >= ?",
+            (cutoff,)
+        )
+    }
+    return [
+        (patent_id, direction)
+        for patent_id in patent_ids
+        for direction in directions
+        if (patent_id, direction) not in fresh
+    ]
+
+
+def crawl_citations(patent_ids=None, max_workers=None, directions=('backward', 'forward'),
+                    recrawl_days=None, max_results=100, progress_callback=None):
+    """Fetch citations for many patents with bounded concurrency.
+
+    Fetches run on a thread pool (each thread with its own GooglePatentsAPI
+    session); results are written by the calling thread only, committing
+    after every patent so an interrupted crawl keeps its progress.
+
+    Args:
+        patent_ids (list): Patents to crawl (defaults to every stored patent)
+        max_workers (int): Concurrent fetches (defaults to CITATION_CRAWL_WORKERS)
+        directions (tuple): 'backward' and/or 'forward'
+        recrawl_days (int): Skip pairs crawled more recently than this
+        max_results (int): Maximum citations per patent and direction
+        progress_callback (callable): Called as callback(fraction, message)
+
+    Returns:
+        dict: Counts of crawled pairs, stored edges and failures
+    """
+    from utils.patent_api.google_patents import GooglePatentsAPI
+
+    max_workers = max_workers or CITATION_CRAWL_WORKERS
+    recrawl_days = CITATION_RECRAWL_DAYS if recrawl_days is None else recrawl_days
+
+    conn = get_db()
+    work = _patents_to_crawl(conn, patent_ids, directions, recrawl_days)
+    summary = {'pairs': len(work), 'edges': 0, 'failed': 0}
+    if not work:
+        conn.close()
+        return summary
+
+    local = threading.local()
+
+    def fetch(patent_id, direction):
+        if not hasattr(local, 'api'):
+            local.api = GooglePatentsAPI()
+        return local.api.get_patent_citations(patent_id, direction=direction, max_results=max_results)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, patent_id, direction): (patent_id, direction)
+                   for patent_id, direction in work}
+        for done, future in enumerate(as_completed(futures), start=1):
+            patent_id, direction = futures[future]
+            try:
+                citations = future.result()
+            except Exception as e:
+                print(f"Error crawling {direction} citations for {patent_id}: {e}")
+                citations = None
+
+            # get_patent_citations returns None when the fetch failed; the
+            # error status keeps the pair eligible for the next crawl
+            if citations is None:
+                summary['failed'] += 1
+                conn.execute(
+                    '''INSERT OR REPLACE INTO citation_crawls (patent_id, direction, status, crawled_at)
+                       VALUES (?, ?, 'error', ?)''',
+                    (patent_id, direction, _now())
+                )
+            else:
+                save_citations(conn, patent_id, citations, direction)
+                summary['edges'] += len(citations)
+            conn.commit()
+
+            if progress_callback:
+                progress_callback(done / len(work), f"Crawled {direction} citations for {patent_id}")
+
+    conn.close()
+    return summary
+
+
+class CitationGraph:
+    """Directed citation graph in compressed sparse row form.
+
+    Attributes:
+        node_ids (list): Patent ID of each node index
+        index (dict): Patent ID -> node index
+        indptr (numpy.ndarray): Row pointers; out-edges of node i are
+            indices[indptr[i]:indptr[i + 1]]
+        indices (numpy.ndarray): Cited node index of each edge
+    """
+
+    def __init__(self, node_ids, indptr, indices):
+        self.node_ids = node_ids
+        self.index = {patent_id: i for i, patent_id in enumerate(node_ids)}
+        self.indptr = indptr
+        self.indices = indices
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return int(self.indices.size)
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Build a graph from (citing, cited) patent ID pairs"""
+        node_ids = []
+        index = {}
+        sources = []
+        targets = []
+        for citing, cited in edges:
+            for patent_id in (citing, cited):
+                if patent_id not in index:
+                    index[patent_id] = len(node_ids)
+                    node_ids.append(patent_id)
+            sources.append(index[citing])
+            targets.append(index[cited])
+
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(node_ids))
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(node_ids, indptr, targets[order].astype(np.int32))
+
+    @classmethod
+    def load(cls):
+        """Load the stored citation edges into a graph"""
+        conn = get_db()
+        edges = conn.execute(
+            'SELECT citing_patent_id, cited_patent_id FROM patent_citations'
+        ).fetchall()
+        conn.close()
+        return cls.from_edges((row[0], row[1]) for row in edges)
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def in_degree(self):
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def cites(self, patent_id):
+        """Patent IDs cited by a patent"""
+        i = self.index.get(patent_id)
+        if i is None:
+            return []
+        return [self.node_ids[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def pagerank(self, damping=PAGERANK_DAMPING, tol=1e-8, max_iter=100, initial=None):
+        """Compute PageRank by power iteration.
+
+        Args:
+            damping (float): Damping factor
+            tol (float): L1 convergence tolerance
+            max_iter (int): Maximum iterations
+            initial (dict): Previous scores by patent ID; warm-starting from
+                them makes recomputation after a small crawl converge quickly
+
+        Returns:
+            tuple: (scores array, iterations used)
+        """
+        n = self.num_nodes
+        if n == 0:
+            return np.zeros(0), 0
+
+        if initial:
+            scores = np.array([initial.get(patent_id, 1.0 / n) for patent_id in self.node_ids])
+            scores /= scores.sum()
+        else:
+            scores = np.full(n, 1.0 / n)
+
+        out_degree = self.out_degree().astype(np.float64)
+        dangling = out_degree == 0
+        safe_degree = np.where(dangling, 1.0, out_degree)
+        # Source node of every edge, aligned with self.indices
+        sources = np.repeat(np.arange(n), self.out_degree())
+
+        for iteration in range(1, max_iter + 1):
+            contributions = (scores / safe_degree)[sources]
+            incoming = np.bincount(self.indices, weights=contributions, minlength=n)
+            dangling_mass = scores[dangling].sum()
+            updated = (1.0 - damping) / n + damping * (incoming + dangling_mass / n)
+            delta = np.abs(updated - scores).sum()
+            scores = updated
+            if delta < tol:
+                break
+
+        return scores, iteration
+
+
+def compute_influence_scores(damping=PAGERANK_DAMPING, tol=1e-8, max_iter=100):
+    """Recompute and store PageRank influence scores for the citation graph.
+
+    Returns:
+        dict: Node, edge and iteration counts
+    """
+    graph = CitationGraph.load()
+    conn = get_db()
+    previous = {
+        row['patent_id']: row['pagerank']
+        for row in conn.execute('SELECT patent_id, pagerank FROM patent_influence')
+    }
+
+    scores, iterations = graph.pagerank(damping, tol, max_iter, initial=previous)
+    if graph.num_nodes:
+        # Percentile rank in [0, 1]; ties share the lowest rank
+        ranks = np.searchsorted(np.sort(scores), scores, side='left')
+        percentiles = ranks / max(1, graph.num_nodes - 1)
+        in_degree = graph.in_degree()
+        out_degree = graph.out_degree()
+        computed_at = _now()
+        conn.execute('DELETE FROM patent_influence')
+        conn.executemany(
+            '''INSERT INTO patent_influence
+               (patent_id, pagerank, percentile, in_degree, out_degree, computed_at)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            [
+                (patent_id, float(scores[i]), float(percentiles[i]),
+                 int(in_degree[i]), int(out_degree[i]), computed_at)
+                for i, patent_id in enumerate(graph.node_ids)
+            ]
+        )
+        conn.commit()
+    conn.close()
+
+    return {'nodes': graph.num_nodes, 'edges': graph.num_edges, 'iterations': iterations}
+
+
+def get_influence(patent_id):
+    """Get the stored influence score of a patent.
+
+    Returns:
+        dict: influence_score (PageRank), influence_percentile, citation counts;
+            empty if the patent isn't in the citation graph
+    """
+    conn = get_db()
+    row = conn.execute(
+        'SELECT pagerank, percentile, in_degree, out_degree FROM patent_influence WHERE patent_id = ?',
+        (patent_id,)
+    ).fetchone()
+    conn.close()
+    if not row:
+        return {}
+    return {
+        'influence_score': row['pagerank'],
+        'influence_percentile': row['percentile'],
+        'forward_citations': row['in_degree'],
+        'backward_citations': row['out_degree'],
+    }
@@ -5,12 +5,15 @@ Patent Data Fetcher
 Module for fetching patent data from external sources like Google Patents.
 """
 
-import re
 import json
 import requests
 from bs4 import BeautifulSoup
 import urllib.parse
 
+from utils import metrics
+from utils import singleflight
+from utils.patent_api.patent_ids import canonicalize, parse_patent_id
+
 class PatentFetcher:
     """Class for fetching patent data from various sources."""
     
@@ -32,41 +35,67 @@ class PatentFetcher:
         Returns:
             dict: Patent data including title, abstract, claims, etc.
         """
-        # Check cache first if enabled
-        if self.cache_enabled and patent_id in self.cache:
-            return self.cache[patent_id]
-            
         # Clean and normalize the patent ID
         clean_id = self._normalize_patent_id(patent_id)
         
+        # Every form of the ID (with or without kind code) shares a cache entry
+        number = parse_patent_id(clean_id)
+        cache_key = number.base if number else clean_id
+        
+        # Check cache first if enabled
+        if self.cache_enabled:
+            hit = cache_key in self.cache
+            metrics.record_cache('patent_fetcher', hit)
+            if hit:
+                return self.cache[cache_key]
+        
+        # Concurrent fetches of the same patent share one request
+        patent_data = singleflight.do(singleflight.flight_key('google_patents', cache_key),
+                                      self._fetch_patent_page, clean_id, patent_id)
+        
+        # Cache the result if enabled
+        if self.cache_enabled and 'error' not in patent_data:
+            self.cache[cache_key] = patent_data
+        
+        return patent_data
+    
+    def _fetch_patent_page(self, clean_id, patent_id):
+        """Download and parse a patent's Google Patents page.
+        
+        Args:
+            clean_id (str): Normalized patent ID for the URL
+            patent_id (str): The patent ID as requested
+            
+        Returns:
+            dict: Patent data, or a dict with an 'error' message
+        """
         # Construct Google Patents URL
         url = f"https://patents.google.com/patent/{clean_id}/en"
         
         try:
             # Make request to Google Patents
-            response = requests.get(url, headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            })
+            with metrics.phase('fetch', 'google_patents'):
+                response = requests.get(url, headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+                })
             
             if response.status_code != 200:
+                metrics.record_fetch('patent_fetcher', 'http_error')
                 return {
                     'error': f"Failed to fetch patent data. Status code: {response.status_code}",
                     'patent_id': patent_id
                 }
                 
+            metrics.record_fetch('patent_fetcher', 'ok')
+            
             # Parse the HTML
             soup = BeautifulSoup(response.text, 'html.parser')
             
             # Extract patent information
-            patent_data = self._extract_patent_data(soup, patent_id)
-            
-            # Cache the result if enabled
-            if self.cache_enabled:
-                self.cache[patent_id] = patent_data
-                
-            return patent_data
+            return self._extract_patent_data(soup, patent_id)
             
         except Exception as e:
+            metrics.record_fetch('patent_fetcher', 'error')
             return {
                 'error': f"Error fetching patent data: {str(e)}",
                 'patent_id': patent_id
@@ -81,15 +110,13 @@ class PatentFetcher:
         Returns:
             str: Normalized patent ID
         """
-        # Remove any whitespace
-        patent_id = patent_id.strip()
-        
-        # Add US prefix if missing and looks like a US patent
-        if not patent_id.startswith(('US', 'EP', 'WO', 'CN', 'JP')):
-            if re.match(r'^\d+[A-Z]?\d*$', patent_id):
-                patent_id = 'US' + patent_id
+        # Country prefix, separators, leading zeros and case (see patent_ids.py)
+        canonical = canonicalize(patent_id)
+        if canonical:
+            return canonical
         
-        return patent_id
+        # Not a recognizable patent number; use it as given
+        return patent_id.strip()
     
     def _extract_patent_data(self, soup, patent_id):
         """Extract patent data from the BeautifulSoup object.
@@ -6,6 +6,10 @@ import time
 import random
 from urllib.parse import quote_plus
 
+from utils import metrics
+from utils import singleflight
+from utils.patent_api.patent_ids import canonicalize
+
 class GooglePatentsAPI:
     """
     A utility class for interacting with Google Patents.
@@ -25,6 +29,30 @@ class GooglePatentsAPI:
             'Upgrade-Insecure-Requests': '1',
         })
     
+    def _get(self, operation, url, **kwargs):
+        """
+        Make a GET request through the session, recording fetch metrics.
+        
+        Args:
+            operation (str): Name of the calling operation, for metrics
+            url (str): The URL to fetch
+            
+        Returns:
+            requests.Response: The response (raises for HTTP errors)
+        """
+        try:
+            with metrics.phase('fetch', operation):
+                response = self.session.get(url, **kwargs)
+            response.raise_for_status()
+        except requests.HTTPError:
+            metrics.record_fetch('google_patents', 'http_error')
+            raise
+        except Exception:
+            metrics.record_fetch('google_patents', 'error')
+            raise
+        metrics.record_fetch('google_patents', 'ok')
+        return response
+    
     def search_patents(self, query, num_results=10, language="en", sort="relevance"):
         """
         Search for patents based on a query string.
@@ -38,6 +66,12 @@ class GooglePatentsAPI:
         Returns:
             list: A list of patent metadata dictionaries
         """
+        # Identical concurrent searches share one request
+        key = singleflight.flight_key('patent_search', ' '.join(query.lower().split()), num_results, language, sort)
+        return singleflight.do(key, self._search_patents, query, num_results, language, sort)
+    
+    def _search_patents(self, query, num_results, language, sort):
+        """Run a patent search (see search_patents)"""
         # Limit number of results
         num_results = min(num_results, 100)
         
@@ -54,8 +88,7 @@ class GooglePatentsAPI:
         
         try:
             # Make the request
-            response = self.session.get(self.SEARCH_URL, params=params)
-            response.raise_for_status()
+            response = self._get('search_patents', self.SEARCH_URL, params=params)
             
             # Parse the HTML
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -125,12 +158,17 @@ class GooglePatentsAPI:
         Returns:
             dict: A dictionary containing patent details
         """
+        # Concurrent requests for the same patent share one fetch
+        key = singleflight.flight_key('patent_details', canonicalize(patent_id) or patent_id)
+        return singleflight.do(key, self._get_patent_details, patent_id)
+    
+    def _get_patent_details(self, patent_id):
+        """Fetch and parse a patent page (see get_patent_details)"""
         url = f"{self.PATENT_URL}{patent_id}"
         
         try:
             # Make the request
-            response = self.session.get(url)
-            response.raise_for_status()
+            response = self._get('get_patent_details', url)
             
             # Parse the HTML
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -213,15 +251,15 @@ class GooglePatentsAPI:
             max_results (int): Maximum number of citations to return
             
         Returns:
-            list: A list of citation dictionaries
+            list: A list of citation dictionaries, or None if the page
+                couldn't be fetched or parsed
         """
         url = f"{self.PATENT_URL}{patent_id}"
         tab = "citedby" if direction == "forward" else "citations"
         
         try:
             # Make the request to the citations tab
-            response = self.session.get(f"{url}/{tab}")
-            response.raise_for_status()
+            response = self._get('get_patent_citations', f"{url}/{tab}")
             
             # Parse the HTML
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -272,4 +310,4 @@ class GooglePatentsAPI:
             
         except Exception as e:
             print(f"Error getting patent citations for {patent_id}: {str(e)}")
-            return []
+            return None
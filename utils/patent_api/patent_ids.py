@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Patent IDs
+----------
+One canonical key for every form a patent ID arrives in.
+
+``parse_patent_id`` reads IDs like ``US6285999B1``, ``US 6,285,999 B1``,
+``6285999``, ``us-6285999-b1``, Google Patents URLs and US publication
+numbers (``US 2013/0232132 A1``) into country, number and kind code. Its
+``canonical`` form is Google Patents' (``US6285999B1``); ``base`` drops the
+kind code.
+
+Patents are stored under one ID, so ``patent_aliases`` maps every other
+form seen (the base ID, other kind codes, explicitly linked publication
+numbers) to the stored ID. ``resolve_patent_id`` answers from an in-memory
+copy of that table, which is how fetches, caches and database lookups all
+dedupe on the same key.
+"""
+
+import re
+import threading
+from collections import namedtuple
+
+from database.db_manager import get_db
+
+
+# Country, optional US series (reissue, plant, design, SIR, defensive
+# publication), number and kind code, once separators are removed. A bare
+# RE or PP before the digits is the series, not a country code.
+_ID_PATTERN = re.compile(r'^(?:(?!(?:RE|PP)\d)([A-Z]{2}))?(RE|PP|D|H|T)?(\d+)([A-Z]\d?)?$')
+
+# Separators people and pages put inside IDs: "US 6,285,999 B1", "2013/0232132"
+_SEPARATORS = re.compile(r'[\s,./-]')
+
+_index = None
+_lock = threading.Lock()
+
+
+class PatentNumber(namedtuple('PatentNumber', ['country', 'number', 'kind'])):
+    """A parsed patent ID.
+
+    Attributes:
+        country (str): Two-letter office code, e.g. 'US'
+        number (str): Number including any series prefix, e.g. '6285999' or 'D512345'
+        kind (str): Kind code such as 'B1', or '' if unknown
+    """
+
+    __slots__ = ()
+
+    @property
+    def canonical(self):
+        return f"{self.country}{self.number}{self.kind}"
+
+    @property
+    def base(self):
+        return f"{self.country}{self.number}"
+
+    @property
+    def is_publication(self):
+        """US pre-grant publications are numbered <year><7 digits>"""
+        return self.country == 'US' and len(self.number) == 11 and self.number.startswith('20')
+
+    def aliases(self):
+        """Forms of this ID that identify the same stored patent"""
+        return [self.canonical, self.base] if self.kind else [self.base]
+
+
+def parse_patent_id(raw):
+    """Parse a patent ID in any supported form.
+
+    Args:
+        raw (str): Patent ID, number or Google Patents URL
+
+    Returns:
+        PatentNumber: The parsed ID, or None if raw isn't a patent ID
+    """
+    if not raw:
+        return None
+    text = str(raw).strip().upper()
+    if '/PATENT/' in text:
+        text = text.split('/PATENT/', 1)[1].split('/', 1)[0]
+    text = _SEPARATORS.sub('', text)
+
+    match = _ID_PATTERN.match(text)
+    if not match:
+        return None
+    country, series, number, kind = match.groups()
+    country = country or 'US'
+    kind = kind or ''
+
+    if country == 'US' and not series and len(number) >= 10 and number.startswith('20'):
+        # Publication numbers: the serial part is zero-padded to 7 digits
+        number = number[:4] + number[4:].zfill(7)
+    else:
+        number = number.lstrip('0') or '0'
+    return PatentNumber(country, (series or '') + number, kind)
+
+
+def canonicalize(raw):
+    """The canonical form of a patent ID (no database lookup), or None"""
+    number = parse_patent_id(raw)
+    return number.canonical if number else None
+
+
+class PatentIdIndex:
+    """In-memory alias -> stored patent ID lookup backed by patent_aliases.
+
+    Misses are checked against the table, so aliases registered by other
+    processes are picked up on first use.
+    """
+
+    def __init__(self):
+        self.aliases = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read every alias"""
+        conn = get_db()
+        rows = conn.execute('SELECT alias, patent_id FROM patent_aliases').fetchall()
+        conn.close()
+        with self._lock:
+            self.aliases.update((row['alias'], row['patent_id']) for row in rows)
+
+    def resolve(self, raw):
+        """The stored patent ID for raw, or its canonical form if it isn't stored.
+
+        Returns:
+            str: Patent ID, or None if raw isn't a patent ID
+        """
+        number = parse_patent_id(raw)
+        if number is None:
+            return None
+        keys = number.aliases()
+        for key in keys:
+            if key in self.aliases:
+                return self.aliases[key]
+
+        conn = get_db()
+        rows = conn.execute(
+            f"SELECT alias, patent_id FROM patent_aliases WHERE alias IN ({', '.join('?' for _ in keys)})",
+            keys
+        ).fetchall()
+        conn.close()
+        found = {row['alias']: row['patent_id'] for row in rows}
+        with self._lock:
+            self.aliases.update(found)
+        for key in keys:
+            if key in found:
+                return found[key]
+        return number.canonical
+
+    def register(self, patent_id, aliases=(), conn=None):
+        """Record the aliases of a stored patent.
+
+        Args:
+            patent_id (str): The ID the patent is stored under
+            aliases (iterable): Further IDs of the same patent, e.g. its
+                pre-grant publication number
+            conn (sqlite3.Connection): Use the caller's transaction (caller commits)
+        """
+        keys = []
+        for raw in (patent_id, *aliases):
+            number = parse_patent_id(raw)
+            if number is not None:
+                keys.extend(number.aliases())
+
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db()
+        # The stored ID always maps to itself; other forms keep their first patent
+        conn.execute('INSERT OR REPLACE INTO patent_aliases (alias, patent_id) VALUES (?, ?)',
+                     (patent_id, patent_id))
+        conn.executemany('INSERT OR IGNORE INTO patent_aliases (alias, patent_id) VALUES (?, ?)',
+                         [(key, patent_id) for key in keys if key != patent_id])
+        rows = conn.execute(
+            f"SELECT alias, patent_id FROM patent_aliases WHERE alias IN ({', '.join('?' for _ in keys)})",
+            keys
+        ).fetchall() if keys else []
+        if own_conn:
+            conn.commit()
+            conn.close()
+
+        with self._lock:
+            self.aliases[patent_id] = patent_id
+            self.aliases.update((row['alias'], row['patent_id']) for row in rows)
+
+
+def get_index():
+    """The process-wide index, loaded on first use"""
+    global _index
+    with _lock:
+        if _index is None:
+            _index = PatentIdIndex()
+            _index.load()
+    return _index
+
+
+def resolve_patent_id(raw):
+    """The stored ID of a patent in any form, or its canonical form if not stored"""
+    return get_index().resolve(raw)
+
+
+def register_patent_aliases(patent_id, aliases=(), conn=None):
+    """Map further IDs (see PatentIdIndex.register) to a stored patent"""
+    get_index().register(patent_id, aliases, conn)
+
+
+def build_alias_index(batch_size=1000, progress_callback=None):
+    """Register the aliases of every stored patent.
+
+    Returns:
+        int: Number of patents indexed
+    """
+    index = get_index()
+    conn = get_db()
+    total = conn.execute('SELECT COUNT(*) FROM patents').fetchone()[0]
+    done = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, patent_id FROM patents WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        for row in rows:
+            index.register(row['patent_id'], conn=conn)
+        conn.commit()
+        done += len(rows)
+        if progress_callback:
+            progress_callback(done / total, f"Indexed {done} of {total} patent IDs")
+    conn.close()
+    return done
+
+
+def on_patent_saved(patent):
+    """Index the aliases of a newly saved patent"""
+    register_patent_aliases(patent['patent_id'])
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Patent Relevance
+----------------
+Batch matching of a project's crawled pages and Search Console queries to
+the stored patents. Patents are indexed as TF-IDF vectors over the lemmas
+produced by ``PatentAnalyzer.preprocess_text``; the transposed matrix is the
+inverted index (lemma -> postings). Every page and query is scored against
+all patents in one sparse matrix product per block, and the top-k matches
+per target are stored in ``patent_relevance``.
+"""
+
+import datetime
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from database.db_manager import get_db
+from config import RELEVANCE_TOP_K, RELEVANCE_MIN_SCORE, RELEVANCE_BLOCK_SIZE
+
+TARGET_TYPES = ('url', 'query')
+
+
+class PatentIndex:
+    """TF-IDF patent vectors and the inverted index built from them.
+
+    Attributes:
+        patent_ids (list): Patent ID of each matrix row
+        vocabulary (dict): Lemma -> column index
+        idf (numpy.ndarray): Inverse document frequency per lemma
+        matrix (scipy.sparse.csr_matrix): L2-normalized patents x lemmas
+        postings (scipy.sparse.csr_matrix): lemmas x patents (the inverted index)
+    """
+
+    def __init__(self, analyzer=None):
+        if analyzer is None:
+            from utils.patent_api.analyzer import PatentAnalyzer
+            analyzer = PatentAnalyzer()
+        self.analyzer = analyzer
+        self.patent_ids = []
+        self.vocabulary = {}
+        self.idf = np.zeros(0)
+        self.matrix = sparse.csr_matrix((0, 0))
+        self.postings = sparse.csr_matrix((0, 0))
+
+    def build(self, patents):
+        """Index (patent_id, text) pairs.
+
+        Returns:
+            PatentIndex: self
+        """
+        indptr = [0]
+        indices = []
+        counts = []
+        for patent_id, text in patents:
+            term_counts = Counter(self.analyzer.preprocess_text(text))
+            for lemma, count in term_counts.items():
+                indices.append(self.vocabulary.setdefault(lemma, len(self.vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+            self.patent_ids.append(patent_id)
+
+        tf = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(self.patent_ids), len(self.vocabulary))
+        )
+        # Sublinear term frequency so long patents don't dominate
+        tf.data = 1.0 + np.log(tf.data)
+
+        document_frequency = np.bincount(tf.indices, minlength=len(self.vocabulary))
+        self.idf = np.log((1.0 + len(self.patent_ids)) / (1.0 + document_frequency)) + 1.0
+        self.matrix = _l2_normalize(tf @ sparse.diags(self.idf))
+        self.postings = self.matrix.T.tocsr()
+        return self
+
+    def vectorize(self, texts):
+        """Turn texts into L2-normalized TF-IDF rows over the patent vocabulary.
+
+        Lemmas that no patent contains are dropped; they can't contribute
+        to a match.
+        """
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            term_counts = Counter(
+                lemma for lemma in self.analyzer.preprocess_text(text) if lemma in self.vocabulary
+            )
+            for lemma, count in term_counts.items():
+                indices.append(self.vocabulary[lemma])
+                counts.append(count)
+            indptr.append(len(indices))
+
+        tf = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(texts), len(self.vocabulary))
+        )
+        tf.data = 1.0 + np.log(tf.data)
+        return _l2_normalize(tf @ sparse.diags(self.idf))
+
+    def top_matches(self, texts, top_k=RELEVANCE_TOP_K, min_score=RELEVANCE_MIN_SCORE):
+        """Score texts against every patent and keep the best matches.
+
+        Args:
+            texts (list): Page or query texts
+            top_k (int): Matches kept per text
+            min_score (float): Minimum cosine similarity
+
+        Returns:
+            list: Per text, a list of (patent_id, score) best first
+        """
+        if not texts or not self.patent_ids:
+            return [[] for _ in texts]
+
+        # Sparse product through the inverted index: only patents sharing a
+        # lemma with a text get a score
+        scores = (self.vectorize(texts) @ self.postings).tocsr()
+        results = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            data = scores.data[start:end]
+            columns = scores.indices[start:end]
+            keep = data >= min_score
+            data, columns = data[keep], columns[keep]
+            if data.size > top_k:
+                best = np.argpartition(-data, top_k)[:top_k]
+                data, columns = data[best], columns[best]
+            order = np.lexsort((columns, -data))
+            results.append([(self.patent_ids[columns[i]], round(float(data[i]), 4)) for i in order])
+        return results
+
+
+def _l2_normalize(matrix):
+    matrix = matrix.tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (sparse.diags(1.0 / norms) @ matrix).tocsr()
+
+
+def build_patent_index(analyzer=None):
+    """Index every stored patent's title, abstract and full text"""
+    conn = get_db()
+    patents = conn.execute(
+        'SELECT patent_id, title, abstract, full_text FROM patents ORDER BY id'
+    ).fetchall()
+    conn.close()
+    return PatentIndex(analyzer).build(
+        (row['patent_id'], '\n'.join(filter(None, (row['title'], row['abstract'], row['full_text']))))
+        for row in patents
+    )
+
+
+def _project_targets(conn, project_id):
+    """The project's crawled pages (latest crawl row per URL) and GSC queries"""
+    pages = conn.execute(
+        '''SELECT s.url, s.title, s.meta_description, s.h1, s.h2
+           FROM screaming_frog_data s
+           JOIN (SELECT MAX(s2.id) AS id FROM screaming_frog_data s2
+                 JOIN uploads u ON u.id = s2.upload_id
+                 WHERE u.project_id = ? GROUP BY s2.url) latest ON latest.id = s.id''',
+        (project_id,)
+    ).fetchall()
+    targets = {
+        'url': [
+            (row['url'], ' '.join(filter(None, (row['title'], row['h1'], row['h2'], row['meta_description']))))
+            for row in pages
+        ]
+    }
+
+    # Distinct queries come from the rollups rather than the raw GSC rows
+    queries = conn.execute(
+        '''SELECT DISTINCT value FROM gsc_rollups
+           WHERE project_id = ? AND dimension = 'query' AND period = 'month' ''',
+        (project_id,)
+    ).fetchall()
+    targets['query'] = [(row['value'], row['value']) for row in queries]
+    return targets
+
+
+def compute_project_relevance(project_id, index=None, top_k=RELEVANCE_TOP_K,
+                              min_score=RELEVANCE_MIN_SCORE, block_size=RELEVANCE_BLOCK_SIZE,
+                              progress_callback=None):
+    """Match a project's pages and queries to patents and store the top-k.
+
+    Args:
+        project_id (int): The project
+        index (PatentIndex): A prebuilt index, e.g. shared across projects
+        top_k (int): Matches stored per page or query
+        min_score (float): Minimum cosine similarity
+        block_size (int): Targets scored per sparse product
+        progress_callback (callable): Called as callback(fraction, message)
+
+    Returns:
+        dict: Number of pages, queries and stored matches
+    """
+    index = index or build_patent_index()
+    conn = get_db()
+    targets = _project_targets(conn, project_id)
+    total = sum(len(items) for items in targets.values())
+    computed_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    summary = {'pages': len(targets['url']), 'queries': len(targets['query']), 'matches': 0}
+    done = 0
+    for target_type in TARGET_TYPES:
+        items = targets[target_type]
+        for start in range(0, len(items), block_size):
+            block = items[start:start + block_size]
+            matches = index.top_matches([text for _, text in block], top_k, min_score)
+
+            # Each block replaces its targets' matches in one transaction
+            placeholders = ', '.join('?' for _ in block)
+            conn.execute(
+                f'''DELETE FROM patent_relevance
+                    WHERE project_id = ? AND target_type = ? AND target IN ({placeholders})''',
+                (project_id, target_type, *(target for target, _ in block))
+            )
+            rows = [
+                (project_id, target_type, target, rank, patent_id, score, computed_at)
+                for (target, _), target_matches in zip(block, matches)
+                for rank, (patent_id, score) in enumerate(target_matches, start=1)
+            ]
+            conn.executemany(
+                '''INSERT INTO patent_relevance
+                   (project_id, target_type, target, rank, patent_id, score, computed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                rows
+            )
+            conn.commit()
+
+            summary['matches'] += len(rows)
+            done += len(block)
+            if progress_callback:
+                progress_callback(done / total, f"Scored {done} of {total} pages and queries")
+
+    # Drop matches for pages and queries that are no longer in the project
+    conn.execute(
+        'DELETE FROM patent_relevance WHERE project_id = ? AND computed_at != ?',
+        (project_id, computed_at)
+    )
+    conn.commit()
+    conn.close()
+    return summary
+
+
+def get_relevant_patents(project_id, target_type, target):
+    """Stored patent matches for one page URL or query, best first"""
+    if target_type not in TARGET_TYPES:
+        raise ValueError(f"Invalid target type '{target_type}'")
+    conn = get_db()
+    rows = conn.execute(
+        '''SELECT r.patent_id, r.score, p.id, p.title FROM patent_relevance r
+           LEFT JOIN patents p ON p.patent_id = r.patent_id
+           WHERE r.project_id = ? AND r.target_type = ? AND r.target = ?
+           ORDER BY r.rank''',
+        (project_id, target_type, target)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_patent_targets(project_id, patent_id, limit=50):
+    """Pages and queries of a project that matched a patent, best first"""
+    conn = get_db()
+    rows = conn.execute(
+        '''SELECT target_type, target, score FROM patent_relevance
+           WHERE project_id = ? AND patent_id = ?
+           ORDER BY score DESC LIMIT ?''',
+        (project_id, patent_id, limit)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
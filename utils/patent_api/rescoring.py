@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+SEO Relevance Rescoring
+-----------------------
+Corpus-wide SEO relevance scores from stored keyword counts.
+
+Each patent's combined title, abstract and full text is scanned once for
+every SEO term, and the counts are stored in ``seo_term_counts`` (one
+compressed count vector per patent, indexed by ``seo_terms``). Together they
+form a patents x terms count matrix. When ``PatentAnalyzer.seo_keywords`` or
+``seo_categories`` change, the overall and category scores of the whole
+corpus are recomputed with one matrix product against a terms x scores
+weight matrix, without reading any text, and ``apply_scores`` writes them to
+the stored analyses.
+
+Counts are refreshed when a patent is saved (via a save hook on
+``db_manager.save_patent``), and ``scripts/rescore_patents.py`` counts new
+terms and changed texts before rescoring.
+"""
+
+import json
+import zlib
+import datetime
+import threading
+
+import numpy as np
+
+from database.db_manager import get_db
+from database.records import ANALYSIS_CATEGORY_COLUMNS, decode_payload, encode_payload
+from utils.patent_api.analyzer import ANALYZER_CHUNK_OVERLAP, iter_text_chunks, seo_impact
+
+
+# Counts are stored as little-endian uint32, zlib-compressed
+_COUNT_DTYPE = np.dtype('<u4')
+
+# Length of the combined text as analyze_patent builds it, computed in SQL so
+# changed texts are found without reading them
+_TEXT_LENGTH_SQL = ("length(coalesce(p.title, '')) + length(coalesce(p.abstract, '')) "
+                    "+ length(coalesce(p.full_text, '')) + 4")
+
+_analyzer = None
+_matrix = None
+_lock = threading.Lock()
+
+
+def _get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        from utils.patent_api.analyzer import PatentAnalyzer
+        _analyzer = PatentAnalyzer()
+    return _analyzer
+
+
+def _combined_text(patent):
+    return f"{patent['title'] or ''}\n\n{patent['abstract'] or ''}\n\n{patent['full_text'] or ''}"
+
+
+def count_terms(text, terms):
+    """Count each term in text the way calculate_seo_relevance does.
+
+    Long texts are scanned in overlapping chunks, so only one chunk is
+    lowercased at a time.
+
+    Returns:
+        numpy.ndarray: Count per term
+    """
+    counts = np.zeros(len(terms), dtype=np.int64)
+    overlap_chars = max([ANALYZER_CHUNK_OVERLAP] + [len(term) for term in terms])
+    for chunk, overlap in iter_text_chunks((text,), overlap_chars=overlap_chars):
+        chunk_lower = chunk.lower()
+        overlap_lower = chunk[:overlap].lower()
+        # Occurrences within the overlap were counted with the previous chunk
+        counts += [chunk_lower.count(term) - overlap_lower.count(term) for term in terms]
+    return counts
+
+
+def get_terms(conn, ensure=()):
+    """All counted terms in column order, adding any terms in ensure"""
+    if ensure:
+        conn.executemany('INSERT OR IGNORE INTO seo_terms (term) VALUES (?)', [(term,) for term in ensure])
+        conn.commit()
+    return [row['term'] for row in conn.execute('SELECT term FROM seo_terms ORDER BY id')]
+
+
+def _save_counts(conn, rows, terms):
+    """Count terms for patents rows and store the vectors (caller commits)"""
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    values = []
+    for row in rows:
+        text = _combined_text(row)
+        counts = count_terms(text, terms).astype(_COUNT_DTYPE)
+        values.append((row['patent_id'], len(terms), zlib.compress(counts.tobytes(), 6), len(text), now))
+    conn.executemany(
+        '''INSERT OR REPLACE INTO seo_term_counts (patent_id, term_count, counts, text_length, updated_at)
+           VALUES (?, ?, ?, ?, ?)''',
+        values
+    )
+
+
+def update_term_counts(analyzer=None, patent_ids=None, full=False, batch_size=100, progress_callback=None):
+    """Count SEO terms for patents that are new, changed or missing a term.
+
+    Args:
+        analyzer (PatentAnalyzer): Supplies seo_keywords and seo_categories
+        patent_ids (list): Only consider these patents
+        full (bool): Recount every patent
+        batch_size (int): Patents counted per transaction
+        progress_callback (callable): Called as callback(fraction, message)
+
+    Returns:
+        int: Number of patents counted
+    """
+    global _matrix
+    analyzer = analyzer or _get_analyzer()
+    conn = get_db()
+    terms = get_terms(conn, analyzer.seo_keywords)
+
+    sql = f'''SELECT p.patent_id FROM patents p
+              LEFT JOIN seo_term_counts c ON c.patent_id = p.patent_id
+              WHERE (? OR c.patent_id IS NULL OR c.term_count < ? OR c.text_length != {_TEXT_LENGTH_SQL})'''
+    params = [int(full), len(terms)]
+    if patent_ids:
+        sql += f" AND p.patent_id IN ({', '.join('?' for _ in patent_ids)})"
+        params.extend(patent_ids)
+    pending = [row['patent_id'] for row in conn.execute(sql, params)]
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        rows = conn.execute(
+            f'''SELECT patent_id, title, abstract, full_text FROM patents
+                WHERE patent_id IN ({', '.join('?' for _ in batch)})''',
+            batch
+        ).fetchall()
+        _save_counts(conn, rows, terms)
+        conn.commit()
+        done = start + len(batch)
+        if progress_callback:
+            progress_callback(done / len(pending), f"Counted SEO terms in {done} of {len(pending)} patents")
+    conn.close()
+
+    if pending:
+        with _lock:
+            _matrix = None
+    return len(pending)
+
+
+class CountMatrix:
+    """The stored term counts as a dense patents x terms matrix.
+
+    Attributes:
+        patent_ids (list): Patent ID of each row
+        terms (list): Term of each column
+        counts (numpy.ndarray): int64 counts; terms a row wasn't counted for are 0
+    """
+
+    def __init__(self, patent_ids, terms, counts, version=None):
+        self.patent_ids = patent_ids
+        self.terms = terms
+        self.counts = counts
+        self.version = version
+
+    @classmethod
+    def load(cls, conn=None):
+        """Read every stored count vector"""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db()
+        version = _version(conn)
+        terms = get_terms(conn)
+        rows = conn.execute('SELECT patent_id, term_count, counts FROM seo_term_counts ORDER BY patent_id').fetchall()
+        if own_conn:
+            conn.close()
+
+        counts = np.zeros((len(rows), len(terms)), dtype=np.int64)
+        for i, row in enumerate(rows):
+            counts[i, :row['term_count']] = np.frombuffer(zlib.decompress(row['counts']), dtype=_COUNT_DTYPE)
+        return cls([row['patent_id'] for row in rows], terms, counts, version)
+
+
+def _version(conn):
+    """Changes whenever counts or terms are written"""
+    return tuple(conn.execute(
+        '''SELECT COUNT(*), MAX(updated_at), SUM(term_count), (SELECT COUNT(*) FROM seo_terms)
+           FROM seo_term_counts'''
+    ).fetchone())
+
+
+def get_count_matrix():
+    """The process-wide count matrix, reloaded when the stored counts change"""
+    global _matrix
+    conn = get_db()
+    version = _version(conn)
+    with _lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = CountMatrix.load(conn)
+        matrix = _matrix
+    conn.close()
+    return matrix
+
+
+def weight_matrix(analyzer, terms):
+    """Build the terms x scores weights and the per-score maximums.
+
+    Column 0 is the overall relevance score, followed by one column per
+    category of analyzer.seo_categories.
+
+    Returns:
+        tuple: (weights int64 array of shape (len(terms), 1 + categories),
+                maximum raw score per column)
+    """
+    categories = analyzer.seo_categories
+    index = {term: i for i, term in enumerate(terms)}
+    weights = np.zeros((len(terms), 1 + len(categories)), dtype=np.int64)
+    maximums = np.zeros(1 + len(categories), dtype=np.int64)
+
+    for term, weight in analyzer.seo_keywords.items():
+        if term in index:
+            weights[index[term], 0] = weight
+    maximums[0] = sum(weight * 10 for weight in analyzer.seo_keywords.values())
+
+    for column, terms_in_category in enumerate(categories.values(), start=1):
+        for term in terms_in_category:
+            # Only weighted keywords are counted towards a category
+            if term in analyzer.seo_keywords and term in index:
+                weights[index[term], column] += analyzer.seo_keywords[term]
+        maximums[column] = sum(analyzer.seo_keywords.get(term, 5) * 10 for term in terms_in_category)
+    return weights, maximums
+
+
+def rescore(analyzer=None, matrix=None):
+    """Recompute SEO relevance for every counted patent.
+
+    Scores match calculate_seo_relevance on the same text.
+
+    Args:
+        analyzer (PatentAnalyzer): Supplies seo_keywords and seo_categories
+        matrix (CountMatrix): Counts to score (default: the stored counts)
+
+    Returns:
+        dict: patent_ids (list), overall_relevance_score (numpy.ndarray)
+            and relevance_by_category (dict of category -> numpy.ndarray)
+    """
+    analyzer = analyzer or _get_analyzer()
+    matrix = matrix or get_count_matrix()
+    weights, maximums = weight_matrix(analyzer, matrix.terms)
+
+    raw = matrix.counts @ weights
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(maximums > 0, raw / maximums * 100, 0)
+    scores = np.minimum(100, scores.astype(np.int64))
+
+    return {
+        'patent_ids': matrix.patent_ids,
+        'overall_relevance_score': scores[:, 0],
+        'relevance_by_category': {
+            category: scores[:, column] for column, category in enumerate(analyzer.seo_categories, start=1)
+        },
+    }
+
+
+def _rescored_payload(row, overall_score, relevance_by_category):
+    """An analyses row's payload and legacy analysis_data with new relevance scores.
+
+    The matched keyword counts (seo_keywords) are kept as they were.
+    """
+    def rescore_analysis(analysis_data):
+        if isinstance(analysis_data, dict):
+            seo_relevance = analysis_data.setdefault('seo_relevance', {})
+            seo_relevance['overall_relevance_score'] = overall_score
+            seo_relevance['relevance_by_category'] = relevance_by_category
+
+    if row['payload'] is not None:
+        value = decode_payload(bytes(row['payload']))
+        rescore_analysis(value.get('analysis_data'))
+        return encode_payload(value), row['analysis_data']
+    if not row['analysis_data']:
+        return None, row['analysis_data']
+    # Rows written before compaction hold JSON text
+    analysis_data = json.loads(row['analysis_data'])
+    rescore_analysis(analysis_data)
+    return None, json.dumps(analysis_data)
+
+
+def apply_scores(scores, progress_callback=None, batch_size=500):
+    """Write rescored relevance to the stored analyses.
+
+    Each batch of patents updates, in one transaction, the analyses score
+    columns and the seo_relevance section of their payloads (so list and
+    detail views agree), and the seo_impact label of the patent_analyses
+    rows server_updated.py shows. Categories without a column in the
+    analyses table are only updated in the payload.
+
+    Returns:
+        int: Number of analyses updated
+    """
+    columns = [
+        (category, ANALYSIS_CATEGORY_COLUMNS[category])
+        for category in scores['relevance_by_category'] if category in ANALYSIS_CATEGORY_COLUMNS
+    ]
+    assignments = ', '.join(['overall_relevance = ?'] + [f'{column} = ?' for _, column in columns]
+                            + ['payload = ?', 'analysis_data = ?'])
+    patent_ids = scores['patent_ids']
+
+    conn = get_db()
+    updated = 0
+    for start in range(0, len(patent_ids), batch_size):
+        # patent_id -> index into the score arrays
+        batch = {patent_id: start + offset for offset, patent_id in enumerate(patent_ids[start:start + batch_size])}
+        rows = conn.execute(
+            f"SELECT id, patent_id, payload, analysis_data FROM analyses "
+            f"WHERE patent_id IN ({', '.join('?' for _ in batch)})",
+            list(batch)
+        ).fetchall()
+
+        analysis_updates = []
+        for row in rows:
+            i = batch[row['patent_id']]
+            overall_score = int(scores['overall_relevance_score'][i])
+            relevance_by_category = {
+                category: int(values[i]) for category, values in scores['relevance_by_category'].items()
+            }
+            payload, analysis_data = _rescored_payload(row, overall_score, relevance_by_category)
+            analysis_updates.append((
+                overall_score, *(relevance_by_category[category] for category, _ in columns),
+                payload, analysis_data, row['id']
+            ))
+        conn.executemany(f'UPDATE analyses SET {assignments} WHERE id = ?', analysis_updates)
+        conn.executemany(
+            'UPDATE patent_analyses SET seo_impact = ? WHERE patent_id IN (SELECT id FROM patents WHERE patent_id = ?)',
+            [(seo_impact(int(scores['overall_relevance_score'][i])), patent_id) for patent_id, i in batch.items()]
+        )
+        conn.commit()
+        updated += len(analysis_updates)
+        if progress_callback:
+            progress_callback(min(1.0, (start + batch_size) / len(patent_ids)), f"Updated {updated} analyses")
+    conn.close()
+    return updated
+
+
+def on_patent_saved(patent):
+    """Keep the stored counts current when a patent's text is saved"""
+    update_term_counts(patent_ids=[patent['patent_id']], full=True)
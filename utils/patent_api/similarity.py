@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Patent Similarity Index
+-----------------------
+MinHash signatures over word shingles of ``patents.full_text``, bucketed with
+locality-sensitive hashing so related patents can be found locally instead of
+scraping Google Patents citations.
+
+Signatures are persisted in the ``patent_minhash`` table and kept current by
+a save hook on ``db_manager.save_patent``; each process holds the LSH buckets
+in memory and picks up signatures written by other processes on refresh.
+Every write gives the row the next ``version``, so a refresh reads only rows
+with a version above the highest one it has seen, including signatures
+recomputed by a rebuild and signatures cleared because a patent's text became
+empty.
+"""
+
+import re
+import time
+import zlib
+import threading
+import datetime
+
+import numpy as np
+
+from database.db_manager import get_db
+from config import SIMILARITY_NUM_PERM, SIMILARITY_BANDS, SIMILARITY_SHINGLE_SIZE, SIMILARITY_REFRESH_SECONDS
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+# Shingles hashed per block, bounding memory for multi-MB documents
+_HASH_BLOCK = 4096
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed, seeded permutation family."""
+
+    def __init__(self, num_perm=SIMILARITY_NUM_PERM, shingle_size=SIMILARITY_SHINGLE_SIZE, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # The seed must be identical in every process or signatures won't compare
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text):
+        """Hash the distinct word shingles of a text to 32-bit integers.
+
+        Args:
+            text (str): The document text
+
+        Returns:
+            numpy.ndarray: Unique shingle hashes (uint64)
+        """
+        words = _WORD_PATTERN.findall(text.lower())
+        size = self.shingle_size
+        if len(words) < size:
+            shingles = [' '.join(words)] if words else []
+        else:
+            shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64)
+
+    def signature(self, text):
+        """Compute the MinHash signature of a text.
+
+        Args:
+            text (str): The document text
+
+        Returns:
+            numpy.ndarray: uint32 signature, or None for an empty document
+        """
+        hashes = self.shingle_hashes(text or '')
+        if hashes.size == 0:
+            return None
+
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, hashes.size, _HASH_BLOCK):
+            block = hashes[start:start + _HASH_BLOCK]
+            # a < 2^32 and hash < 2^32, so a * hash + b cannot overflow uint64
+            permuted = (np.outer(block, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+
+class SimilarityIndex:
+    """In-memory LSH buckets over persisted MinHash signatures."""
+
+    def __init__(self, num_perm=SIMILARITY_NUM_PERM, bands=SIMILARITY_BANDS):
+        if num_perm % bands:
+            raise ValueError('num_perm must be divisible by bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.signatures = {}
+        self.buckets = [dict() for _ in range(bands)]
+        self._version = 0
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, patent_id, signature):
+        """Add or replace a patent's signature in the buckets"""
+        with self._lock:
+            self.remove(patent_id)
+            self.signatures[patent_id] = signature
+            for band, key in zip(self.buckets, self._band_keys(signature)):
+                band.setdefault(key, set()).add(patent_id)
+
+    def remove(self, patent_id):
+        """Remove a patent from the buckets"""
+        with self._lock:
+            signature = self.signatures.pop(patent_id, None)
+            if signature is None:
+                return
+            for band, key in zip(self.buckets, self._band_keys(signature)):
+                members = band.get(key)
+                if members:
+                    members.discard(patent_id)
+                    if not members:
+                        del band[key]
+
+    def refresh(self, force=False):
+        """Load signatures written since the last refresh (by any process).
+
+        Args:
+            force (bool): Refresh even if SIMILARITY_REFRESH_SECONDS hasn't elapsed
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < SIMILARITY_REFRESH_SECONDS:
+                return
+            self._last_refresh = now
+
+            conn = get_db()
+            try:
+                rows = conn.execute(
+                    '''SELECT patent_id, num_perm, signature, version FROM patent_minhash
+                       WHERE version > ? ORDER BY version''',
+                    (self._version,)
+                ).fetchall()
+            finally:
+                conn.close()
+
+            for row in rows:
+                if row['num_perm'] == self.num_perm:
+                    self.add(row['patent_id'], np.frombuffer(row['signature'], dtype=np.uint32))
+                else:
+                    # Rewritten with another SIMILARITY_NUM_PERM, or cleared
+                    # because the patent has no text any more
+                    self.remove(row['patent_id'])
+                self._version = row['version']
+
+    def query(self, patent_id, top_k=10, min_similarity=0.0):
+        """Find patents similar to a stored patent.
+
+        Args:
+            patent_id (str): The patent to find neighbours for
+            top_k (int): Maximum number of results
+            min_similarity (float): Minimum estimated Jaccard similarity
+
+        Returns:
+            list: (patent_id, similarity) tuples, most similar first
+        """
+        self.refresh()
+        with self._lock:
+            signature = self.signatures.get(patent_id)
+            if signature is None:
+                return []
+            return self._rank(signature, exclude=patent_id, top_k=top_k, min_similarity=min_similarity)
+
+    def query_text(self, text, top_k=10, min_similarity=0.0):
+        """Find stored patents similar to an arbitrary text"""
+        self.refresh()
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return []
+        with self._lock:
+            return self._rank(signature, exclude=None, top_k=top_k, min_similarity=min_similarity)
+
+    def _rank(self, signature, exclude, top_k, min_similarity):
+        candidates = set()
+        for band, key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(band.get(key, ()))
+        candidates.discard(exclude)
+        if not candidates:
+            return []
+
+        candidates = list(candidates)
+        matrix = np.stack([self.signatures[c] for c in candidates])
+        scores = (matrix == signature).mean(axis=1)
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        return [
+            (candidates[i], round(float(scores[i]), 4))
+            for i in order if scores[i] >= min_similarity
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide similarity index, loading it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+            _index.refresh(force=True)
+        return _index
+
+
+def _store_signatures(conn, items):
+    """Persist (patent_id, signature) pairs.
+
+    Each row gets the next version inside the write transaction; writers
+    are serialized, so versions are committed in increasing order.
+    """
+    updated_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany(
+        '''INSERT OR REPLACE INTO patent_minhash (patent_id, num_perm, signature, updated_at, version)
+           VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM patent_minhash))''',
+        [(patent_id, len(signature), signature.tobytes(), updated_at) for patent_id, signature in items]
+    )
+
+
+def _clear_signatures(conn, patent_ids):
+    """Drop the stored signatures of patents that have no text any more.
+
+    The rows are kept with num_perm 0 and the next version rather than
+    deleted, so other processes remove the patents on their next refresh.
+    """
+    updated_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany(
+        '''UPDATE patent_minhash SET num_perm = 0, signature = X'', updated_at = ?,
+           version = (SELECT MAX(version) + 1 FROM patent_minhash)
+           WHERE patent_id = ? AND num_perm != 0''',
+        [(updated_at, patent_id) for patent_id in patent_ids]
+    )
+
+
+def index_patent(patent_id, full_text):
+    """Compute, store and index the signature for one patent.
+
+    A patent whose text is now empty loses its signature.
+
+    Returns:
+        bool: False if the patent has no text to index
+    """
+    index = get_index()
+    signature = index.hasher.signature(full_text)
+    conn = get_db()
+    if signature is None:
+        _clear_signatures(conn, [patent_id])
+    else:
+        _store_signatures(conn, [(patent_id, signature)])
+    conn.commit()
+    conn.close()
+    if signature is None:
+        index.remove(patent_id)
+        return False
+    index.add(patent_id, signature)
+    return True
+
+
+def build_index(rebuild=False, batch_size=500):
+    """Compute signatures for every patent that doesn't have one yet.
+
+    A rebuild overwrites the stored signatures in place rather than
+    deleting them first, so versions keep increasing and other processes
+    pick up the recomputed signatures on their next refresh.
+
+    Args:
+        rebuild (bool): Recompute all signatures from scratch
+        batch_size (int): Signatures written per transaction
+
+    Returns:
+        int: Number of signatures computed
+    """
+    conn = get_db()
+    if rebuild:
+        # Signatures of patents that no longer exist
+        conn.execute('DELETE FROM patent_minhash WHERE patent_id NOT IN (SELECT patent_id FROM patents)')
+        conn.commit()
+
+    hasher = MinHasher()
+    computed = 0
+    last_patent_id = ''
+    while True:
+        # Read in keyset-paginated batches so no read lock is held while writing
+        rows = conn.execute(
+            '''SELECT p.patent_id, p.full_text FROM patents p
+               LEFT JOIN patent_minhash m ON m.patent_id = p.patent_id
+               WHERE (? OR m.patent_id IS NULL) AND p.patent_id > ?
+               ORDER BY p.patent_id LIMIT ?''',
+            (rebuild, last_patent_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_patent_id = rows[-1]['patent_id']
+
+        batch = []
+        empty = []
+        for row in rows:
+            signature = hasher.signature(row['full_text'])
+            if signature is not None:
+                batch.append((row['patent_id'], signature))
+            elif rebuild:
+                empty.append(row['patent_id'])
+        _store_signatures(conn, batch)
+        _clear_signatures(conn, empty)
+        conn.commit()
+        computed += len(batch)
+
+    conn.close()
+    if _index is not None:
+        _index.refresh(force=True)
+    return computed
+
+
+def find_similar_patents(patent_id, top_k=10, min_similarity=0.0):
+    """Find patents similar to a stored patent (see SimilarityIndex.query)"""
+    return get_index().query(patent_id, top_k=top_k, min_similarity=min_similarity)
+
+
+def get_similar_patents(patent_key, top_k=10, min_similarity=0.0):
+    """Build the /api/patent/<id>/similar response.
+
+    Args:
+        patent_key (str): A patent number in any form or a numeric patents.id
+        top_k (int): Maximum number of results
+        min_similarity (float): Minimum estimated Jaccard similarity
+
+    Returns:
+        dict: The patent and its similar patents, or None if it doesn't exist
+    """
+    from utils.patent_api.patent_ids import resolve_patent_id
+
+    conn = get_db()
+    patent = conn.execute(
+        'SELECT id, patent_id, title FROM patents WHERE patent_id = ? OR id = ?',
+        (resolve_patent_id(patent_key) or patent_key, patent_key)
+    ).fetchone()
+    if not patent:
+        conn.close()
+        return None
+
+    matches = find_similar_patents(patent['patent_id'], top_k, min_similarity)
+    titles = {}
+    if matches:
+        placeholders = ', '.join('?' for _ in matches)
+        rows = conn.execute(
+            f'SELECT id, patent_id, title FROM patents WHERE patent_id IN ({placeholders})',
+            [patent_id for patent_id, _ in matches]
+        ).fetchall()
+        titles = {row['patent_id']: row for row in rows}
+    conn.close()
+
+    return {
+        'id': patent['id'],
+        'patent_id': patent['patent_id'],
+        'title': patent['title'],
+        'similar': [
+            {
+                'id': titles[patent_id]['id'],
+                'patent_id': patent_id,
+                'title': titles[patent_id]['title'],
+                'similarity': score
+            }
+            for patent_id, score in matches if patent_id in titles
+        ]
+    }
+
+
+def on_patent_saved(patent):
+    """Keep the signature current when a patent is saved"""
+    index_patent(patent['patent_id'], patent.get('full_text'))
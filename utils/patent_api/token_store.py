@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Patent Token Store
+------------------
+Pre-tokenized patent texts, so re-analysis doesn't re-run NLTK.
+
+Each patent's combined title, abstract and full text is tokenized once with
+``PatentAnalyzer.tokenize`` and stored in ``patent_tokens`` as a compressed
+array of token IDs. The IDs index the shared ``token_vocab`` table, which
+also holds each token's lowercase lemma. ``PatentAnalyzer.analyze_tokens``
+consumes the IDs directly, so changed stopwords, SEO weights or n-gram
+ranges can be applied to the whole corpus without tokenizing again.
+
+Tokens are written when a patent is saved (via a save hook on
+``db_manager.save_patent``) or first analyzed, and rewritten only when the
+patent's text changes. ``scripts/build_token_store.py`` fills the store for
+existing patents.
+"""
+
+import zlib
+import hashlib
+import datetime
+import threading
+
+import numpy as np
+
+from database.db_manager import get_db
+
+
+# Token IDs are stored as little-endian uint32, zlib-compressed
+_TOKEN_DTYPE = np.dtype('<u4')
+
+_analyzer = None
+_vocabulary = None
+_lock = threading.Lock()
+
+
+def _get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        from utils.patent_api.analyzer import PatentAnalyzer
+        _analyzer = PatentAnalyzer()
+    return _analyzer
+
+
+def encode_tokens(token_ids):
+    """Pack token IDs into a compressed blob"""
+    return zlib.compress(np.asarray(token_ids, dtype=_TOKEN_DTYPE).tobytes(), 6)
+
+
+def decode_tokens(blob):
+    """Unpack a blob written by encode_tokens into a uint32 array"""
+    return np.frombuffer(zlib.decompress(blob), dtype=_TOKEN_DTYPE)
+
+
+def combined_text(patent):
+    """The text analyze_patent analyzes: title, abstract and full text"""
+    return f"{patent.get('title') or ''}\n\n{patent.get('abstract') or ''}\n\n{patent.get('full_text') or ''}"
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class TokenVocabulary:
+    """In-memory copy of token_vocab, indexed by token ID.
+
+    Attributes:
+        tokens (list): Token text per ID (index 0 is unused)
+        lowered (list): Lowercase token per ID
+        lemmas (list): Lemma of the lowercase token per ID
+        ids (dict): Token text -> ID
+    """
+
+    def __init__(self):
+        self.tokens = ['']
+        self.lowered = ['']
+        self.lemmas = ['']
+        self.ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _append_rows(self, rows):
+        for token_id, token, lemma in rows:
+            # IDs are rowids, so they are dense except for gaps left by
+            # concurrent writers; pad the gaps
+            while len(self.tokens) < token_id:
+                self.tokens.append('')
+                self.lowered.append('')
+                self.lemmas.append('')
+            if token_id < len(self.tokens):
+                continue
+            self.tokens.append(token)
+            self.lowered.append(token.lower())
+            self.lemmas.append(lemma)
+            self.ids[token] = token_id
+
+    def refresh(self, conn=None):
+        """Load vocabulary entries added since the last refresh (e.g. by other processes)"""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db()
+        rows = conn.execute(
+            'SELECT id, token, lemma FROM token_vocab WHERE id >= ? ORDER BY id', (len(self.tokens),)
+        ).fetchall()
+        if own_conn:
+            conn.close()
+        with self._lock:
+            self._append_rows(tuple(row) for row in rows)
+
+    def ensure(self, max_id):
+        """Make sure IDs up to max_id can be decoded"""
+        if max_id >= len(self.tokens):
+            self.refresh()
+
+    def encode(self, conn, tokens, lemmatize):
+        """Map tokens to IDs, adding unseen tokens to token_vocab (caller commits).
+
+        New entries are read back on conn but not cached: until the caller
+        commits they may still be rolled back and their IDs reused by another
+        writer. The next refresh (see ensure) loads them once committed.
+
+        Args:
+            conn (sqlite3.Connection): Connection to write new entries on
+            tokens (list): Token texts
+            lemmatize (callable): Lemma of a lowercase token
+
+        Returns:
+            list: Token IDs
+        """
+        unseen = [token for token in dict.fromkeys(tokens) if token not in self.ids]
+        if not unseen:
+            return [self.ids[token] for token in tokens]
+
+        conn.executemany(
+            'INSERT OR IGNORE INTO token_vocab (token, lemma) VALUES (?, ?)',
+            [(token, lemmatize(token.lower())) for token in unseen]
+        )
+        staged = {}
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(unseen), 500):
+            chunk = unseen[start:start + 500]
+            rows = conn.execute(
+                f"SELECT token, id FROM token_vocab WHERE token IN ({', '.join('?' for _ in chunk)})", chunk
+            )
+            staged.update((row[0], row[1]) for row in rows)
+        return [staged[token] if token in staged else self.ids[token] for token in tokens]
+
+
+def get_vocabulary():
+    """The process-wide vocabulary, loaded on first use"""
+    global _vocabulary
+    with _lock:
+        if _vocabulary is None:
+            _vocabulary = TokenVocabulary()
+            _vocabulary.refresh()
+    return _vocabulary
+
+
+def store_patent_tokens(patent, analyzer=None, conn=None):
+    """Tokenize a patent and store its token IDs if its text changed.
+
+    Args:
+        patent (dict): Patent with patent_id, title, abstract and full_text
+        analyzer (PatentAnalyzer): Tokenizer and lemmatizer to use
+        conn (sqlite3.Connection): Use the caller's transaction (caller commits)
+
+    Returns:
+        numpy.ndarray: The patent's token IDs
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
+    try:
+        analyzer = analyzer or _get_analyzer()
+        text = combined_text(patent)
+        # Tokens from a different tokenizer backend are stale too
+        digest = text_hash(f"{analyzer.tokenizer}\0{text}")
+        row = conn.execute(
+            'SELECT tokens, text_hash FROM patent_tokens WHERE patent_id = ?', (patent['patent_id'],)
+        ).fetchone()
+        if row is not None and row['text_hash'] == digest:
+            return decode_tokens(row['tokens'])
+
+        # Tokenized chunk by chunk, so long texts don't build one huge token list
+        from utils.patent_api.analyzer import iter_text_chunks
+        vocabulary = get_vocabulary()
+        token_ids = np.concatenate([
+            np.asarray(vocabulary.encode(conn, analyzer.tokenize(chunk), analyzer.lemmatizer.lemmatize),
+                       dtype=_TOKEN_DTYPE)
+            for chunk, _ in iter_text_chunks((text,), overlap_chars=0)
+        ])
+        conn.execute(
+            '''INSERT OR REPLACE INTO patent_tokens (patent_id, token_count, tokens, text_hash, updated_at)
+               VALUES (?, ?, ?, ?, ?)''',
+            (patent['patent_id'], len(token_ids), encode_tokens(token_ids), digest,
+             datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        if own_conn:
+            conn.commit()
+        return token_ids
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def get_patent_tokens(patent_id):
+    """Stored token IDs of a patent, or None if it hasn't been tokenized"""
+    conn = get_db()
+    row = conn.execute('SELECT tokens FROM patent_tokens WHERE patent_id = ?', (patent_id,)).fetchone()
+    conn.close()
+    return decode_tokens(row['tokens']) if row else None
+
+
+def iter_patent_tokens(batch_size=500):
+    """Yield (patent_id, token IDs) for every tokenized patent"""
+    conn = get_db()
+    last_id = ''
+    try:
+        while True:
+            rows = conn.execute(
+                'SELECT patent_id, tokens FROM patent_tokens WHERE patent_id > ? ORDER BY patent_id LIMIT ?',
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['patent_id']
+            for row in rows:
+                yield row['patent_id'], decode_tokens(row['tokens'])
+    finally:
+        conn.close()
+
+
+def build_token_store(analyzer=None, batch_size=100, progress_callback=None):
+    """Tokenize every patent whose text isn't stored yet or has changed.
+
+    Returns:
+        int: Number of patents checked
+    """
+    conn = get_db()
+    total = conn.execute('SELECT COUNT(*) FROM patents').fetchone()[0]
+    done = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, patent_id, title, abstract, full_text FROM patents WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        for row in rows:
+            store_patent_tokens(dict(row), analyzer, conn)
+        conn.commit()
+        done += len(rows)
+        if progress_callback:
+            progress_callback(done / total, f"Tokenized {done} of {total} patents")
+    conn.close()
+    return done
+
+
+def on_patent_saved(patent):
+    """Keep the stored tokens current when a patent's text is saved"""
+    if not all(field in patent for field in ('title', 'abstract', 'full_text')):
+        # Partial saves (e.g. a metadata backfill) carry only the changed fields
+        conn = get_db()
+        row = conn.execute(
+            'SELECT patent_id, title, abstract, full_text FROM patents WHERE patent_id = ?',
+            (patent['patent_id'],)
+        ).fetchone()
+        conn.close()
+        if row is None:
+            return
+        patent = dict(row)
+    store_patent_tokens(patent)
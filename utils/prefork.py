@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Server
+---------------
+Serve one http.server handler from several worker processes.
+
+The master process binds the listening socket, runs a warmup (imports,
+process-wide indexes), freezes the garbage collector's view of everything
+loaded so far with ``gc.freeze`` so those pages stay shared copy-on-write,
+and forks WEB_WORKERS workers that all accept on the inherited socket. The
+master only supervises: a worker that dies is restarted (with a growing
+delay if workers keep dying right after start), SIGHUP replaces every
+worker in turn, and SIGTERM/SIGINT stop the workers and then exit. A
+stopping worker stops accepting connections and waits for the requests it
+is serving before it exits.
+
+Caches and connections are per worker. Metrics are too, but with
+``start_worker_metrics`` as ``on_worker_start`` each worker labels its
+samples with its index and dumps them every METRICS_DUMP_INTERVAL to
+METRICS_FILE.<n> (or a temporary directory when METRICS_FILE isn't set),
+and ``/metrics`` in any worker merges all of them.
+"""
+
+import os
+import gc
+import glob
+import time
+import shutil
+import signal
+import logging
+import tempfile
+from http.server import HTTPServer
+from config import WEB_WORKERS, WEB_WORKER_RESTART_DELAY, WEB_WORKER_SHUTDOWN_TIMEOUT
+
+# A worker that exits sooner than this after starting counts as a crash loop
+_MIN_WORKER_LIFETIME = 5.0
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the workers' metrics dumps, set by the master before forking
+_metrics_prefix = None
+
+
+def warm_caches():
+    """Load the process-wide indexes the request handlers use, before forking"""
+    from utils.patent_api import similarity
+    from utils.patent_api.patent_ids import get_index
+    try:
+        similarity.get_index()
+        get_index()
+    except Exception as e:
+        # Workers load them on first use instead
+        logger.warning(f"Could not warm caches: {e}")
+
+
+def start_worker_metrics(index):
+    """Start the metrics of one worker: label its samples and dump them to
+    <prefix>.<index>, where the other workers' /metrics read them"""
+    from utils import metrics
+    if _metrics_prefix is None:
+        metrics.start_file_dumper()
+        return
+    metrics.set_worker(index, _metrics_prefix)
+    metrics.start_file_dumper(f"{_metrics_prefix}.{index}")
+
+
+def _prepare_worker_metrics():
+    """Choose the workers' metrics dump prefix and clear old dumps.
+
+    Returns:
+        str: A temporary directory to remove on shutdown, or None
+    """
+    global _metrics_prefix
+    from utils import metrics
+    if metrics.METRICS_FILE:
+        _metrics_prefix = metrics.METRICS_FILE
+        # Dumps of workers from an earlier run, possibly with more workers
+        for path in glob.glob(glob.escape(_metrics_prefix) + '.*'):
+            if path.rsplit('.', 1)[1].isdigit():
+                os.remove(path)
+        return None
+    directory = tempfile.mkdtemp(prefix='seo-metrics-')
+    _metrics_prefix = os.path.join(directory, 'metrics.prom')
+    return directory
+
+
+# Signals the master handles; blocked across fork so a new worker can't
+# receive one before it has installed its own handlers
+_MASTER_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+
+
+def _run_worker(httpd, index, on_worker_start):
+    """Serve requests in a forked worker until SIGTERM, then exit the process.
+
+    Called with _MASTER_SIGNALS blocked; a SIGTERM sent in the meantime is
+    delivered to the worker's handler once they are unblocked.
+    """
+    stopping = []
+
+    def _stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, _MASTER_SIGNALS)
+
+    # Request threads must outlive the accept loop so server_close can wait
+    # for them; ThreadingHTTPServer makes them daemon threads by default
+    httpd.daemon_threads = False
+    httpd.block_on_close = True
+
+    status = 0
+    try:
+        if on_worker_start:
+            on_worker_start(index)
+        # handle_request returns after httpd.timeout, or as soon as it has
+        # handed a connection to a request thread, so a stop request is
+        # noticed within the timeout
+        httpd.timeout = 0.5
+        while not stopping:
+            httpd.handle_request()
+    except Exception:
+        logger.exception(f"Worker {index} failed")
+        status = 1
+    finally:
+        try:
+            # Stops accepting and joins the request threads, so requests in
+            # progress finish before the process exits
+            httpd.server_close()
+        finally:
+            os._exit(status)
+
+
+def _fork_worker(httpd, index, on_worker_start):
+    signal.pthread_sigmask(signal.SIG_BLOCK, _MASTER_SIGNALS)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(httpd, index, on_worker_start)
+    finally:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _MASTER_SIGNALS)
+    logger.info(f"Started worker {index} (pid {pid})")
+    return pid
+
+
+def _reap(pid=-1):
+    """Collect an exited worker without blocking.
+
+    Returns:
+        tuple: (pid, wait status), or None if no worker has exited
+    """
+    try:
+        pid, status = os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        return (pid, 0) if pid > 0 else None
+    return (pid, status) if pid else None
+
+
+def _stop_workers(workers, timeout):
+    """SIGTERM every worker, then SIGKILL those still running after timeout"""
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + timeout
+    while workers and time.monotonic() < deadline:
+        for pid in list(workers):
+            if _reap(pid):
+                workers.pop(pid)
+        time.sleep(0.1)
+
+    for pid in workers:
+        logger.warning(f"Worker pid {pid} didn't stop in {timeout:.0f}s, killing it")
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+    workers.clear()
+
+
+def serve_prefork(server_address, handler_class, workers=None, server_class=HTTPServer,
+                  warmup=None, on_worker_start=None):
+    """Serve handler_class from forked worker processes sharing one socket.
+
+    With a single worker (or where os.fork isn't available) the server runs
+    in this process, as before.
+
+    Args:
+        server_address (tuple): (host, port) to bind
+        handler_class (type): BaseHTTPRequestHandler subclass
+        workers (int): Number of worker processes (defaults to WEB_WORKERS)
+        server_class (type): socketserver server class
+        warmup (callable): Called once in the master before forking, to load
+            modules and caches every worker shares
+        on_worker_start (callable): Called as on_worker_start(index) in each
+            worker before it serves, e.g. to start per-process threads
+    """
+    workers = workers or WEB_WORKERS
+    httpd = server_class(server_address, handler_class)
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if warmup:
+            warmup()
+        if on_worker_start:
+            on_worker_start(0)
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+        return
+
+    # Every worker waits on the same socket and only one wins each
+    # connection; the others must get EAGAIN from accept, not block in it
+    httpd.socket.setblocking(False)
+    from utils import singleflight
+    singleflight.enable_shared()
+    metrics_dir = _prepare_worker_metrics()
+    if warmup:
+        warmup()
+    # Objects that exist now are never collected, so the collector doesn't
+    # write to (and un-share) their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    running = {}  # pid -> worker index
+    started = {}  # worker index -> start time
+    failures = {}  # worker index -> consecutive early exits
+    signals = []
+
+    def _on_signal(signum, frame):
+        signals.append(signum)
+
+    for signum in _MASTER_SIGNALS:
+        signal.signal(signum, _on_signal)
+
+    def _start(index):
+        running[_fork_worker(httpd, index, on_worker_start)] = index
+        started[index] = time.monotonic()
+
+    logger.info(f"Forking {workers} workers on {server_address[0]}:{server_address[1]}")
+    for index in range(workers):
+        _start(index)
+
+    try:
+        while True:
+            if signals:
+                signum = signals.pop(0)
+                if signum == signal.SIGHUP:
+                    logger.info("Restarting workers")
+                    for pid, index in list(running.items()):
+                        _stop_workers({pid: index}, WEB_WORKER_SHUTDOWN_TIMEOUT)
+                        running.pop(pid, None)
+                        _start(index)
+                    continue
+                logger.info(f"Received signal {signum}, stopping workers")
+                break
+
+            # Polled rather than blocking in waitpid, which would resume
+            # after a signal instead of returning to handle it
+            exited = _reap()
+            if exited is None:
+                time.sleep(0.2)
+                continue
+            pid, status = exited
+            if pid not in running:
+                continue
+
+            index = running.pop(pid)
+            lifetime = time.monotonic() - started[index]
+            failures[index] = failures.get(index, 0) + 1 if lifetime < _MIN_WORKER_LIFETIME else 0
+            delay = WEB_WORKER_RESTART_DELAY * (2 ** min(failures[index], 6)) if failures[index] else 0
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}"
+                           f", restarting in {delay:.0f}s")
+            time.sleep(delay)
+            _start(index)
+    finally:
+        _stop_workers(running, WEB_WORKER_SHUTDOWN_TIMEOUT)
+        httpd.server_close()
+        gc.unfreeze()
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Request Profiling
+-----------------
+Opt-in profiles of single HTTP requests, written to PROFILE_DIR.
+
+A request is profiled when it carries ``X-Profile: sample`` or
+``X-Profile: cprofile`` (from a loopback client, or with
+``X-Profile-Token: $PROFILE_TOKEN`` when a token is configured), or when it
+is picked by the sample rate: PROFILE_SAMPLE_RATE, or the rate set at
+runtime with ``configure`` (the admin endpoint), which all worker processes
+read from PROFILE_DIR/profiling.json.
+
+``sample`` mode runs a sampling thread that records the request thread's
+stack every PROFILE_SAMPLE_INTERVAL seconds and writes collapsed stacks
+(``<id>.folded``, for flamegraph.pl or speedscope). ``cprofile`` mode runs
+cProfile and writes pstats (``<id>.prof``). Each profile also gets
+``<id>.json`` with the route, duration and the named spans entered during
+the request: ``span('name')`` around analyzer stages and ``metrics.phase``
+blocks. Spans are also the second level of the collapsed stacks, so time
+groups by stage in the flamegraph. Outside a profiled request a span costs
+one thread-local lookup.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import pstats
+import cProfile
+import datetime
+import functools
+import threading
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+from config import (
+    PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_FILES,
+    PROFILE_TOKEN
+)
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+_SETTINGS_FILE = 'profiling.json'
+_LOOPBACK = ('127.0.0.1', '::1')
+
+_local = threading.local()
+_sequence = itertools.count(1)
+_settings = {'sample_rate': PROFILE_SAMPLE_RATE, 'mode': PROFILE_MODE, 'until': None}
+_settings_state = {'mtime': None, 'checked': 0.0}
+_settings_lock = threading.Lock()
+
+
+class RequestProfile:
+    """The profile of one request: spans plus sampled stacks or cProfile stats.
+
+    Attributes:
+        profile_id (str): File name stem of the outputs
+        mode (str): 'sample' or 'cprofile'
+        spans (list): Finished spans as dicts of name, start and duration
+            (seconds from the start of the request) and depth
+    """
+
+    def __init__(self, profile_id, mode, method, path):
+        self.profile_id = profile_id
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.spans = []
+        self.open_spans = []
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.duration = None
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._profiler = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+    def _sample_loop(self):
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # The span stack is read while the request thread changes it;
+            # a copy of the list is consistent enough for a sample
+            spans = [f"span:{name}" for name in list(self.open_spans)]
+            self.stacks[';'.join([f"{self.method} {self.path}", *spans, *reversed(frames)])] += 1
+
+    def summary(self):
+        return {
+            'id': self.profile_id,
+            'mode': self.mode,
+            'method': self.method,
+            'path': self.path,
+            'pid': os.getpid(),
+            'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': round(self.duration or 0, 6),
+            'samples': sum(self.stacks.values()),
+            'spans': self.spans,
+        }
+
+    def save(self, directory=None):
+        """Write the profile's files.
+
+        Returns:
+            str: Path of the summary file
+        """
+        directory = directory or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.profile_id)
+        if self._profiler is not None:
+            pstats.Stats(self._profiler).dump_stats(base + '.prof')
+        else:
+            with open(base + '.folded', 'w') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        with open(base + '.json', 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        _prune(directory)
+        return base + '.json'
+
+
+@contextmanager
+def span(name):
+    """Name a stage of the current request's profile (no-op when not profiling)"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    profile.open_spans.append(name)
+    try:
+        yield
+    finally:
+        profile.open_spans.pop()
+        profile.spans.append({
+            'name': name,
+            'start': round(start - profile.started, 6),
+            'duration': round(time.perf_counter() - start, 6),
+            'depth': len(profile.open_spans),
+        })
+
+
+def traced(name):
+    """Decorator form of span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'profile', None) is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _settings_path():
+    return os.path.join(PROFILE_DIR, _SETTINGS_FILE)
+
+
+def get_settings():
+    """The runtime sampling settings, reloaded (at most once a second) when another process changed them"""
+    now = time.monotonic()
+    with _settings_lock:
+        if now - _settings_state['checked'] >= 1.0:
+            _settings_state['checked'] = now
+            try:
+                mtime = os.stat(_settings_path()).st_mtime
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != _settings_state['mtime']:
+                try:
+                    with open(_settings_path(), 'r') as f:
+                        _settings.update(json.load(f))
+                    _settings_state['mtime'] = mtime
+                except (OSError, ValueError) as e:
+                    print(f"Error loading profiling settings: {e}")
+        return dict(_settings)
+
+
+def configure(sample_rate=None, mode=None, duration=None):
+    """Change the sampling settings of every worker.
+
+    Args:
+        sample_rate (float): Fraction of requests to profile
+        mode (str): 'sample' or 'cprofile'
+        duration (float): Seconds until sampling falls back to
+            PROFILE_SAMPLE_RATE (None: until changed again)
+
+    Returns:
+        dict: The new settings
+    """
+    if mode is not None and mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profiling mode '{mode}'")
+    settings = get_settings()
+    if sample_rate is not None:
+        settings['sample_rate'] = min(max(float(sample_rate), 0.0), 1.0)
+    if mode is not None:
+        settings['mode'] = mode
+    settings['until'] = time.time() + float(duration) if duration else None
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp_path = _settings_path() + f'.{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(settings, f)
+    os.replace(tmp_path, _settings_path())
+    with _settings_lock:
+        _settings.update(settings)
+        _settings_state['mtime'] = os.stat(_settings_path()).st_mtime
+    return settings
+
+
+def authorized(handler):
+    """Whether a request may ask for a profile or use the profiling admin endpoints"""
+    if PROFILE_TOKEN:
+        return handler.headers.get('X-Profile-Token', '') == PROFILE_TOKEN
+    return handler.client_address[0] in _LOOPBACK
+
+
+def _requested_mode(handler):
+    """The profiling mode for a request, or None to run it unprofiled"""
+    requested = handler.headers.get('X-Profile', '').strip().lower()
+    if requested and authorized(handler):
+        return requested if requested in PROFILE_MODES else get_settings()['mode']
+
+    settings = get_settings()
+    rate = settings['sample_rate']
+    if settings['until'] is not None and time.time() > settings['until']:
+        rate = PROFILE_SAMPLE_RATE
+    if rate > 0 and random.random() < rate:
+        return settings['mode']
+    return None
+
+
+@contextmanager
+def profile_request(handler):
+    """Profile the enclosed handling of a request if it was asked for or sampled.
+
+    Sets ``handler.profile_id`` for the servers' ``X-Profile-Id`` response header.
+    """
+    mode = _requested_mode(handler)
+    if mode is None or getattr(_local, 'profile', None) is not None:
+        yield
+        return
+
+    path = handler.path.split('?', 1)[0]
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    slug = ''.join(c if c.isalnum() else '_' for c in path.strip('/'))[:60] or 'root'
+    profile = RequestProfile(f"{stamp}-{os.getpid()}-{next(_sequence)}-{handler.command}-{slug}",
+                             mode, handler.command, path)
+    try:
+        profile.start()
+    except Exception as e:
+        # e.g. cProfile when another profiler is active (Python 3.12+)
+        print(f"Error starting profile {profile.profile_id}: {e}")
+        yield
+        return
+
+    handler.profile_id = profile.profile_id
+    try:
+        _local.profile = profile
+        yield
+    finally:
+        _local.profile = None
+        profile.stop()
+        try:
+            profile.save()
+        except OSError as e:
+            print(f"Error saving profile {profile.profile_id}: {e}")
+
+
+def _prune(directory):
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES"""
+    summaries = sorted(name for name in os.listdir(directory) if name.endswith('.json') and name != _SETTINGS_FILE)
+    for name in summaries[:max(0, len(summaries) - PROFILE_MAX_FILES)]:
+        stem = name[:-len('.json')]
+        for ext in ('.json', '.folded', '.prof'):
+            try:
+                os.remove(os.path.join(directory, stem + ext))
+            except OSError:
+                pass
+
+
+def list_profiles(limit=50):
+    """Summaries of the most recent profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted((name for name in os.listdir(PROFILE_DIR)
+                    if name.endswith('.json') and name != _SETTINGS_FILE), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(PROFILE_DIR, name), 'r') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def read_profile(name):
+    """The contents of a profile file (e.g. '<id>.folded'), or None if there is no such file.
+
+    Returns:
+        tuple: (content type, bytes)
+    """
+    if os.path.basename(name) != name or not name.endswith(('.json', '.folded', '.prof')):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, name), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if name.endswith('.json'):
+        return 'application/json', data
+    if name.endswith('.folded'):
+        return 'text/plain; charset=utf-8', data
+    return 'application/octet-stream', data
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Single-flight
+-------------
+Share one in-progress computation between concurrent identical calls.
+
+``do(key, fn)`` runs fn unless a call with the same key is already running,
+in which case it waits for that call and returns its result. Keys name the
+canonical request, e.g. ``flight_key('patent_details', 'US6285999B1')`` or
+an analysis keyed by patent and analyzer config version.
+
+Threads of one process share the running call directly. Sharing across
+processes is off by default, since it costs two database writes per call;
+``enable_shared()`` turns it on where several processes serve the same
+requests (``serve_prefork`` with more than one worker, ``run_workers`` with
+more than one job worker), as does SINGLEFLIGHT_SHARED=1. The leader then
+claims the key in the ``singleflight`` table of the application database
+and stores its result there as JSON when done; callers in other processes
+poll the row until it finishes. A claim older than SINGLEFLIGHT_TIMEOUT is treated as abandoned,
+and callers that time out, or whose leader failed or returned something
+that isn't JSON, compute the result themselves. Nothing is cached: a call
+that starts after the leader finished runs again.
+"""
+
+import os
+import copy
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+from database.db_manager import get_db
+from utils import metrics
+from config import SINGLEFLIGHT_SHARED, SINGLEFLIGHT_TIMEOUT, SINGLEFLIGHT_POLL_INTERVAL
+
+# Finished rows are kept this long for callers still polling them
+_RESULT_TTL = 60
+
+
+def flight_key(operation, *parts):
+    """Build a key from an operation name and the parts that identify the request"""
+    return ':'.join([operation, *(str(part) for part in parts)])
+
+
+class _Call:
+    """A running call that threads of this process wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key.
+
+    Args:
+        shared (bool): Also deduplicate across processes via the flight table
+        timeout (float): Seconds to wait for another process's call
+    """
+
+    def __init__(self, shared=SINGLEFLIGHT_SHARED, timeout=SINGLEFLIGHT_TIMEOUT):
+        self.shared = shared
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _owner(self):
+        # Looked up per claim: the group may be created before a fork
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), sharing the result of a running call with the same key.
+
+        Exceptions raised by the call are raised in every thread waiting on it.
+        """
+        operation = key.split(':', 1)[0]
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.record_singleflight(operation, 'follower')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Callers may modify what they get back
+            return copy.deepcopy(call.result)
+
+        try:
+            if self.shared:
+                call.result = self._do_shared(key, operation, fn, args, kwargs)
+            else:
+                metrics.record_singleflight(operation, 'leader')
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _claim(self, conn, key):
+        """Claim key unless another process holds a live claim.
+
+        Returns:
+            bool: Whether the key was claimed, or None if the table couldn't be used
+        """
+        now = time.time()
+        try:
+            cursor = conn.execute(
+                '''INSERT INTO singleflight (key, owner, status, started_at) VALUES (?, ?, 'running', ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                   owner = excluded.owner, status = 'running', started_at = excluded.started_at,
+                   finished_at = NULL, result = NULL
+                   WHERE status != 'running' OR started_at < ?''',
+                (key, self._owner, now, now - self.timeout)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error claiming single-flight key {key}: {e}")
+            return None
+        return cursor.rowcount == 1
+
+    def _finish(self, conn, key, status, result=None):
+        """Release a claim, publishing the result to waiting processes"""
+        now = time.time()
+        try:
+            conn.execute(
+                "UPDATE singleflight SET status = ?, finished_at = ?, result = ? WHERE key = ? AND owner = ?",
+                (status, now, result, key, self._owner)
+            )
+            conn.execute("DELETE FROM singleflight WHERE status != 'running' AND finished_at < ?",
+                         (now - _RESULT_TTL,))
+            conn.commit()
+        except sqlite3.Error as e:
+            # Waiting processes time out and compute the result themselves
+            print(f"Error finishing single-flight key {key}: {e}")
+
+    def _wait(self, conn, key):
+        """Poll another process's call.
+
+        Returns:
+            tuple: (True, result), or (False, None) if it failed, its result
+                can't be shared or it didn't finish in time
+        """
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            row = conn.execute('SELECT status, result FROM singleflight WHERE key = ?', (key,)).fetchone()
+            if row is None or row['status'] != 'running':
+                if row is not None and row['status'] == 'done':
+                    return True, json.loads(row['result'])
+                return False, None
+            time.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+        return False, None
+
+    def _do_shared(self, key, operation, fn, args, kwargs):
+        conn = get_db()
+        try:
+            claimed = self._claim(conn, key)
+            if claimed is None:
+                metrics.record_singleflight(operation, 'leader')
+                return fn(*args, **kwargs)
+            if not claimed:
+                metrics.record_singleflight(operation, 'process_follower')
+                shared, result = self._wait(conn, key)
+                if shared:
+                    return result
+                metrics.record_singleflight(operation, 'fallback')
+                return fn(*args, **kwargs)
+
+            metrics.record_singleflight(operation, 'leader')
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                self._finish(conn, key, 'failed')
+                raise
+            try:
+                encoded = json.dumps(result)
+            except (TypeError, ValueError):
+                self._finish(conn, key, 'unshared')
+            else:
+                self._finish(conn, key, 'done', encoded)
+            return result
+        finally:
+            conn.close()
+
+
+_group = SingleFlight()
+
+
+def enable_shared():
+    """Deduplicate calls of the process-wide group across processes too.
+
+    Called before forking workers that share the database, so they inherit it.
+    """
+    _group.shared = True
+
+
+def do(key, fn, *args, **kwargs):
+    """Run fn through the process-wide single-flight group (see SingleFlight.do)"""
+    return _group.do(key, fn, *args, **kwargs)
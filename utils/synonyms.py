@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Synonym Table
+-------------
+Precomputed WordNet synonyms used for search query expansion. Each word's
+synonyms are ranked once, deterministically, and stored as a single row in
+the ``synonyms`` table, so expanding a query is a dictionary lookup rather
+than a WordNet traversal per request.
+
+Build the table with ``scripts/build_synonyms.py``. Words missing from the
+table (e.g. inflected forms) are ranked from WordNet on first use and written
+back.
+"""
+
+import sqlite3
+import datetime
+from functools import lru_cache
+
+from database.db_manager import get_db
+from config import SYNONYM_EXPANSION_LIMIT, SYNONYMS_PER_WORD
+
+
+# Separates ranked synonyms in synonyms.expansions (lemma names never contain it)
+_SEPARATOR = '\t'
+
+
+def normalize_query(query):
+    """Lowercase a query and collapse its whitespace"""
+    return ' '.join(query.lower().split())
+
+
+def rank_synonyms(word, wordnet, limit=SYNONYMS_PER_WORD):
+    """Rank a word's WordNet synonyms deterministically.
+
+    Synonyms shared by more of the word's senses rank first, then those with
+    higher corpus counts, then alphabetically.
+
+    Args:
+        word (str): Normalized word
+        wordnet: The nltk WordNet corpus reader
+        limit (int): Maximum number of synonyms
+
+    Returns:
+        list: Ranked synonyms, excluding the word itself
+    """
+    senses = {}
+    counts = {}
+    for synset in wordnet.synsets(word.replace(' ', '_')):
+        for lemma in synset.lemmas():
+            name = lemma.name().replace('_', ' ').lower()
+            if name == word:
+                continue
+            senses[name] = senses.get(name, 0) + 1
+            counts[name] = counts.get(name, 0) + lemma.count()
+    ranked = sorted(senses, key=lambda name: (-senses[name], -counts[name], name))
+    return ranked[:limit]
+
+
+def _load_wordnet():
+    """Import the WordNet corpus, or None if its data isn't installed"""
+    try:
+        from nltk.corpus import wordnet
+        wordnet.ensure_loaded()
+        return wordnet
+    except (ImportError, LookupError) as e:
+        print(f"WordNet unavailable for synonym lookup: {e}")
+        return None
+
+
+def _store(conn, rows):
+    updated_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany(
+        'INSERT OR REPLACE INTO synonyms (word, expansions, updated_at) VALUES (?, ?, ?)',
+        [(word, _SEPARATOR.join(synonyms), updated_at) for word, synonyms in rows]
+    )
+
+
+@lru_cache(maxsize=4096)
+def get_synonyms(word):
+    """Get the ranked synonyms of a normalized word.
+
+    Returns:
+        tuple: Ranked synonyms (empty if the word has none)
+    """
+    conn = get_db()
+    try:
+        row = conn.execute('SELECT expansions FROM synonyms WHERE word = ?', (word,)).fetchone()
+        if row is not None:
+            return tuple(row['expansions'].split(_SEPARATOR)) if row['expansions'] else ()
+
+        wordnet = _load_wordnet()
+        if wordnet is None:
+            return ()
+        synonyms = rank_synonyms(word, wordnet)
+        try:
+            _store(conn, [(word, synonyms)])
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            # The lookup still succeeds if the database is busy
+            print(f"Error caching synonyms for {word}: {e}")
+        return tuple(synonyms)
+    finally:
+        conn.close()
+
+
+@lru_cache(maxsize=1024)
+def _expand_normalized(query, limit):
+    words = list(dict.fromkeys(query.split()))
+    expanded = dict.fromkeys(words)
+    synonym_lists = [get_synonyms(word) for word in words]
+
+    # Take each word's synonyms in rank order, round-robin, so every query
+    # word contributes its best synonyms before any word's weaker ones
+    depth = 0
+    while len(expanded) < limit and any(depth < len(s) for s in synonym_lists):
+        for synonyms in synonym_lists:
+            if depth < len(synonyms):
+                expanded.setdefault(synonyms[depth])
+        depth += 1
+
+    return tuple(list(expanded)[:max(limit, len(words))])
+
+
+def expand_query(query, limit=SYNONYM_EXPANSION_LIMIT):
+    """Expand a search query with ranked synonyms.
+
+    The query's own words always come first, in order; the result is
+    deterministic and cached per normalized query.
+
+    Args:
+        query (str): The search query
+        limit (int): Maximum number of terms (never drops query words)
+
+    Returns:
+        list: Query words followed by synonyms
+    """
+    return list(_expand_normalized(normalize_query(query), limit))
+
+
+def build_synonym_table(batch_size=5000, progress_callback=None):
+    """Rank synonyms for every WordNet lemma and store them.
+
+    Args:
+        batch_size (int): Rows written per transaction
+        progress_callback (callable): Called as callback(fraction, message)
+
+    Returns:
+        int: Number of words stored
+    """
+    wordnet = _load_wordnet()
+    if wordnet is None:
+        return 0
+
+    words = sorted({name.replace('_', ' ').lower() for name in wordnet.all_lemma_names()})
+    conn = get_db()
+    stored = 0
+    for start in range(0, len(words), batch_size):
+        batch = words[start:start + batch_size]
+        _store(conn, [(word, rank_synonyms(word, wordnet)) for word in batch])
+        conn.commit()
+        stored += len(batch)
+        if progress_callback:
+            progress_callback(stored / len(words), f"Stored synonyms for {stored} words")
+    conn.close()
+
+    get_synonyms.cache_clear()
+    _expand_normalized.cache_clear()
+    return stored